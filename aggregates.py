@@ -0,0 +1,125 @@
+"""Running totals for the Reports tab, kept up to date as the ledger changes.
+
+Money totals are integer cents, like the ledger itself.
+"""
+from bisect import bisect_left, insort
+
+
+class LedgerAggregates:
+    """Sales/payment totals, per-product figures and a balance ranking.
+
+    Customer balances mirror the app's `customers` dict and are ranked in a
+    sorted list of (-balance, customer), so the report never has to sort.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.sales_count = 0
+        self.last_sale_id = None
+        self.total_sales = 0
+        self.total_paid = 0
+        self.total_outstanding = 0
+        self.product_units = {}
+        self.product_revenue = {}
+        self.balances = {}
+        self.ranking = []
+
+    def rebuild(self, sales, customers):
+        """Recompute everything from the ledger"""
+        self.reset()
+        if hasattr(sales, 'column'):
+            self._add_columns(sales)
+        else:
+            for sale in sales:
+                self._add_sale(sale)
+                self.total_paid += sale['paid_amount']
+        self._set_balances(customers)
+
+    def record_sale(self, sale):
+        self._add_sale(sale)
+
+    def record_payment(self, amount):
+        self.total_paid += amount
+
+    def set_balance(self, customer, balance):
+        """Move `customer` within the ranking; a balance of None removes them"""
+        old = self.balances.pop(customer, None)
+        if old is not None:
+            del self.ranking[bisect_left(self.ranking, (-old, customer))]
+            self.total_outstanding -= old
+        if balance is not None:
+            self.balances[customer] = balance
+            insort(self.ranking, (-balance, customer))
+            self.total_outstanding += balance
+
+    def top_customers(self, limit=None):
+        """Customers ordered by outstanding balance, largest first"""
+        ranking = self.ranking if limit is None else self.ranking[:limit]
+        return [(customer, -negative_balance) for negative_balance, customer in ranking]
+
+    def matches(self, sales, customers):
+        """Cheap consistency check of stored totals against a freshly loaded ledger"""
+        last_sale_id = sales[-1]['id'] if sales else None
+        return (self.sales_count == len(sales)
+                and self.last_sale_id == last_sale_id
+                and self.total_outstanding == sum(customers.values()))
+
+    def to_dict(self):
+        return {
+            'sales_count': self.sales_count,
+            'last_sale_id': self.last_sale_id,
+            'total_sales': self.total_sales,
+            'total_paid': self.total_paid,
+            'total_outstanding': self.total_outstanding,
+            'product_units': dict(self.product_units),
+            'product_revenue': dict(self.product_revenue)
+        }
+
+    @classmethod
+    def load(cls, stored, sales, customers):
+        """Restore persisted totals, rebuilding from the ledger if they are missing or stale"""
+        aggregates = cls()
+        if stored:
+            aggregates.sales_count = stored['sales_count']
+            aggregates.last_sale_id = stored['last_sale_id']
+            aggregates.total_sales = stored['total_sales']
+            aggregates.total_paid = stored['total_paid']
+            aggregates.total_outstanding = stored['total_outstanding']
+            aggregates.product_units = stored['product_units']
+            aggregates.product_revenue = stored['product_revenue']
+        if not stored or not aggregates.matches(sales, customers):
+            aggregates.rebuild(sales, customers)
+        else:
+            aggregates._set_balances(customers)
+        return aggregates
+
+    def _add_sale(self, sale):
+        product = sale['product']
+        self.sales_count += 1
+        self.last_sale_id = sale['id']
+        self.total_sales += sale['total_amount']
+        self.product_units[product] = self.product_units.get(product, 0) + sale['quantity']
+        self.product_revenue[product] = self.product_revenue.get(product, 0) + sale['total_amount']
+
+    def _add_columns(self, table):
+        """Bulk version of _add_sale over a columnar SalesTable"""
+        self.sales_count = len(table)
+        self.last_sale_id = table.ids[-1] if len(table) else None
+        self.total_sales = sum(table.column('total_amount'))
+        self.total_paid = sum(table.column('paid_amount'))
+        units = {}
+        revenue = {}
+        for product_id, quantity, total in zip(table.product_ids, table.column('quantity'),
+                                               table.column('total_amount')):
+            units[product_id] = units.get(product_id, 0) + quantity
+            revenue[product_id] = revenue.get(product_id, 0) + total
+        names = table.product_names.values
+        self.product_units = {names[i]: value for i, value in units.items()}
+        self.product_revenue = {names[i]: value for i, value in revenue.items()}
+
+    def _set_balances(self, customers):
+        self.balances = dict(customers)
+        self.ranking = sorted((-balance, customer) for customer, balance in customers.items())
+        self.total_outstanding = sum(customers.values())
@@ -0,0 +1,209 @@
+"""Sales analytics over the columnar sales ledger.
+
+Each report is one batched pass over the SalesTable columns (zipped
+arrays, no per-sale row objects), so a year of sales is summarized in a
+fraction of a second. Money results are integer cents. SalesAnalytics
+caches the results until the ledger changes:
+
+    analytics = SalesAnalytics(ledger)
+    analytics.revenue_by_period('month')
+    analytics.receivables_aging()
+"""
+from datetime import date, datetime
+
+from columnar import EPOCH_ORDINAL, STATUS_CODES, SalesTable, parse_timestamp
+
+PERIODS = ('day', 'week', 'month')
+AGING_BUCKETS = (('0-30', 30), ('31-60', 60), ('61-90', 90), ('90+', None))
+DAY = 86400
+
+
+def now_timestamp():
+    """The current local wall-clock time in SalesTable timestamp units"""
+    return parse_timestamp(datetime.now().strftime('%Y-%m-%d %H:%M'))
+
+
+def period_label(day_number, period):
+    """Label of the day/week/month containing the given day since the epoch"""
+    day = date.fromordinal(day_number + EPOCH_ORDINAL)
+    if period == 'day':
+        return day.isoformat()
+    if period == 'week':
+        year, week, _ = day.isocalendar()
+        return f'{year}-W{week:02d}'
+    if period == 'month':
+        return day.isoformat()[:7]
+    raise ValueError(f'Unknown period: {period}')
+
+
+def _table(sales):
+    return sales if isinstance(sales, SalesTable) else SalesTable(sales)
+
+
+def revenue_by_period(sales, period='day'):
+    """[(label, revenue, units)] per day, ISO week or month, oldest first"""
+    table = _table(sales)
+    revenue = {}
+    units = {}
+    for timestamp, total, quantity in zip(table.timestamps, table.column('total_amount'),
+                                          table.column('quantity')):
+        day = timestamp // DAY
+        revenue[day] = revenue.get(day, 0) + total
+        units[day] = units.get(day, 0.0) + quantity
+
+    # Few distinct days, so grouping days into weeks/months afterwards is cheap
+    rows = {}
+    for day in sorted(revenue):
+        label = period_label(day, period)
+        row = rows.setdefault(label, [0, 0.0])
+        row[0] += revenue[day]
+        row[1] += units[day]
+    return [(label, row[0], row[1]) for label, row in rows.items()]
+
+
+def product_velocity(sales, stock, days=30, now=None):
+    """Per-product sales rate over the last `days` days, fastest first.
+
+    Returns dicts with units sold in the window, units per day, sell-through
+    (sold / (sold + on hand)) and days of cover at the current rate.
+    """
+    table = _table(sales)
+    # The window is the last `days` calendar days, today included
+    today = (now_timestamp() if now is None else now) // DAY
+    since = (today - days + 1) * DAY
+    sold = {}
+    for timestamp, product_id, quantity in zip(table.timestamps, table.product_ids,
+                                               table.column('quantity')):
+        if timestamp >= since:
+            sold[product_id] = sold.get(product_id, 0.0) + quantity
+
+    names = table.product_names.values
+    units_by_product = {names[product_id]: units for product_id, units in sold.items()}
+    rows = []
+    for product in set(stock) | set(units_by_product):
+        units = units_by_product.get(product, 0.0)
+        on_hand = stock.get(product, 0)
+        per_day = units / days
+        rows.append({
+            'product': product,
+            'units_sold': units,
+            'units_per_day': per_day,
+            'sell_through': units / (units + on_hand) if units + on_hand > 0 else 0.0,
+            'days_of_cover': on_hand / per_day if per_day > 0 else None
+        })
+    rows.sort(key=lambda row: (-row['units_per_day'], row['product']))
+    return rows
+
+
+def receivables_aging(sales, now=None):
+    """Outstanding credit by age of the sale: {bucket: amount} plus per-customer rows.
+
+    Returns (totals, by_customer) where totals maps each AGING_BUCKETS label
+    to an amount and by_customer maps customer -> [amount per bucket].
+    """
+    table = _table(sales)
+    today = (now_timestamp() if now is None else now) // DAY
+    credit = STATUS_CODES['credit']
+    limits = [limit for _, limit in AGING_BUCKETS[:-1]]
+    by_customer = {}
+    for timestamp, customer_id, status, total, paid in zip(
+            table.timestamps, table.customer_ids, table.statuses,
+            table.column('total_amount'), table.column('paid_amount')):
+        if status != credit:
+            continue
+        age = today - timestamp // DAY
+        bucket = len(limits)
+        for i, limit in enumerate(limits):
+            if age <= limit:
+                bucket = i
+                break
+        amounts = by_customer.get(customer_id)
+        if amounts is None:
+            amounts = by_customer[customer_id] = [0] * len(AGING_BUCKETS)
+        amounts[bucket] += total - paid
+
+    names = table.customer_names.values
+    by_customer = {names[customer_id]: amounts for customer_id, amounts in by_customer.items()}
+    totals = {label: sum(amounts[i] for amounts in by_customer.values())
+              for i, (label, _) in enumerate(AGING_BUCKETS)}
+    return totals, by_customer
+
+
+def outstanding_by_customer(sales):
+    """{customer: unpaid cents} summed over open credit sales"""
+    table = _table(sales)
+    credit = STATUS_CODES['credit']
+    outstanding = {}
+    for customer_id, status, total, paid in zip(table.customer_ids, table.statuses,
+                                                table.column('total_amount'),
+                                                table.column('paid_amount')):
+        if status == credit:
+            outstanding[customer_id] = outstanding.get(customer_id, 0) + total - paid
+    names = table.customer_names.values
+    return {names[customer_id]: amount for customer_id, amount in outstanding.items() if amount}
+
+
+def top_customers(sales, limit=10):
+    """[(customer, revenue, sales count)] by total sales value, largest first"""
+    return _top(_table(sales), 'customer_ids', 'customer_names', limit)
+
+
+def top_products(sales, limit=10):
+    """[(product, revenue, units)] by total sales value, largest first"""
+    return _top(_table(sales), 'product_ids', 'product_names', limit, counts='quantity')
+
+
+def _top(table, id_column, names, limit, counts=None):
+    revenue = {}
+    count = {}
+    weights = table.column(counts) if counts else [1] * len(table)
+    for key, total, weight in zip(table.column(id_column), table.column('total_amount'), weights):
+        revenue[key] = revenue.get(key, 0) + total
+        count[key] = count.get(key, 0) + weight
+    values = getattr(table, names).values
+    rows = sorted(revenue, key=lambda key: (-revenue[key], values[key]))
+    if limit is not None:
+        rows = rows[:limit]
+    return [(values[key], revenue[key], count[key]) for key in rows]
+
+
+class SalesAnalytics:
+    """Cached analytics for a Ledger; results are reused until the ledger's version changes"""
+
+    def __init__(self, ledger):
+        self.ledger = ledger
+        self.version = None
+        self.cache = {}
+
+    def _cached(self, key, compute):
+        if self.version != self.ledger.version:
+            self.version = self.ledger.version
+            self.cache = {}
+        if key not in self.cache:
+            self.cache[key] = compute()
+        return self.cache[key]
+
+    def revenue_by_period(self, period='day'):
+        if period not in PERIODS:
+            raise ValueError(f'Unknown period: {period}')
+        return self._cached(('revenue', period),
+                            lambda: revenue_by_period(self.ledger.sales_data, period))
+
+    def product_velocity(self, days=30):
+        # Windows are relative to today, so the day is part of the key
+        now = now_timestamp()
+        return self._cached(('velocity', days, now // DAY), lambda: product_velocity(
+            self.ledger.sales_data, self.ledger.stock_data, days, now))
+
+    def receivables_aging(self):
+        now = now_timestamp()
+        return self._cached(('aging', now // DAY),
+                            lambda: receivables_aging(self.ledger.sales_data, now))
+
+    def top_customers(self, limit=10):
+        return self._cached(('customers', limit),
+                            lambda: top_customers(self.ledger.sales_data, limit))
+
+    def top_products(self, limit=10):
+        return self._cached(('products', limit),
+                            lambda: top_products(self.ledger.sales_data, limit))
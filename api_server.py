@@ -0,0 +1,361 @@
+"""Headless HTTP/JSON API over the ledger, for back-office tools.
+
+Serves the same data files the app uses (run it where the app is not
+running at the same time, e.g. on a back-office copy or the sync server's
+machine):
+
+    python api_server.py --data sales_stock_data.json --port 8080
+
+    GET  /health
+    GET  /stock                          {product: quantity}
+    GET  /balances?limit=&offset=        customers owing, largest balance first
+    GET  /sales?customer=&product=&status=&date_from=&date_to=&order=newest&limit=&offset=
+    GET  /reports/summary
+    GET  /reports/revenue?period=day|week|month
+    GET  /reports/aging
+    GET  /reports/velocity?days=30
+    GET  /reports/top-customers?limit=10
+    GET  /reports/top-products?limit=10
+    GET  /reports/reorder?limit=20       low and soonest-to-run-out products
+    GET  /reports/as-of?date=YYYY-MM-DD[ HH:MM]&customer=   stock and balances then
+    POST /sales     {'customer', 'product', 'quantity', 'unit_price'}
+    POST /payments  {'customer', 'amount'}
+    POST /stock     {'product', 'quantity'} adds a product, {'product', 'adjustment'} adjusts
+
+Money is integer cents, as in the ledger. Rejected mutations answer 400
+with {'error': message}.
+
+The server is a single asyncio event loop. Reads run on it directly and
+interleave with each other; mutations go through one writer task in
+arrival order, and disk writes happen on the ledger's background
+persistence thread. /sales responses are streamed with chunked transfer
+encoding, a few hundred rows per chunk, yielding to other requests in
+between.
+"""
+import argparse
+import asyncio
+import os
+import signal
+from urllib.parse import parse_qs, urlsplit
+
+from history import HistoryError
+from ledger import Ledger, LedgerError
+from snapshot_format import json_dumps, json_loads
+from stores import store_path
+
+MAX_BODY = 1 << 20
+PAGE_SIZE = 100
+STREAM_CHUNK = 500
+REASONS = {200: 'OK', 201: 'Created', 400: 'Bad Request', 404: 'Not Found',
+           405: 'Method Not Allowed', 413: 'Payload Too Large', 500: 'Internal Server Error'}
+
+
+class HttpError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class Stream:
+    """A response body produced chunk by chunk by an async iterator of bytes"""
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+
+def _int(query, name, default, minimum=0):
+    try:
+        value = int(query.get(name, default))
+    except ValueError:
+        raise HttpError(400, f'{name} must be an integer')
+    if value < minimum:
+        raise HttpError(400, f'{name} must be at least {minimum}')
+    return value
+
+
+def _field(body, name, kind):
+    value = body.get(name)
+    if isinstance(value, bool) or not isinstance(value, kind):
+        raise HttpError(400, f'{name} is missing or has the wrong type')
+    return value
+
+
+class ApiServer:
+    """Routes requests to a Ledger; all ledger access happens on the event loop"""
+
+    def __init__(self, ledger):
+        self.ledger = ledger
+        self.writes = None  # asyncio.Queue of (function, args, future), made in start()
+        self.routes = {
+            ('GET', '/health'): self.health,
+            ('GET', '/stock'): self.stock,
+            ('GET', '/balances'): self.balances,
+            ('GET', '/sales'): self.sales,
+            ('GET', '/reports/summary'): self.summary,
+            ('GET', '/reports/revenue'): self.revenue,
+            ('GET', '/reports/aging'): self.aging,
+            ('GET', '/reports/velocity'): self.velocity,
+            ('GET', '/reports/top-customers'): self.top_customers,
+            ('GET', '/reports/top-products'): self.top_products,
+            ('GET', '/reports/reorder'): self.reorder,
+            ('GET', '/reports/as-of'): self.as_of,
+            ('POST', '/sales'): self.record_sale,
+            ('POST', '/payments'): self.record_payment,
+            ('POST', '/stock'): self.change_stock,
+        }
+
+    async def start(self, host='127.0.0.1', port=8080):
+        self.writes = asyncio.Queue()
+        self.writer_task = asyncio.ensure_future(self.run_writer())
+        return await asyncio.start_server(self.handle_connection, host, port)
+
+    # Single writer
+
+    async def run_writer(self):
+        while True:
+            function, args, future = await self.writes.get()
+            try:
+                future.set_result(function(*args))
+            except Exception as e:
+                future.set_exception(e)
+
+    async def write(self, function, *args):
+        future = asyncio.get_running_loop().create_future()
+        await self.writes.put((function, args, future))
+        try:
+            return await future
+        except LedgerError as e:
+            raise HttpError(400, str(e))
+
+    # HTTP
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, target, version = request_line.decode('latin-1').split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get('content-length', 0))
+                if length > MAX_BODY:
+                    await self.send(writer, 413, {'error': 'request body too large'}, False)
+                    break
+                body = await reader.readexactly(length) if length else b''
+                keep_alive = (headers.get('connection', '').lower() != 'close'
+                              and version == 'HTTP/1.1')
+                status, payload = await self.dispatch(method, target, body)
+                await self.send(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass  # Client went away or sent something that is not HTTP
+        finally:
+            writer.close()
+
+    async def dispatch(self, method, target, body):
+        url = urlsplit(target)
+        handler = self.routes.get((method, url.path))
+        if handler is None:
+            if any(path == url.path for _, path in self.routes):
+                return 405, {'error': f'{method} not allowed on {url.path}'}
+            return 404, {'error': f'no such endpoint: {url.path}'}
+        query = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        try:
+            if method == 'POST':
+                try:
+                    body = json_loads(body or b'{}')
+                except ValueError:
+                    raise HttpError(400, 'request body is not valid JSON')
+                if not isinstance(body, dict):
+                    raise HttpError(400, 'request body must be a JSON object')
+                return 201, await handler(body)
+            return 200, await handler(query)
+        except HttpError as e:
+            return e.status, {'error': str(e)}
+        except Exception as e:
+            print(f'Error handling {method} {target}: {e!r}')
+            return 500, {'error': 'internal error'}
+
+    async def send(self, writer, status, payload, keep_alive):
+        head = [f'HTTP/1.1 {status} {REASONS.get(status, "")}',
+                'Content-Type: application/json',
+                'Connection: ' + ('keep-alive' if keep_alive else 'close')]
+        if isinstance(payload, Stream):
+            head.append('Transfer-Encoding: chunked')
+            writer.write(('\r\n'.join(head) + '\r\n\r\n').encode())
+            async for chunk in payload.chunks:
+                writer.write(b'%x\r\n%s\r\n' % (len(chunk), chunk))
+                await writer.drain()
+                await asyncio.sleep(0)  # Let other requests in between chunks
+            writer.write(b'0\r\n\r\n')
+        else:
+            body = json_dumps(payload)
+            head.append(f'Content-Length: {len(body)}')
+            writer.write(('\r\n'.join(head) + '\r\n\r\n').encode() + body)
+        await writer.drain()
+
+    # Reads
+
+    async def health(self, query):
+        return {'status': 'ok', 'sales': len(self.ledger.sales_data),
+                'pending_writes': self.writes.qsize()}
+
+    async def stock(self, query):
+        return self.ledger.stock_data
+
+    async def balances(self, query):
+        limit = _int(query, 'limit', PAGE_SIZE, 1)
+        offset = _int(query, 'offset', 0)
+        ranking = self.ledger.aggregates.top_customers()
+        return {
+            'total': len(ranking),
+            'offset': offset,
+            'balances': [{'customer': customer, 'balance': balance}
+                         for customer, balance in ranking[offset:offset + limit]]
+        }
+
+    async def sales(self, query):
+        table = self.ledger.sales_data
+        limit = _int(query, 'limit', PAGE_SIZE, 1)
+        offset = _int(query, 'offset', 0)
+        try:
+            rows = table.select(query.get('customer'), query.get('product'),
+                                query.get('status'), query.get('date_from'),
+                                query.get('date_to'))
+        except (KeyError, ValueError, IndexError):
+            raise HttpError(400, 'invalid status or date filter')
+        newest_first = query.get('order', 'oldest') == 'newest'
+        page = table.sort_rows(rows, newest_first, offset + limit)[offset:]
+        return Stream(self._stream_sales(table, page, len(rows), offset))
+
+    async def _stream_sales(self, table, rows, total, offset):
+        yield b'{"total":%d,"offset":%d,"sales":[' % (total, offset)
+        for start in range(0, len(rows), STREAM_CHUNK):
+            chunk = json_dumps([dict(table[i]) for i in rows[start:start + STREAM_CHUNK]])
+            yield (b',' if start else b'') + chunk[1:-1]
+        yield b']}'
+
+    async def summary(self, query):
+        aggregates = self.ledger.aggregates
+        return {
+            'sales_count': aggregates.sales_count,
+            'total_sales': aggregates.total_sales,
+            'total_paid': aggregates.total_paid,
+            'total_outstanding': aggregates.total_outstanding,
+            'customers_owing': len(self.ledger.customers),
+            'products': len(self.ledger.stock_data)
+        }
+
+    async def revenue(self, query):
+        try:
+            rows = self.ledger.analytics.revenue_by_period(query.get('period', 'day'))
+        except ValueError as e:
+            raise HttpError(400, str(e))
+        return [{'period': label, 'revenue': revenue, 'units': units}
+                for label, revenue, units in rows]
+
+    async def aging(self, query):
+        totals, by_customer = self.ledger.analytics.receivables_aging()
+        return {'totals': totals, 'customers': by_customer}
+
+    async def velocity(self, query):
+        return self.ledger.analytics.product_velocity(_int(query, 'days', 30, 1))
+
+    async def top_customers(self, query):
+        rows = self.ledger.analytics.top_customers(_int(query, 'limit', 10, 1))
+        return [{'customer': name, 'revenue': revenue, 'sales': count}
+                for name, revenue, count in rows]
+
+    async def top_products(self, query):
+        rows = self.ledger.analytics.top_products(_int(query, 'limit', 10, 1))
+        return [{'product': name, 'revenue': revenue, 'units': units}
+                for name, revenue, units in rows]
+
+    async def reorder(self, query):
+        return self.ledger.reorder.reorder_list(_int(query, 'limit', 20, 1))
+
+    async def as_of(self, query):
+        if 'date' not in query:
+            raise HttpError(400, 'date is required')
+        if self.ledger.history is None:
+            raise HttpError(404, 'history is off for this ledger; open it with history=True')
+        try:
+            state = self.ledger.history.state_at(query['date'])
+        except HistoryError as e:
+            raise HttpError(400, str(e))
+        except (ValueError, IndexError):
+            raise HttpError(400, 'date must be YYYY-MM-DD or YYYY-MM-DD HH:MM')
+        if 'customer' in query:
+            customer = query['customer']
+            return {'customer': customer, 'balance': state['customers'].get(customer, 0)}
+        return state
+
+    # Writes
+
+    async def record_sale(self, body):
+        sale = await self.write(self.ledger.record_sale, _field(body, 'customer', str),
+                                _field(body, 'product', str),
+                                _field(body, 'quantity', (int, float)),
+                                _field(body, 'unit_price', int))
+        return dict(sale)
+
+    async def record_payment(self, body):
+        customer = _field(body, 'customer', str)
+        sales = await self.write(self.ledger.record_payment, customer,
+                                 _field(body, 'amount', int))
+        return {'customer': customer, 'balance': self.ledger.customers.get(customer, 0),
+                'sales': [dict(sale) for sale in sales]}
+
+    async def change_stock(self, body):
+        product = _field(body, 'product', str)
+        if 'adjustment' in body:
+            quantity = await self.write(self.ledger.adjust_stock, product,
+                                        _field(body, 'adjustment', (int, float)))
+        else:
+            quantity = _field(body, 'quantity', (int, float))
+            await self.write(self.ledger.add_product, product, quantity)
+        return {'product': product, 'quantity': quantity}
+
+
+async def serve(ledger, host, port):
+    server = await ApiServer(ledger).start(host, port)
+    print(f'API listening on {host}:{server.sockets[0].getsockname()[1]}', flush=True)
+    stopped = asyncio.Event()
+    try:
+        # Stop cleanly on SIGTERM too, so pending writes are flushed
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, stopped.set)
+    except NotImplementedError:  # Windows
+        pass
+    async with server:
+        await stopped.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--data', default='sales_stock_data.json')
+    parser.add_argument('--store', help="serve this store's ledger (see stores.py) instead")
+    parser.add_argument('--backend', default=os.environ.get('SALES_STOCK_BACKEND', 'journal'))
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    args = parser.parse_args()
+    path = store_path(args.store) if args.store else args.data
+    ledger = Ledger.open(path, args.backend, history=True)
+    ledger.start_background_writes(
+        on_error=lambda e: print(f'Error saving data: {e}', flush=True))
+    try:
+        asyncio.run(serve(ledger, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        ledger.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""Payment allocation latency: full ledger scan vs. the open-invoice index.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_allocation [--sizes 10000 100000 1000000]
+"""
+import argparse
+import random
+import time
+
+from indexes import OpenInvoiceIndex
+
+
+def make_sales(n, customers=1000, open_ratio=0.05, seed=1):
+    """Build n sales (amounts in cents) spread over `customers`, a small fraction still open"""
+    rng = random.Random(seed)
+    sales = []
+    for i in range(1, n + 1):
+        total = rng.choice([50000, 100000]) * rng.randint(1, 5)
+        is_open = rng.random() < open_ratio
+        sales.append({
+            'id': i,
+            'customer': f'Customer {rng.randrange(customers)}',
+            'product': f'Product {rng.randrange(200)}',
+            'quantity': total / 50000,
+            'unit_price': 50000,
+            'total_amount': total,
+            'date': '2024-01-01 00:00',
+            'status': 'credit' if is_open else 'paid',
+            'paid_amount': 0 if is_open else total
+        })
+    return sales
+
+
+def scan_allocate(sales, customer, amount):
+    """The original allocation loop: walk every sale in the ledger"""
+    remaining = amount
+    for sale in sales:
+        if sale['customer'] == customer and sale['status'] == 'credit':
+            unpaid = sale['total_amount'] - sale['paid_amount']
+            if unpaid > 0 and remaining > 0:
+                applied = min(remaining, unpaid)
+                sale['paid_amount'] += applied
+                remaining -= applied
+                if sale['paid_amount'] >= sale['total_amount']:
+                    sale['status'] = 'paid'
+
+
+def time_payments(allocate, payments):
+    start = time.perf_counter()
+    for customer, amount in payments:
+        allocate(customer, amount)
+    return (time.perf_counter() - start) / len(payments)
+
+
+def run(size, payments=200):
+    rng = random.Random(size)
+    sales = make_sales(size)
+    customers = sorted({sale['customer'] for sale in sales if sale['status'] == 'credit'})
+    plan = [(rng.choice(customers), 10000) for _ in range(payments)]
+
+    scan_sales = [dict(sale) for sale in sales]
+    scan = time_payments(lambda c, a: scan_allocate(scan_sales, c, a), plan)
+
+    index = OpenInvoiceIndex(sales)
+    indexed = time_payments(index.allocate, plan)
+    return scan, indexed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--payments', type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"{'sales':>10} {'scan (us)':>12} {'index (us)':>12} {'speedup':>9}")
+    for size in args.sizes:
+        scan, indexed = run(size, args.payments)
+        print(f'{size:>10} {scan * 1e6:>12.1f} {indexed * 1e6:>12.1f} {scan / indexed:>8.0f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+"""Head-office rollup time for many store ledgers (consolidate.py).
+
+Writes `--stores` synthetic store ledgers of `--sales` sales each in the
+journal backend's binary snapshot format, then consolidates them with
+one worker process and with one per CPU:
+
+    python -m benchmarks.bench_consolidate --stores 50 --sales 200000   # 10M sales
+
+Generating the stores takes longer than consolidating them; pass `--dir`
+to keep them and reuse them in later runs.
+"""
+import argparse
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from benchmarks.synthetic import generate_ledger
+from consolidate import consolidate
+from storage import binary_path, write_snapshot
+from stores import list_stores, store_path
+
+
+def write_store(job):
+    root, store, sales, seed = job
+    data = generate_ledger(customers=max(sales // 100, 10), products=200, sales=sales,
+                           seed=seed)
+    write_snapshot(binary_path(store_path(store, root)), data, encoding='binary')
+    return len(data['sales_data'])
+
+
+def make_stores(root, stores, sales):
+    names = [f'store-{i:03d}' for i in range(stores)]
+    existing = set(list_stores(root))
+    jobs = [(root, name, sales, seed) for seed, name in enumerate(names, 1)
+            if name not in existing]
+    if jobs:
+        start = time.perf_counter()
+        with ProcessPoolExecutor() as executor:
+            list(executor.map(write_store, jobs))
+        print(f'Generated {len(jobs)} stores in {time.perf_counter() - start:.1f} s')
+    return names
+
+
+def run(root, stores, sales):
+    names = make_stores(root, stores, sales)
+    print(f'{stores} stores x {sales} sales = {stores * sales} sales, '
+          f'{os.cpu_count()} CPUs')
+    for workers in sorted({1, os.cpu_count() or 1}):
+        start = time.perf_counter()
+        report = consolidate(names, root, workers=workers)
+        elapsed = time.perf_counter() - start
+        print(f'{workers:>3} workers: {elapsed:6.2f} s  '
+              f'({report["sales_count"]} sales, {len(report["balances"])} customers owing)')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--stores', type=int, default=50)
+    parser.add_argument('--sales', type=int, default=20000, help='sales per store')
+    parser.add_argument('--dir', help='keep the generated stores here')
+    args = parser.parse_args()
+    if args.dir:
+        run(args.dir, args.stores, args.sales)
+        return
+    with tempfile.TemporaryDirectory() as directory:
+        run(directory, args.stores, args.sales)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+"""Memory used by the sales ledger: list of dicts vs. the columnar SalesTable.
+
+The dict list is produced the way load_data produces it, by parsing JSON,
+so repeated customer/product strings are separate objects as in the app.
+
+    python -m benchmarks.bench_memory [--sizes 100000 1000000]
+"""
+import argparse
+import gc
+import json
+import tracemalloc
+
+from benchmarks.bench_allocation import make_sales
+from columnar import SalesTable
+
+
+def measure(build):
+    """Bytes still allocated by the object `build()` returns"""
+    gc.collect()
+    tracemalloc.start()
+    obj = build()
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del obj
+    return size
+
+
+def run(size):
+    encoded = json.dumps(make_sales(size))
+    dicts = measure(lambda: json.loads(encoded))
+    sales = json.loads(encoded)
+    table = measure(lambda: SalesTable(sales))
+    return dicts, table
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100000, 1000000])
+    args = parser.parse_args()
+
+    print(f"{'sales':>10} {'dicts (MB)':>11} {'table (MB)':>11} {'bytes/sale':>16} {'ratio':>6}")
+    for size in args.sizes:
+        dicts, table = run(size)
+        print(f'{size:>10} {dicts / 1e6:>11.1f} {table / 1e6:>11.1f} '
+              f'{dicts // size:>7} / {table // size:<6} {dicts / table:>5.1f}x')
+
+
+if __name__ == '__main__':
+    main()
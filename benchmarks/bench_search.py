@@ -0,0 +1,63 @@
+"""Typeahead latency of the name index vs. filtering the full name list.
+
+    python -m benchmarks.bench_search [--sizes 1000 10000 100000]
+"""
+import argparse
+import random
+import string
+import time
+
+from search import NameIndex
+
+
+def make_names(n, seed=1):
+    rng = random.Random(seed)
+    words = [''.join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(3, 8))).title()
+             for _ in range(2000)]
+    names = set()
+    while len(names) < n:
+        names.add(' '.join(rng.sample(words, rng.randint(1, 3))))
+    return sorted(names)
+
+
+def scan_search(names, query, limit=10):
+    """What a filtered spinner would do: test every name"""
+    query = query.casefold()
+    return [name for name in names if query in name.casefold()][:limit]
+
+
+def time_queries(search, queries):
+    start = time.perf_counter()
+    for query in queries:
+        search(query)
+    return (time.perf_counter() - start) / len(queries)
+
+
+def run(size, queries=500):
+    rng = random.Random(size)
+    names = make_names(size)
+    # Typed prefixes of existing names, 1 to 4 characters long
+    plan = [rng.choice(names)[:rng.randint(1, 4)] for _ in range(queries)]
+    start = time.perf_counter()
+    index = NameIndex(names)
+    build = time.perf_counter() - start
+    scan = time_queries(lambda q: scan_search(names, q), plan)
+    indexed = time_queries(index.search, plan)
+    return build, scan, indexed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--queries', type=int, default=500)
+    args = parser.parse_args()
+
+    print(f"{'names':>10} {'build (ms)':>11} {'scan (us)':>12} {'index (us)':>12} {'speedup':>9}")
+    for size in args.sizes:
+        build, scan, indexed = run(size, args.queries)
+        print(f'{size:>10} {build * 1e3:>11.1f} {scan * 1e6:>12.1f} {indexed * 1e6:>12.1f} '
+              f'{scan / indexed:>8.0f}x')
+
+
+if __name__ == '__main__':
+    main()
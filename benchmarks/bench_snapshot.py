@@ -0,0 +1,85 @@
+"""Snapshot size, save and load time for each snapshot encoding.
+
+Save is encoding the ledger as `get_data()` returns it (sales in a
+SalesTable); load is decoding the bytes and building the SalesTable
+Ledger.load needs. File I/O is left out so the encodings are compared
+on their own.
+
+    python -m benchmarks.bench_snapshot [--sizes 100000 1000000]
+"""
+import argparse
+import json
+import time
+
+import snapshot_format
+from benchmarks.synthetic import generate_ledger
+from columnar import SalesTable
+from storage import encode_default
+
+
+def stdlib_json(indent=None):
+    separators = None if indent else (',', ':')
+    return (lambda data: json.dumps(data, indent=indent, separators=separators,
+                                    default=encode_default).encode(),
+            json.loads)
+
+
+def binary(compress):
+    return (lambda data: snapshot_format.encode_binary(data, encode_default, compress),
+            snapshot_format.decode_binary)
+
+
+CODECS = [
+    ('json, indent=2', stdlib_json(indent=2)),
+    ('json, compact', stdlib_json()),
+    ('binary', binary(False)),
+    ('binary + zlib', binary(True)),
+]
+if snapshot_format.orjson is not None:
+    CODECS.insert(2, ('json, orjson', (
+        lambda data: snapshot_format.orjson.dumps(data, default=encode_default),
+        snapshot_format.orjson.loads)))
+
+
+def as_table(data):
+    sales = data['sales_data']
+    return sales if isinstance(sales, SalesTable) else SalesTable(sales)
+
+
+def best_of(repeat, function):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        seconds = time.perf_counter() - start
+        best = seconds if best is None else min(best, seconds)
+    return best, result
+
+
+def run(size, repeat):
+    data = generate_ledger(customers=max(size // 100, 10), products=200, sales=size)
+    data['sales_data'] = SalesTable(data['sales_data'])
+    rows = []
+    for name, (encode, decode) in CODECS:
+        save, raw = best_of(repeat, lambda: encode(data))
+        load, table = best_of(repeat, lambda: as_table(decode(raw)))
+        assert len(table) == size
+        rows.append((name, len(raw), save, load))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100000, 1000000])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'sales':>9}  {'encoding':<16} {'size (MB)':>9} {'save (ms)':>10} {'load (ms)':>10}")
+    for size in args.sizes:
+        for name, length, save, load in run(size, args.repeat):
+            print(f'{size:>9}  {name:<16} {length / 1e6:>9.1f} {save * 1e3:>10.0f} '
+                  f'{load * 1e3:>10.0f}', flush=True)
+
+
+if __name__ == '__main__':
+    main()
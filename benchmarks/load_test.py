@@ -0,0 +1,205 @@
+"""Load test for api_server.py: requests per second and latency percentiles.
+
+Starts the API server in a subprocess on a synthetic ledger, then keeps
+`--concurrency` keep-alive connections busy for `--duration` seconds with
+a mix of reads and writes:
+
+    python -m benchmarks.load_test --sales 100000 --concurrency 32 --duration 10
+
+Pass `--url` to test a server that is already running instead (its data
+is modified by the write requests).
+"""
+import argparse
+import asyncio
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from urllib.parse import quote, urlsplit
+
+from benchmarks.synthetic import generate_ledger
+from snapshot_format import json_dumps
+from storage import write_snapshot
+
+# (name, weight): what a back office does most is look things up
+MIX = (('balances', 20), ('stock', 15), ('summary', 15), ('customer_sales', 25),
+       ('recent_sales', 10), ('record_sale', 10), ('record_payment', 5))
+
+
+class Connection:
+    """One keep-alive HTTP/1.1 connection"""
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.reader = self.writer = None
+
+    async def request(self, method, path, body=None):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        data = json_dumps(body) if body is not None else b''
+        self.writer.write(f'{method} {path} HTTP/1.1\r\nHost: {self.host}\r\n'
+                          f'Content-Length: {len(data)}\r\n\r\n'.encode() + data)
+        status = int((await self.reader.readline()).split()[1])
+        headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b'\r\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        if headers.get('transfer-encoding') == 'chunked':
+            parts = []
+            while True:
+                size = int(await self.reader.readline(), 16)
+                parts.append(await self.reader.readexactly(size + 2))
+                if size == 0:
+                    break
+            payload = b''.join(part[:-2] for part in parts)
+        else:
+            payload = await self.reader.readexactly(int(headers.get('content-length', 0)))
+        return status, payload
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+class Workload:
+    def __init__(self, customers, products, seed):
+        self.customers = customers
+        self.products = products
+        self.rng = random.Random(seed)
+        self.names = [name for name, _ in MIX]
+        self.weights = [weight for _, weight in MIX]
+
+    def next_request(self):
+        kind = self.rng.choices(self.names, self.weights)[0]
+        customer = quote(self.rng.choice(self.customers))
+        if kind == 'balances':
+            return kind, 'GET', '/balances?limit=20', None
+        if kind == 'stock':
+            return kind, 'GET', '/stock', None
+        if kind == 'summary':
+            return kind, 'GET', '/reports/summary', None
+        if kind == 'customer_sales':
+            return kind, 'GET', f'/sales?customer={customer}&order=newest&limit=50', None
+        if kind == 'recent_sales':
+            return kind, 'GET', '/sales?order=newest&limit=200', None
+        if kind == 'record_sale':
+            return kind, 'POST', '/sales', {'customer': self.rng.choice(self.customers),
+                                            'product': self.rng.choice(self.products),
+                                            'quantity': 1, 'unit_price': 5000}
+        return kind, 'POST', '/payments', {'customer': self.rng.choice(self.customers),
+                                           'amount': 100}
+
+
+async def client(host, port, workload, deadline, latencies, errors):
+    connection = Connection(host, port)
+    try:
+        while time.perf_counter() < deadline:
+            kind, method, path, body = workload.next_request()
+            start = time.perf_counter()
+            status, _ = await connection.request(method, path, body)
+            latencies.setdefault(kind, []).append(time.perf_counter() - start)
+            if status >= 500:
+                errors.append((kind, status))
+    finally:
+        connection.close()
+
+
+async def run_load(host, port, customers, products, concurrency, duration, seed):
+    latencies = {}
+    errors = []
+    deadline = time.perf_counter() + duration
+    start = time.perf_counter()
+    await asyncio.gather(*(client(host, port, Workload(customers, products, seed + i),
+                                  deadline, latencies, errors)
+                           for i in range(concurrency)))
+    return latencies, errors, time.perf_counter() - start
+
+
+def percentile(ordered, p):
+    return ordered[min(int(len(ordered) * p / 100), len(ordered) - 1)]
+
+
+def report(latencies, errors, elapsed):
+    every = sorted(seconds for values in latencies.values() for seconds in values)
+    print(f"\n{'request':<16} {'count':>7} {'p50 (ms)':>9} {'p99 (ms)':>9} {'max (ms)':>9}")
+    for kind in sorted(latencies):
+        ordered = sorted(latencies[kind])
+        print(f'{kind:<16} {len(ordered):>7} {percentile(ordered, 50) * 1e3:>9.2f} '
+              f'{percentile(ordered, 99) * 1e3:>9.2f} {ordered[-1] * 1e3:>9.2f}')
+    print(f"{'all':<16} {len(every):>7} {percentile(every, 50) * 1e3:>9.2f} "
+          f"{percentile(every, 99) * 1e3:>9.2f} {every[-1] * 1e3:>9.2f}")
+    print(f'\n{len(every) / elapsed:.0f} requests/s over {elapsed:.1f} s, '
+          f'{len(errors)} server errors')
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def wait_for_server(host, port, process, timeout=120):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            sys.exit('API server exited during startup')
+        try:
+            with socket.create_connection((host, port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.1)
+    sys.exit('API server did not start')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sales', type=int, default=100000)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--url', help='test a running server instead of starting one')
+    args = parser.parse_args()
+
+    data = generate_ledger(customers=max(args.sales // 100, 10), products=200,
+                           sales=args.sales, seed=args.seed)
+    customers = sorted(data['customers']) or ['Customer 00000']
+    products = sorted(data['stock_data'])
+    for product in products:
+        data['stock_data'][product] = 1e9  # Sales must not run out of stock mid-test
+
+    if args.url:
+        url = urlsplit(args.url)
+        latencies, errors, elapsed = asyncio.run(run_load(
+            url.hostname, url.port, customers, products, args.concurrency, args.duration,
+            args.seed))
+        report(latencies, errors, elapsed)
+        return
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'ledger.json')
+        write_snapshot(path, data)
+        port = free_port()
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        server = subprocess.Popen([sys.executable, os.path.join(root, 'api_server.py'),
+                                   '--data', path, '--port', str(port)], cwd=root)
+        try:
+            wait_for_server('127.0.0.1', port, server)
+            print(f'{args.sales} sales, {args.concurrency} connections, {args.duration:g} s')
+            latencies, errors, elapsed = asyncio.run(run_load(
+                '127.0.0.1', port, customers, products, args.concurrency, args.duration,
+                args.seed))
+        finally:
+            server.terminate()
+            server.wait()
+        report(latencies, errors, elapsed)
+
+
+if __name__ == '__main__':
+    main()
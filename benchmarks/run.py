@@ -0,0 +1,318 @@
+"""Benchmark suite: micro- and macro-benchmarks of the ledger's hot paths.
+
+Runs headless (no Kivy) on synthetic ledgers from benchmarks/synthetic.py
+and writes machine-readable results that later runs can be compared with:
+
+    python -m benchmarks.run --sizes 10000 100000 --out results.json
+    python -m benchmarks.run --out new.json --compare results.json
+    python -m benchmarks.run --only load. save. --list
+
+Every result is the best of `--repeat` runs, reported as seconds per
+operation. A comparison flags results that got slower than `--threshold`
+times the baseline, and exits with status 1 if there are any.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from benchmarks.synthetic import generate_ledger
+from columnar import SalesTable
+from indexes import RecentSales
+from ledger import Ledger
+from storage import open_storage, write_snapshot
+
+BENCHMARKS = []  # (name, kind, function(context) -> (seconds, operations))
+
+
+def benchmark(name, kind='micro'):
+    def register(function):
+        BENCHMARKS.append((name, kind, function))
+        return function
+    return register
+
+
+class Context:
+    """A synthetic ledger of one size plus a scratch directory"""
+
+    def __init__(self, size, directory, seed=1):
+        self.size = size
+        self.directory = directory
+        self.data = generate_ledger(customers=max(size // 100, 10), products=200, sales=size,
+                                    seed=seed)
+        self.path = os.path.join(directory, f'ledger_{size}.json')
+        write_snapshot(self.path, self.data)
+        self.rng = random.Random(seed)
+
+    def memory_ledger(self):
+        """A loaded ledger without storage, so mutations are not persisted"""
+        ledger = Ledger()
+        ledger.sales_data = SalesTable(self.data['sales_data'])
+        ledger.stock_data = dict(self.data['stock_data'])
+        ledger.customers = dict(self.data['customers'])
+        ledger.rebuild_indexes()
+        return ledger
+
+    def copy_to(self, backend):
+        """Path of a fresh copy of the ledger for `backend`"""
+        directory = tempfile.mkdtemp(dir=self.directory)
+        path = os.path.join(directory, 'ledger.json')
+        write_snapshot(path, self.data)
+        storage = open_storage(path, backend)  # SQLite imports the JSON file here
+        if backend == 'journal':
+            storage.save(storage.load())  # Into the journal's own snapshot format
+        storage.close()
+        return path
+
+
+def timed(function):
+    start = time.perf_counter()
+    function()
+    return time.perf_counter() - start
+
+
+# Micro-benchmarks: in-memory operations on a loaded ledger
+
+@benchmark('payment.record')
+def bench_payment(ctx):
+    ledger = ctx.memory_ledger()
+    owing = sorted(ledger.customers)
+    payments = [ctx.rng.choice(owing) for _ in range(500)]
+    start = time.perf_counter()
+    done = 0
+    for customer in payments:
+        balance = ledger.customers.get(customer)
+        if balance:
+            ledger.record_payment(customer, min(balance, 1000))
+            done += 1
+    return time.perf_counter() - start, done
+
+
+@benchmark('sale.record')
+def bench_sale(ctx):
+    ledger = ctx.memory_ledger()
+    customers = list(ctx.data['customers']) or ['Customer 00000']
+    products = [product for product, quantity in ledger.stock_data.items() if quantity >= 100]
+    for product in products:
+        ledger.stock_data[product] = 1e9
+    start = time.perf_counter()
+    for i in range(1000):
+        ledger.record_sale(customers[i % len(customers)], products[i % len(products)], 1, 5000)
+    return time.perf_counter() - start, 1000
+
+
+@benchmark('recent_sales.rebuild')
+def bench_recent_rebuild(ctx):
+    table = SalesTable(ctx.data['sales_data'])
+    return timed(lambda: RecentSales(15, table)), 1
+
+
+@benchmark('recent_sales.add')
+def bench_recent_add(ctx):
+    table = SalesTable(ctx.data['sales_data'])
+    recent = RecentSales(15, table)
+    sales = table[-1000:]
+    return timed(lambda: [recent.add(sale) for sale in sales]), len(sales)
+
+
+@benchmark('reports.aggregates_rebuild')
+def bench_aggregates(ctx):
+    ledger = ctx.memory_ledger()
+    return timed(lambda: ledger.aggregates.rebuild(ledger.sales_data, ledger.customers)), 1
+
+
+@benchmark('reports.top_customers')
+def bench_top_customers(ctx):
+    ledger = ctx.memory_ledger()
+    return timed(lambda: [ledger.aggregates.top_customers() for _ in range(100)]), 100
+
+
+@benchmark('reports.analytics')
+def bench_analytics(ctx):
+    ledger = ctx.memory_ledger()
+
+    def all_reports():
+        ledger.version += 1  # Cold cache
+        for period in ('day', 'week', 'month'):
+            ledger.analytics.revenue_by_period(period)
+        ledger.analytics.product_velocity()
+        ledger.analytics.receivables_aging()
+        ledger.analytics.top_customers()
+        ledger.analytics.top_products()
+    return timed(all_reports), 1
+
+
+@benchmark('search.customers')
+def bench_search(ctx):
+    ledger = ctx.memory_ledger()
+    names = sorted(ledger.customer_index.names)
+    queries = [ctx.rng.choice(names)[:ctx.rng.randint(1, 12)] for _ in range(1000)]
+    return timed(lambda: [ledger.search_customers(query) for query in queries]), len(queries)
+
+
+@benchmark('reconcile')
+def bench_reconcile(ctx):
+    ledger = ctx.memory_ledger()
+    return timed(lambda: ledger.reconcile(repair=False)), 1
+
+
+# Macro-benchmarks: whole load/save paths through real storage
+
+def bench_load(backend):
+    def run(ctx):
+        path = ctx.copy_to(backend)
+
+        def load():
+            Ledger.open(path, backend).close()
+        return timed(load), 1
+    return run
+
+
+def bench_save(backend):
+    def run(ctx):
+        ledger = Ledger.open(ctx.copy_to(backend), backend)
+        seconds = timed(lambda: ledger.storage.save(ledger.get_data()))
+        ledger.close()
+        return seconds, 1
+    return run
+
+
+for _backend in ('json', 'journal', 'sqlite'):
+    benchmark(f'load.{_backend}', 'macro')(bench_load(_backend))
+    benchmark(f'save.{_backend}', 'macro')(bench_save(_backend))
+
+
+@benchmark('append.journal', 'macro')
+def bench_append(ctx):
+    """Synchronous journaled sales, as without the background writer"""
+    ledger = Ledger.open(ctx.copy_to('journal'), 'journal')
+    product = max(ledger.stock_data, key=ledger.stock_data.get)
+    ledger.stock_data[product] = 1e9
+    seconds = timed(lambda: [ledger.record_sale('Bench', product, 1, 5000) for _ in range(500)])
+    ledger.close()
+    return seconds, 500
+
+
+@benchmark('session.journal', 'macro')
+def bench_session(ctx):
+    """A burst of data entry with background writes, including the final flush"""
+    ledger = Ledger.open(ctx.copy_to('journal'), 'journal')
+    ledger.start_background_writes()
+    product = max(ledger.stock_data, key=ledger.stock_data.get)
+    ledger.stock_data[product] = 1e9
+
+    def session():
+        for i in range(1000):
+            customer = f'Walk-in {i % 50}'
+            ledger.record_sale(customer, product, 1, 5000)
+            if i % 4 == 3:
+                ledger.record_payment(customer, ledger.customers[customer])
+        ledger.close()
+    return timed(session), 1000
+
+
+def select(patterns):
+    if not patterns:
+        return BENCHMARKS
+    return [entry for entry in BENCHMARKS if any(entry[0].startswith(p) for p in patterns)]
+
+
+def run(sizes, patterns=(), repeat=3, seed=1):
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for size in sizes:
+            ctx = Context(size, directory, seed)
+            for name, kind, function in select(patterns):
+                best = None
+                for _ in range(repeat):
+                    seconds, operations = function(ctx)
+                    per_op = seconds / max(operations, 1)
+                    best = per_op if best is None else min(best, per_op)
+                results.append({'name': name, 'kind': kind, 'size': size, 'seconds': best})
+                print(f'{name:<28} {size:>9} {format_seconds(best):>12}', flush=True)
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def format_seconds(seconds):
+    if seconds >= 1:
+        return f'{seconds:.2f} s'
+    if seconds >= 1e-3:
+        return f'{seconds * 1e3:.2f} ms'
+    return f'{seconds * 1e6:.1f} us'
+
+
+def compare(results, baseline, threshold):
+    """Print new vs. baseline timings; returns the regressions"""
+    old = {(r['name'], r['size']): r['seconds'] for r in baseline['results']}
+    regressions = []
+    print(f"\n{'benchmark':<28} {'size':>9} {'baseline':>12} {'now':>12} {'ratio':>7}")
+    for result in results:
+        before = old.get((result['name'], result['size']))
+        if before is None:
+            continue
+        ratio = result['seconds'] / before if before else float('inf')
+        flag = ''
+        if ratio > threshold:
+            regressions.append(result)
+            flag = '  REGRESSION'
+        print(f"{result['name']:<28} {result['size']:>9} {format_seconds(before):>12} "
+              f"{format_seconds(result['seconds']):>12} {ratio:>6.2f}x{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000])
+    parser.add_argument('--only', nargs='+', default=[], help='benchmark name prefixes')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--out', help='write results as JSON to this file')
+    parser.add_argument('--compare', help='baseline results file to compare with')
+    parser.add_argument('--threshold', type=float, default=1.25,
+                        help='slowdown ratio reported as a regression')
+    parser.add_argument('--list', action='store_true', help='list the benchmarks and exit')
+    args = parser.parse_args()
+
+    if args.list:
+        for name, kind, _ in select(args.only):
+            print(f'{name:<28} {kind}')
+        return
+
+    results = run(args.sizes, args.only, args.repeat, args.seed)
+    report = {
+        'meta': {
+            'date': datetime.now().isoformat(timespec='seconds'),
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'seed': args.seed,
+            'repeat': args.repeat
+        },
+        'results': results
+    }
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
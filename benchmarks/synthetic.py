@@ -0,0 +1,113 @@
+"""Deterministic synthetic ledgers for benchmarks.
+
+    data = generate_ledger(customers=1000, products=200, sales=100000, seed=1)
+
+The result is a data dict in the storage format (amounts in cents) that
+obeys the ledger's rules: each customer's payments have settled their
+oldest sales first, so a customer has paid sales, then at most one part
+paid sale, then unpaid ones, and their balance is what those still owe.
+Customers follow one of a few payment habits:
+
+    prompt   pays everything within a couple of weeks
+    steady   owes for roughly the last month
+    slow     owes for roughly the last three months
+    lapsed   stopped paying at some point and owes everything since
+
+Customer and product popularity is skewed (a few regulars and best
+sellers account for most sales), and some products are low on stock.
+"""
+import argparse
+import json
+import random
+from datetime import date, timedelta
+
+PROFILES = (('prompt', 0.45, 14), ('steady', 0.3, 30), ('slow', 0.15, 90), ('lapsed', 0.1, None))
+PRICES = (5000, 10000, 25000, 50000, 100000)
+
+
+def weighted_choices(rng, population, k):
+    """k picks from `population` with Zipf-like weights (1, 1/2, 1/3, ...)"""
+    weights = [1 / (rank + 1) for rank in range(len(population))]
+    return rng.choices(population, weights=weights, k=k)
+
+
+def generate_ledger(customers=1000, products=200, sales=100000, seed=1, start='2024-01-01',
+                    days=365):
+    rng = random.Random(seed)
+    customer_names = [f'Customer {i:05d}' for i in range(customers)]
+    product_names = [f'Product {i:04d}' for i in range(products)]
+    unit_prices = {product: rng.choice(PRICES) for product in product_names}
+    first_day = date.fromisoformat(start)
+    day_strings = [(first_day + timedelta(days=d)).isoformat() for d in range(days)]
+
+    # Sales in date order, ids assigned in that order as the app would
+    timestamps = sorted((rng.randrange(days), rng.randrange(8 * 60, 20 * 60))
+                        for _ in range(sales))
+    buyers = weighted_choices(rng, customer_names, sales)
+    items = weighted_choices(rng, product_names, sales)
+    sales_data = []
+    for i, ((day, minute), customer, product) in enumerate(zip(timestamps, buyers, items), 1):
+        quantity = float(rng.choice((1, 1, 1, 2, 2, 3, 5, 10)))
+        total = int(quantity) * unit_prices[product]
+        sales_data.append({
+            'id': i,
+            'customer': customer,
+            'product': product,
+            'quantity': quantity,
+            'unit_price': unit_prices[product],
+            'total_amount': total,
+            'date': f'{day_strings[day]} {minute // 60:02d}:{minute % 60:02d}',
+            'status': 'paid',
+            'paid_amount': total
+        })
+
+    # Unsettle each customer's newest sales according to their habit
+    profiles = {}
+    for customer in customer_names:
+        _, _, window = rng.choices(PROFILES, weights=[p[1] for p in PROFILES])[0]
+        if window is None:
+            window = rng.randrange(days)
+        profiles[customer] = days - 1 - window  # Last fully settled day
+    balances = {}
+    settled = set()  # Customers whose remaining (older) sales are all paid
+    for sale, (sale_day, _) in zip(reversed(sales_data), reversed(timestamps)):
+        customer = sale['customer']
+        if customer in settled:
+            continue
+        if sale_day <= profiles[customer]:
+            # Oldest unpaid sale reached: this one is part paid, older ones are paid
+            if customer in balances and rng.random() < 0.5:
+                paid = rng.randrange(1, sale['total_amount'] // 100) * 100
+                sale['status'] = 'credit'
+                sale['paid_amount'] = paid
+                balances[customer] += sale['total_amount'] - paid
+            settled.add(customer)
+            continue
+        sale['status'] = 'credit'
+        sale['paid_amount'] = 0
+        balances[customer] = balances.get(customer, 0) + sale['total_amount']
+
+    stock_data = {}
+    for product in product_names:
+        stock_data[product] = float(rng.choice((0, 3, 8)) if rng.random() < 0.1
+                                    else rng.randrange(10, 500))
+    return {'sales_data': sales_data, 'stock_data': stock_data, 'customers': balances,
+            'format_version': 2}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Write a synthetic ledger as a JSON data file')
+    parser.add_argument('path')
+    parser.add_argument('--customers', type=int, default=1000)
+    parser.add_argument('--products', type=int, default=200)
+    parser.add_argument('--sales', type=int, default=100000)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+    data = generate_ledger(args.customers, args.products, args.sales, args.seed)
+    with open(args.path, 'w') as f:
+        json.dump(data, f, separators=(',', ':'))
+    print(f"wrote {len(data['sales_data'])} sales, {len(data['customers'])} customers owing")
+
+
+if __name__ == '__main__':
+    main()
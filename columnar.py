@@ -0,0 +1,357 @@
+"""Compact, column-oriented storage for the sales ledger.
+
+A dict per sale costs several hundred bytes; SalesTable keeps each field
+in a typed `array` column instead (about 60 bytes per sale). Customer and
+product names are interned to integer ids, dates are stored as integer
+epoch seconds of the local wall-clock time, money as integer cents and
+statuses as small codes.
+
+SalesTable behaves like the list of sale dicts it replaces: indexing and
+iteration return SaleRow views that read and write the columns, so code
+written against `sale['paid_amount']` keeps working.
+"""
+import heapq
+from array import array
+from bisect import bisect_left, bisect_right
+from collections.abc import Mapping
+from datetime import date
+
+STATUSES = ('credit', 'paid')
+STATUS_CODES = {status: code for code, status in enumerate(STATUSES)}
+# Numeric columns and their array typecodes; money columns hold integer cents
+NUMBER_COLUMNS = {'quantity': 'd', 'unit_price': 'q', 'total_amount': 'q', 'paid_amount': 'q'}
+# Every column and its typecode, in the order `columns()` returns them
+COLUMN_TYPES = (('ids', 'q'), ('timestamps', 'q'), ('customer_ids', 'i'), ('product_ids', 'i'),
+                ('statuses', 'b')) + tuple(NUMBER_COLUMNS.items())
+FIELDS = ('id', 'customer', 'product', 'quantity', 'unit_price', 'total_amount', 'date',
+          'status', 'paid_amount')
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+_day_numbers = {}
+_day_strings = {}
+
+
+def parse_timestamp(text):
+    """'YYYY-MM-DD HH:MM' (or 'YYYY-MM-DD') to epoch seconds, without timezone conversion"""
+    day = text[:10]
+    days = _day_numbers.get(day)
+    if days is None:
+        days = date(int(day[:4]), int(day[5:7]), int(day[8:10])).toordinal() - EPOCH_ORDINAL
+        _day_numbers[day] = days
+        _day_strings[days] = day
+    seconds = days * 86400
+    if len(text) >= 16:
+        seconds += int(text[11:13]) * 3600 + int(text[14:16]) * 60
+    return seconds
+
+
+def format_timestamp(seconds):
+    """Inverse of parse_timestamp: epoch seconds to 'YYYY-MM-DD HH:MM'"""
+    days, rest = divmod(seconds, 86400)
+    day = _day_strings.get(days)
+    if day is None:
+        day = date.fromordinal(days + EPOCH_ORDINAL).isoformat()
+        _day_numbers[day] = days
+        _day_strings[days] = day
+    return f'{day} {rest // 3600:02d}:{rest % 3600 // 60:02d}'
+
+
+class Interner:
+    """Bidirectional mapping between strings and small integer ids"""
+
+    def __init__(self, values=()):
+        self.values = []
+        self.ids = {}
+        for value in values:
+            self.intern(value)
+
+    def intern(self, value):
+        i = self.ids.get(value)
+        if i is None:
+            i = self.ids[value] = len(self.values)
+            self.values.append(value)
+        return i
+
+    def copy(self):
+        interner = Interner()
+        interner.values = list(self.values)
+        interner.ids = dict(self.ids)
+        return interner
+
+
+class SaleRow(Mapping):
+    """Dict-like view of one row of a SalesTable"""
+
+    __slots__ = ('table', 'index')
+
+    def __init__(self, table, index):
+        self.table = table
+        self.index = index
+
+    def __getitem__(self, key):
+        return self.table.get_field(self.index, key)
+
+    def __setitem__(self, key, value):
+        self.table.set_field(self.index, key, value)
+
+    def __iter__(self):
+        return iter(FIELDS)
+
+    def __len__(self):
+        return len(FIELDS)
+
+    def order_key(self):
+        """Chronological sort key, see indexes.sale_order_key"""
+        return (self.table.timestamps[self.index], self.table.ids[self.index])
+
+    def __repr__(self):
+        return f'SaleRow({dict(self)!r})'
+
+
+class SalesTable:
+    """List-like container of sales stored column by column"""
+
+    def __init__(self, sales=()):
+        self.ids = array('q')
+        self.timestamps = array('q')
+        self.customer_ids = array('i')
+        self.product_ids = array('i')
+        self.statuses = array('b')
+        self.numbers = {column: array(code) for column, code in NUMBER_COLUMNS.items()}
+        self.customer_names = Interner()
+        self.product_names = Interner()
+        self._ordered = 0  # See ordered_prefix
+        self._customer_rows = None  # See customer_rows
+        for sale in sales:
+            self.append(sale)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [SaleRow(self, j) for j in range(*i.indices(len(self.ids)))]
+        if i < 0:
+            i += len(self.ids)
+        if not 0 <= i < len(self.ids):
+            raise IndexError('sales index out of range')
+        return SaleRow(self, i)
+
+    def __setitem__(self, i, sale):
+        if i < 0:
+            i += len(self.ids)
+        for key in FIELDS:
+            self.set_field(i, key, sale[key])
+
+    def __iter__(self):
+        for i in range(len(self.ids)):
+            yield SaleRow(self, i)
+
+    def append(self, sale):
+        self.ids.append(sale['id'])
+        self.timestamps.append(parse_timestamp(sale['date']))
+        customer_id = self.customer_names.intern(sale['customer'])
+        self.customer_ids.append(customer_id)
+        self.product_ids.append(self.product_names.intern(sale['product']))
+        self.statuses.append(STATUS_CODES[sale['status']])
+        for column, values in self.numbers.items():
+            values.append(sale[column])
+        if self._customer_rows is not None:
+            self._customer_rows.setdefault(customer_id, array('i')).append(len(self.ids) - 1)
+
+    def get_field(self, i, key):
+        if key in self.numbers:
+            return self.numbers[key][i]
+        if key == 'id':
+            return self.ids[i]
+        if key == 'customer':
+            return self.customer_names.values[self.customer_ids[i]]
+        if key == 'product':
+            return self.product_names.values[self.product_ids[i]]
+        if key == 'status':
+            return STATUSES[self.statuses[i]]
+        if key == 'date':
+            return format_timestamp(self.timestamps[i])
+        raise KeyError(key)
+
+    def set_field(self, i, key, value):
+        if key in self.numbers:
+            self.numbers[key][i] = value
+        elif key == 'id':
+            self.ids[i] = value
+            self._ordered = min(self._ordered, i)
+        elif key == 'customer':
+            self.customer_ids[i] = self.customer_names.intern(value)
+            self._customer_rows = None
+        elif key == 'product':
+            self.product_ids[i] = self.product_names.intern(value)
+        elif key == 'status':
+            self.statuses[i] = STATUS_CODES[value]
+        elif key == 'date':
+            self.timestamps[i] = parse_timestamp(value)
+            self._ordered = min(self._ordered, i)
+        else:
+            raise KeyError(key)
+
+    def column(self, name):
+        """The raw array backing a column ('timestamps', 'customer_ids', 'quantity', ...)"""
+        if name in self.numbers:
+            return self.numbers[name]
+        return getattr(self, name)
+
+    def columns(self):
+        """(name, array) for every column, in COLUMN_TYPES order"""
+        return [(name, self.column(name)) for name, _ in COLUMN_TYPES]
+
+    @classmethod
+    def from_columns(cls, columns, customer_names, product_names):
+        """A table around existing arrays (a name -> array dict) and interned names"""
+        if len({len(columns[name]) for name, _ in COLUMN_TYPES}) != 1:
+            raise ValueError('sales columns have different lengths')
+        table = cls()
+        for name, _ in COLUMN_TYPES:
+            if name in table.numbers:
+                table.numbers[name] = columns[name]
+            else:
+                setattr(table, name, columns[name])
+        table.customer_names = Interner(customer_names)
+        table.product_names = Interner(product_names)
+        return table
+
+    def copy(self):
+        """Independent snapshot; each column is copied with a single slice.
+
+        Safe to call from another thread while rows are being appended: the
+        column written last by `append` decides how many rows are complete.
+        """
+        n = len(self.numbers['paid_amount'])
+        table = SalesTable()
+        table.ids = self.ids[:n]
+        table.timestamps = self.timestamps[:n]
+        table.customer_ids = self.customer_ids[:n]
+        table.product_ids = self.product_ids[:n]
+        table.statuses = self.statuses[:n]
+        table.numbers = {column: values[:n] for column, values in self.numbers.items()}
+        table.customer_names = self.customer_names.copy()
+        table.product_names = self.product_names.copy()
+        return table
+
+    def rows_with_status(self, status):
+        """Rows whose status is `status`, in table order"""
+        code = STATUS_CODES[status]
+        return [SaleRow(self, i) for i, value in enumerate(self.statuses) if value == code]
+
+    def newest(self, n):
+        """The n newest rows by (timestamp, id), newest first"""
+        top = heapq.nlargest(n, zip(self.timestamps, self.ids, range(len(self.ids))))
+        return [SaleRow(self, i) for _, _, i in top]
+
+    def customer_rows(self, customer_id):
+        """Indexes of one customer's rows, from an index built on first use"""
+        if self._customer_rows is None:
+            by_customer = {}
+            for i, value in enumerate(self.customer_ids):
+                rows = by_customer.get(value)
+                if rows is None:
+                    rows = by_customer[value] = array('i')
+                rows.append(i)
+            self._customer_rows = by_customer
+        return self._customer_rows.get(customer_id, ())
+
+    def select(self, customer=None, product=None, status=None, date_from=None, date_to=None):
+        """Indexes of the rows matching every given filter, in table order.
+
+        Returns a list, or a range when only dates are filtered. Dates are
+        'YYYY-MM-DD[ HH:MM]' strings and both ends are inclusive; a date
+        without a time covers the whole day.
+        """
+        rows = None
+        if customer is not None:
+            key = self.customer_names.ids.get(customer)
+            if key is None:
+                return []
+            rows = list(self.customer_rows(key))
+        filters = []
+        if product is not None:
+            key = self.product_names.ids.get(product)
+            if key is None:
+                return []
+            filters.append((self.product_ids, key))
+        if status is not None:
+            filters.append((self.statuses, STATUS_CODES[status]))
+        # The first filter scans its whole column, the rest only the rows left
+        for column, key in filters:
+            if rows is None:
+                rows = [i for i, value in enumerate(column) if value == key]
+            else:
+                rows = [i for i in rows if column[i] == key]
+        timestamps = self.timestamps
+        start = None if date_from is None else parse_timestamp(date_from)
+        end = None if date_to is None else parse_timestamp(
+            date_to if len(date_to) > 10 else date_to + ' 23:59')
+        if rows is None and self.ordered_prefix() == len(timestamps):
+            # Timestamps are sorted, so the date range is a slice
+            first = 0 if start is None else bisect_left(timestamps, start)
+            last = len(timestamps) if end is None else bisect_right(timestamps, end)
+            return range(first, last)
+        if rows is None:
+            rows = range(len(timestamps))
+        if start is not None:
+            rows = [i for i in rows if timestamps[i] >= start]
+        if end is not None:
+            rows = [i for i in rows if timestamps[i] <= end]
+        return rows
+
+    def ordered_prefix(self):
+        """Number of leading rows already in (timestamp, id) order.
+
+        Sales recorded live are appended in order, so this is normally the
+        whole table; it is checked incrementally from the last known prefix.
+        """
+        timestamps = self.timestamps
+        ids = self.ids
+        n = len(ids)
+        i = max(self._ordered, 1)
+        while i < n and (timestamps[i - 1], ids[i - 1]) < (timestamps[i], ids[i]):
+            i += 1
+        self._ordered = min(i, n)
+        return self._ordered
+
+    def sort_rows(self, rows, newest_first=False, limit=None):
+        """Row indexes (ascending, as from `select`) ordered by (timestamp, id).
+
+        Only the first `limit` are returned if given.
+        """
+        if not rows or rows[-1] < self.ordered_prefix():
+            # Already in order: no keys to build
+            ordered = rows[::-1] if newest_first else rows
+            return ordered[:limit]
+        timestamps = self.timestamps
+        ids = self.ids
+        keyed = sorted(((timestamps[i], ids[i], i) for i in rows), reverse=newest_first)
+        return [i for _, _, i in keyed[:limit]]
+
+    def iter_dicts(self):
+        """Plain sale dicts built straight from the columns"""
+        customers = self.customer_names.values
+        products = self.product_names.values
+        numbers = self.numbers
+        for sale_id, timestamp, customer, product, status, quantity, unit_price, total, paid in zip(
+                self.ids, self.timestamps, self.customer_ids, self.product_ids, self.statuses,
+                numbers['quantity'], numbers['unit_price'], numbers['total_amount'],
+                numbers['paid_amount']):
+            yield {
+                'id': sale_id,
+                'customer': customers[customer],
+                'product': products[product],
+                'quantity': quantity,
+                'unit_price': unit_price,
+                'total_amount': total,
+                'date': format_timestamp(timestamp),
+                'status': STATUSES[status],
+                'paid_amount': paid
+            }
+
+    def to_list(self):
+        """Plain list of sale dicts, for JSON serialization"""
+        return list(self.iter_dicts())
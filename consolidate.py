@@ -0,0 +1,165 @@
+"""Head-office rollup of every store's ledger (see stores.py).
+
+Each store is loaded and summarized in a separate process, so the work
+spreads over all CPU cores. Stores are read with the backend their files
+belong to and opened read-only, so a rollup never changes a store's
+files, even a damaged one. A worker sends back only its store's partial
+aggregates: totals, balances per customer, and units, revenue and stock
+per product. The parent merges those into the consolidated report:
+
+    python consolidate.py --stores-dir stores --top 20
+    python consolidate.py --json > rollup.json
+
+    report = consolidate(list_stores(), workers=8)
+    report['total_outstanding'], top_customers(report, 10)
+
+Customers and products are matched by name across stores, so a customer
+who owes at two branches appears once with the sum. Money is in cents.
+"""
+import argparse
+import heapq
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from aggregates import LedgerAggregates
+from columnar import SalesTable
+from money import format_money
+from snapshot_format import json_dumps
+from storage import detect_backend, migrate_data, open_storage
+from stores import STORES_DIR, list_stores, store_path
+
+TOTALS = ('sales_count', 'total_sales', 'total_paid', 'total_outstanding')
+
+
+def summarize_store(job):
+    """Partial aggregates of one store; runs in a worker process"""
+    store, path, backend = job
+    storage = open_storage(path, backend, read_only=True)
+    try:
+        data = storage.load()
+    finally:
+        storage.close()
+    migrate_data(data)
+    sales = data['sales_data']
+    if not isinstance(sales, SalesTable):
+        sales = SalesTable(sales)
+    # Stored totals are reused when they still match the sales
+    aggregates = LedgerAggregates.load(data.get('aggregates'), sales, data['customers'])
+    partial = {name: getattr(aggregates, name) for name in TOTALS}
+    partial.update({
+        'store': store,
+        'balances': data['customers'],
+        'product_units': aggregates.product_units,
+        'product_revenue': aggregates.product_revenue,
+        'stock': data['stock_data']
+    })
+    return partial
+
+
+def _add(totals, values):
+    for key, value in values.items():
+        totals[key] = totals.get(key, 0) + value
+
+
+def merge(partials):
+    """Combine per-store partial aggregates into one report"""
+    report = dict.fromkeys(TOTALS, 0)
+    balances = {}
+    units = {}
+    revenue = {}
+    stock = {}
+    stores = []
+    for partial in partials:
+        for name in TOTALS:
+            report[name] += partial[name]
+        _add(balances, partial['balances'])
+        _add(units, partial['product_units'])
+        _add(revenue, partial['product_revenue'])
+        _add(stock, partial['stock'])
+        stores.append({name: partial[name] for name in ('store',) + TOTALS})
+    report['stores'] = sorted(stores, key=lambda row: row['store'])
+    report['customers_owing'] = len(balances)
+    report['balances'] = balances
+    report['products'] = {product: {'units': units.get(product, 0),
+                                    'revenue': revenue.get(product, 0),
+                                    'stock': stock.get(product, 0)}
+                          for product in set(units) | set(stock)}
+    return report
+
+
+def top_customers(report, limit=10):
+    """[(customer, balance)] owing the most across all stores"""
+    return heapq.nlargest(limit, report['balances'].items(), key=lambda item: (item[1], item[0]))
+
+
+def top_products(report, limit=10):
+    """[(product, revenue, units)] by sales value across all stores"""
+    rows = heapq.nlargest(limit, report['products'].items(),
+                          key=lambda item: (item[1]['revenue'], item[0]))
+    return [(product, row['revenue'], row['units']) for product, row in rows]
+
+
+def store_job(store, root):
+    path = store_path(store, root, create=False)
+    backend = detect_backend(path)
+    if backend is None:
+        raise ValueError(f'No ledger found for store {store!r} in {os.path.dirname(path)}')
+    return store, path, backend
+
+
+def consolidate(stores, root=STORES_DIR, workers=None):
+    """Load and summarize `stores` in parallel and merge them.
+
+    `workers` defaults to the number of CPUs; with 1 everything runs in
+    this process. Raises ValueError if a store has no ledger files.
+    """
+    jobs = [store_job(store, root) for store in stores]
+    workers = min(workers or os.cpu_count() or 1, len(jobs) or 1)
+    if workers == 1:
+        return merge(map(summarize_store, jobs))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return merge(executor.map(summarize_store, jobs))
+
+
+def print_report(report, top):
+    print(f"{len(report['stores'])} stores, {report['sales_count']} sales")
+    print(f"Total sales:        ${format_money(report['total_sales'])}")
+    print(f"Total paid:         ${format_money(report['total_paid'])}")
+    print(f"Total outstanding:  ${format_money(report['total_outstanding'])} "
+          f"({report['customers_owing']} customers)")
+    print(f"\n{'store':<20} {'sales':>9} {'revenue':>16} {'outstanding':>16}")
+    for row in report['stores']:
+        print(f"{row['store']:<20} {row['sales_count']:>9} "
+              f"{format_money(row['total_sales']):>16} {format_money(row['total_outstanding']):>16}")
+    print('\nTop customers by balance:')
+    for customer, balance in top_customers(report, top):
+        print(f'  {customer}: ${format_money(balance)}')
+    print('\nTop products by sales:')
+    for product, revenue, units in top_products(report, top):
+        print(f'  {product}: ${format_money(revenue)} ({units:g} units)')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--stores-dir', default=STORES_DIR)
+    parser.add_argument('--workers', type=int, help='processes to use (default: one per CPU)')
+    parser.add_argument('--top', type=int, default=10)
+    parser.add_argument('--json', action='store_true', help='print the full report as JSON')
+    args = parser.parse_args()
+    stores = list_stores(args.stores_dir)
+    if not stores:
+        parser.exit(1, f'No stores found in {args.stores_dir}\n')
+    start = time.perf_counter()
+    report = consolidate(stores, args.stores_dir, args.workers)
+    if args.json:
+        report['top_customers'] = top_customers(report, args.top)
+        report['top_products'] = top_products(report, args.top)
+        print(json_dumps(report).decode())
+        return
+    print_report(report, args.top)
+    print(f'\nConsolidated in {time.perf_counter() - start:.2f} s')
+
+
+if __name__ == '__main__':
+    main()
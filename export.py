@@ -0,0 +1,159 @@
+"""Streaming CSV / JSON Lines export of sales, customer balances and stock.
+
+Rows are written in chunks straight to the output file, so memory use does
+not grow with the size of the ledger. Usable from the app (on a background
+thread) or from the command line:
+
+    python export.py --format csv --out exports --customer Alice --from 2024-01-01
+
+Amounts are written in currency units (cents / 100).
+"""
+import argparse
+import csv
+import json
+import os
+
+from money import to_units
+from storage import MONEY_COLUMNS, SALE_COLUMNS, migrate_data, open_storage
+
+FORMATS = {'csv': '.csv', 'jsonl': '.jsonl'}
+
+
+def sale_matches(sale, date_from=None, date_to=None, customer=None, product=None, status=None):
+    """Filter sales; dates are 'YYYY-MM-DD[ HH:MM]' prefixes and both ends are inclusive"""
+    if customer is not None and sale['customer'] != customer:
+        return False
+    if product is not None and sale['product'] != product:
+        return False
+    if status is not None and sale['status'] != status:
+        return False
+    if date_from is not None and sale['date'] < date_from:
+        return False
+    if date_to is not None and sale['date'][:len(date_to)] > date_to:
+        return False
+    return True
+
+
+class RowWriter:
+    """Writes dict rows to a CSV or JSON Lines file in chunks"""
+
+    def __init__(self, f, fmt, fields, chunk_size=1000):
+        if fmt not in FORMATS:
+            raise ValueError(f'Unknown export format: {fmt}')
+        self.f = f
+        self.fmt = fmt
+        self.fields = fields
+        self.chunk_size = chunk_size
+        self.chunk = []
+        self.count = 0
+        if fmt == 'csv':
+            self.csv_writer = csv.writer(f)
+            self.csv_writer.writerow(fields)
+
+    def write(self, row):
+        self.chunk.append(row)
+        if len(self.chunk) >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        if self.fmt == 'csv':
+            self.csv_writer.writerows([row[field] for field in self.fields] for row in self.chunk)
+        else:
+            self.f.write(''.join(json.dumps(row, separators=(',', ':')) + '\n' for row in self.chunk))
+        self.count += len(self.chunk)
+        self.chunk = []
+
+
+def export_sales(sales, f, fmt='csv', chunk_size=1000, progress=None, **filters):
+    """Stream matching sales to an open file; returns the number of rows written.
+
+    `progress(done, total)` is called after each chunk with the number of
+    ledger entries examined so far. Only sales present when the export
+    starts are included.
+    """
+    writer = RowWriter(f, fmt, SALE_COLUMNS, chunk_size)
+    total = len(sales)
+    for i in range(total):
+        sale = sales[i]
+        if sale_matches(sale, **filters):
+            row = {column: sale[column] for column in SALE_COLUMNS}
+            for column in MONEY_COLUMNS:
+                row[column] = to_units(row[column])
+            writer.write(row)
+        if progress is not None and (i + 1) % chunk_size == 0:
+            progress(i + 1, total)
+    writer.flush()
+    if progress is not None:
+        progress(total, total)
+    return writer.count
+
+
+def export_balances(customers, f, fmt='csv', chunk_size=1000):
+    writer = RowWriter(f, fmt, ('customer', 'balance'), chunk_size)
+    for customer, balance in sorted(customers.items()):
+        writer.write({'customer': customer, 'balance': to_units(balance)})
+    writer.flush()
+    return writer.count
+
+
+def export_stock(stock, f, fmt='csv', chunk_size=1000):
+    writer = RowWriter(f, fmt, ('product', 'quantity'), chunk_size)
+    for product, quantity in sorted(stock.items()):
+        writer.write({'product': product, 'quantity': quantity})
+    writer.flush()
+    return writer.count
+
+
+def export_all(data, directory, fmt='csv', chunk_size=1000, progress=None, **filters):
+    """Write sales, balances and stock files into `directory`; returns their paths"""
+    os.makedirs(directory, exist_ok=True)
+    extension = FORMATS.get(fmt)
+    if extension is None:
+        raise ValueError(f'Unknown export format: {fmt}')
+    paths = []
+    for name, write in (
+        ('sales', lambda f: export_sales(data['sales_data'], f, fmt, chunk_size, progress, **filters)),
+        ('balances', lambda f: export_balances(data['customers'], f, fmt, chunk_size)),
+        ('stock', lambda f: export_stock(data['stock_data'], f, fmt, chunk_size)),
+    ):
+        path = os.path.join(directory, name + extension)
+        with open(path, 'w', newline='') as f:
+            write(f)
+        paths.append(path)
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Export sales, balances and stock')
+    parser.add_argument('--data', default='sales_stock_data.json', help='data file to read')
+    parser.add_argument('--backend', default=os.environ.get('SALES_STOCK_BACKEND', 'journal'))
+    parser.add_argument('--format', choices=sorted(FORMATS), default='csv')
+    parser.add_argument('--out', default='exports', help='output directory')
+    parser.add_argument('--from', dest='date_from', help='first date, YYYY-MM-DD')
+    parser.add_argument('--to', dest='date_to', help='last date, YYYY-MM-DD')
+    parser.add_argument('--customer')
+    parser.add_argument('--product')
+    parser.add_argument('--status', choices=['credit', 'paid'])
+    args = parser.parse_args()
+
+    # Read-only, like consolidate.py: the app may have the files open
+    storage = open_storage(args.data, args.backend, read_only=True)
+    try:
+        data = storage.load()
+    finally:
+        storage.close()
+    migrate_data(data)
+
+    def progress(done, total):
+        print(f'\rsales: {done}/{total}', end='', flush=True)
+
+    paths = export_all(data, args.out, args.format, progress=progress, date_from=args.date_from,
+                       date_to=args.date_to, customer=args.customer, product=args.product,
+                       status=args.status)
+    print()
+    for path in paths:
+        print(f'wrote {path}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,195 @@
+"""Point-in-time stock levels and customer balances.
+
+Every ledger change that moves stock or a balance (sales, payments,
+stock adjustments, new products, reconciliation and sync) is appended to
+`<name>.history` as one JSON line, stamped with the time it was recorded
+and holding the new absolute values:
+
+    {"t": 1711893600, "type": "payment", "customers": {"Alice": 4000}, "amount": 6000}
+    {"t": 1711893660, "type": "stock", "stock": {"Rice": 42.0}, "adjustment": 12.0}
+
+Every `checkpoint_every` events, on every load and after bulk changes, a
+checkpoint line with the full stock and balances is written too, and its
+time and file offset are added to the small index `<name>.history.idx`.
+An as-of query seeks to the newest checkpoint at or before the requested
+time and replays only the events after it:
+
+    history.state_at('2024-03-31')['customers']    # {customer: cents} at the end of that day
+    history.state_at('2024-03-31 18:00')['stock']
+
+Times are when a change was recorded, so the answer is what the books
+said at that moment (a back-dated sale counts from when it was entered).
+With background writes the ledger records changes on its persistence
+thread (see persistence.py), as they are written.
+History starts at the first checkpoint; earlier times raise HistoryError.
+"""
+import os
+from bisect import bisect_right
+
+from analytics import now_timestamp
+from columnar import format_timestamp, parse_timestamp
+from snapshot_format import json_dumps, json_loads
+
+# Keys of a storage change that are kept in the history
+EVENT_KEYS = ('stock', 'customers', 'amount', 'adjustment')
+
+
+class HistoryError(ValueError):
+    """The requested time is not covered by the history"""
+
+
+def history_path(data_file):
+    return os.path.splitext(data_file)[0] + '.history'
+
+
+def parse_when(when):
+    """'YYYY-MM-DD HH:MM' to a timestamp; a bare date means the end of that day"""
+    return parse_timestamp(when if len(when) > 10 else when + ' 23:59')
+
+
+def trim_torn_tail(path):
+    """Cut an incomplete last line left by a crash mid-append; returns the file size"""
+    if not os.path.exists(path):
+        return 0
+    with open(path, 'r+b') as f:
+        size = f.seek(0, os.SEEK_END)
+        end = size
+        while end > 0:
+            start = max(0, end - 65536)
+            f.seek(start)
+            newline = f.read(end - start).rfind(b'\n')
+            if newline >= 0:
+                end = start + newline + 1
+                break
+            end = start
+        if end < size:
+            f.truncate(end)
+        return end
+
+
+class History:
+    """Append-only log of stock and balance changes with periodic checkpoints"""
+
+    def __init__(self, path, checkpoint_every=1000):
+        self.path = path
+        self.index_path = path + '.idx'
+        self.checkpoint_every = checkpoint_every
+        self.index = []  # (t, offset of the checkpoint line), oldest first
+        self.events_since_checkpoint = 0
+        self.last_t = 0
+        self.events = None
+        size = trim_torn_tail(path)
+        trim_torn_tail(self.index_path)
+        if os.path.exists(self.index_path):
+            with open(self.index_path, 'rb') as f:
+                for line in f:
+                    t, offset = map(int, line.split())
+                    if offset < size:  # The index can be ahead of a history cut by a crash
+                        self.index.append((t, offset))
+        if self.index:
+            self.last_t = self.index[-1][0]
+
+    # Recording
+
+    def start(self, ledger):
+        """Begin recording for a freshly loaded ledger, from a checkpoint of its state"""
+        self.checkpoint(ledger)
+
+    def record(self, change, ledger):
+        """Record one storage change (None for a bulk change) made to `ledger`"""
+        if change is None:
+            self.checkpoint(ledger)
+            return
+        event = {key: change[key] for key in EVENT_KEYS if key in change}
+        if 'stock' not in event and 'customers' not in event:
+            return  # e.g. sync bookkeeping
+        event['t'] = self._now()
+        event['type'] = change.get('type')
+        self._append(event)
+        self.events_since_checkpoint += 1
+        if self.events_since_checkpoint >= self.checkpoint_every:
+            self.checkpoint(ledger)
+
+    def checkpoint(self, ledger):
+        """Write the ledger's full stock and balances as of now"""
+        t = self._now()
+        # Copied in one step each, as this runs on the persistence thread
+        offset = self._append({'t': t, 'type': 'checkpoint', 'stock': dict(ledger.stock_data),
+                               'customers': dict(ledger.customers)})
+        self.events.flush()
+        with open(self.index_path, 'a') as f:
+            f.write(f'{t} {offset}\n')
+        self.index.append((t, offset))
+        self.events_since_checkpoint = 0
+
+    def _now(self):
+        # Never step back, so checkpoints stay sorted if the clock is changed
+        self.last_t = max(self.last_t, now_timestamp())
+        return self.last_t
+
+    def _append(self, event):
+        """Write one line; returns its offset in the file"""
+        if self.events is None:
+            self.events = open(self.path, 'ab')
+        offset = self.events.tell()
+        self.events.write(json_dumps(event) + b'\n')
+        return offset
+
+    def flush(self):
+        if self.events is not None:
+            self.events.flush()
+
+    def close(self):
+        if self.events is not None:
+            self.events.close()
+            self.events = None
+
+    # Queries
+
+    def state_at(self, when):
+        """{'stock': {...}, 'customers': {...}} as they stood at `when`"""
+        t = parse_when(when) if isinstance(when, str) else when
+        position = bisect_right(self.index, (t, float('inf'))) - 1
+        if position < 0:
+            first = format_timestamp(self.index[0][0]) if self.index else None
+            raise HistoryError(f'No history before {first}' if first else 'No history recorded')
+        self.flush()
+        stock = {}
+        customers = {}
+        with open(self.path, 'rb') as f:
+            f.seek(self.index[position][1])
+            for line in f:
+                event = json_loads(line)
+                if event['t'] > t:
+                    break
+                if event['type'] == 'checkpoint':
+                    stock = dict(event['stock'])
+                    customers = dict(event['customers'])
+                    continue
+                stock.update(event.get('stock', ()))
+                for customer, balance in event.get('customers', {}).items():
+                    if balance is None:
+                        customers.pop(customer, None)
+                    else:
+                        customers[customer] = balance
+        return {'stock': stock, 'customers': customers}
+
+
+def main():
+    import argparse  # Not at the top: the ledger imports this module on startup
+
+    parser = argparse.ArgumentParser(description='Stock and balances as of a past time')
+    parser.add_argument('when', help="'YYYY-MM-DD' (end of day) or 'YYYY-MM-DD HH:MM'")
+    parser.add_argument('--data', default='sales_stock_data.json')
+    parser.add_argument('--customer')
+    args = parser.parse_args()
+    history = History(history_path(args.data))
+    state = history.state_at(args.when)
+    if args.customer:
+        print(state['customers'].get(args.customer, 0))
+        return
+    print(json_dumps(state).decode())
+
+
+if __name__ == '__main__':
+    main()
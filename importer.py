@@ -0,0 +1,222 @@
+"""Bulk import of products, stock counts and historical sales.
+
+Rows are read from CSV (with a header row) or JSON Lines, validated one by
+one and collected into an ImportBatch. Nothing touches the ledger until
+`ImportBatch.apply`, which applies every row in one step so the caller can
+persist and refresh once. Expected columns:
+
+    products: name, stock
+    stock:    product, quantity          (sets the absolute count)
+    sales:    customer, product, quantity, unit_price, date[, paid_amount]
+
+Prices and amounts are in currency units (e.g. 12.50) and are stored as
+integer cents.
+
+From the command line (with the app closed):
+
+    python importer.py sales ledger.csv --data sales_stock_data.json
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+from datetime import datetime
+
+from ledger import Ledger
+from money import line_total, to_cents
+
+KINDS = ('products', 'stock', 'sales')
+DATE_FORMATS = ('%Y-%m-%d %H:%M', '%Y-%m-%d')
+
+
+def read_rows(path):
+    """Yield (line number, row dict) from a CSV or JSON Lines file.
+
+    Unparseable JSON lines are yielded as the ValueError describing them.
+    """
+    with open(path, 'r', newline='') as f:
+        if path.endswith('.jsonl') or path.endswith('.ndjson'):
+            for line_no, line in enumerate(f, 1):
+                if line.strip():
+                    try:
+                        yield line_no, json.loads(line)
+                    except ValueError as e:
+                        yield line_no, ValueError(f'invalid JSON: {e}')
+        else:
+            reader = csv.DictReader(f)
+            for row in reader:
+                yield reader.line_num, row
+
+
+def _text(row, field):
+    value = str(row.get(field) or '').strip()
+    if not value:
+        raise ValueError(f'missing {field}')
+    return value
+
+
+def _number(row, field, default=None):
+    value = row.get(field)
+    if value is None or str(value).strip() == '':
+        if default is None:
+            raise ValueError(f'missing {field}')
+        return default
+    try:
+        return float(value)
+    except ValueError:
+        raise ValueError(f'{field} is not a number: {value!r}')
+
+
+def _money(row, field, default=None):
+    value = row.get(field)
+    if value is None or str(value).strip() == '':
+        if default is None:
+            raise ValueError(f'missing {field}')
+        return default
+    try:
+        return to_cents(value)
+    except ValueError:
+        raise ValueError(f'{field} is not an amount: {value!r}')
+
+
+def _date(row):
+    value = _text(row, 'date')
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt).strftime('%Y-%m-%d %H:%M')
+        except ValueError:
+            pass
+    raise ValueError(f'date must be YYYY-MM-DD or YYYY-MM-DD HH:MM: {value!r}')
+
+
+class ImportBatch:
+    """Validated rows of one kind plus the per-row errors found while reading"""
+
+    def __init__(self, kind, data, deduct_stock=False):
+        if kind not in KINDS:
+            raise ValueError(f'Unknown import kind: {kind}')
+        self.kind = kind
+        self.deduct_stock = deduct_stock
+        self.rows = []
+        self.errors = []  # (line number, message)
+        # Stock as it will be after the rows accepted so far
+        self.stock = dict(data['stock_data'])
+
+    def add(self, line_no, row):
+        """Validate one row; invalid rows are recorded in `errors` and skipped"""
+        try:
+            if isinstance(row, Exception):
+                raise row
+            self.rows.append(getattr(self, '_validate_' + self.kind)(row))
+        except (ValueError, TypeError, AttributeError) as e:
+            self.errors.append((line_no, str(e)))
+
+    def _validate_products(self, row):
+        name = _text(row, 'name')
+        stock = _number(row, 'stock', 0.0)
+        if stock < 0:
+            raise ValueError('stock cannot be negative')
+        if name in self.stock:
+            raise ValueError(f'product already exists: {name}')
+        self.stock[name] = stock
+        return name, stock
+
+    def _validate_stock(self, row):
+        product = _text(row, 'product')
+        quantity = _number(row, 'quantity')
+        if product not in self.stock:
+            raise ValueError(f'unknown product: {product}')
+        if quantity < 0:
+            raise ValueError('stock cannot be negative')
+        self.stock[product] = quantity
+        return product, quantity
+
+    def _validate_sales(self, row):
+        customer = _text(row, 'customer')
+        product = _text(row, 'product')
+        quantity = _number(row, 'quantity')
+        unit_price = _money(row, 'unit_price')
+        date = _date(row)
+        paid_amount = _money(row, 'paid_amount', 0)
+        if quantity <= 0 or unit_price <= 0:
+            raise ValueError('quantity and unit_price must be positive')
+        total_amount = line_total(quantity, unit_price)
+        if paid_amount < 0 or paid_amount > total_amount:
+            raise ValueError('paid_amount must be between 0 and the sale total')
+        if self.deduct_stock:
+            if self.stock.get(product, 0) < quantity:
+                raise ValueError(f'insufficient stock for {product}')
+            self.stock[product] -= quantity
+        return {
+            'id': None,
+            'customer': customer,
+            'product': product,
+            'quantity': quantity,
+            'unit_price': unit_price,
+            'total_amount': total_amount,
+            'date': date,
+            'status': 'paid' if paid_amount >= total_amount else 'credit',
+            'paid_amount': paid_amount
+        }
+
+    def apply(self, data):
+        """Apply all accepted rows to a data dict; returns the number applied"""
+        if self.kind == 'sales':
+            sales = data['sales_data']
+            stock = data['stock_data']
+            customers = data['customers']
+            for sale in self.rows:
+                sale['id'] = len(sales) + 1
+                sales.append(sale)
+                outstanding = sale['total_amount'] - sale['paid_amount']
+                if outstanding > 0:
+                    customers[sale['customer']] = customers.get(sale['customer'], 0) + outstanding
+                if self.deduct_stock:
+                    # From the stock as it is now: it may have moved since the batch was read
+                    stock[sale['product']] = stock.get(sale['product'], 0) - sale['quantity']
+        else:
+            for product, quantity in self.rows:
+                data['stock_data'][product] = quantity
+        return len(self.rows)
+
+
+def read_batch(path, kind, data, deduct_stock=False):
+    """Stream `path` into a validated ImportBatch for `kind`"""
+    batch = ImportBatch(kind, data, deduct_stock)
+    try:
+        for line_no, row in read_rows(path):
+            batch.add(line_no, row)
+    except (ValueError, csv.Error) as e:
+        batch.errors.append((None, f'cannot read {path}: {e}'))
+    return batch
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Bulk import products, stock counts or sales')
+    parser.add_argument('kind', choices=KINDS)
+    parser.add_argument('path', help='CSV or JSON Lines file')
+    parser.add_argument('--data', default='sales_stock_data.json', help='data file to update')
+    parser.add_argument('--backend', default=os.environ.get('SALES_STOCK_BACKEND', 'journal'))
+    parser.add_argument('--deduct-stock', action='store_true',
+                        help='deduct imported sales from current stock')
+    parser.add_argument('--skip-errors', action='store_true',
+                        help='import the valid rows even if some rows are rejected')
+    args = parser.parse_args()
+
+    ledger = Ledger.open(args.data, args.backend, history=True)
+    batch = read_batch(args.path, args.kind, ledger.get_data(), args.deduct_stock)
+    for line_no, message in batch.errors:
+        print(f'{args.path}:{line_no}: {message}', file=sys.stderr)
+    if batch.errors and not args.skip_errors:
+        print(f'{len(batch.errors)} invalid rows, nothing imported', file=sys.stderr)
+        ledger.close()
+        sys.exit(1)
+
+    count = ledger.apply_import(batch)
+    ledger.close()
+    print(f'imported {count} {args.kind} rows')
+
+
+if __name__ == '__main__':
+    main()
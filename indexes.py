@@ -0,0 +1,147 @@
+"""In-memory indexes over the sales ledger, maintained incrementally."""
+import heapq
+from collections import deque
+
+
+def sale_order_key(sale):
+    """Stable chronological ordering: minute-resolution date, ties broken by id"""
+    order_key = getattr(sale, 'order_key', None)
+    if order_key is not None:
+        # Columnar rows compare (timestamp, id) without formatting the date
+        return order_key()
+    return (sale['date'], sale['id'])
+
+
+class OpenInvoiceIndex:
+    """Maps each customer to their open credit sales, oldest first"""
+
+    def __init__(self, sales=()):
+        self.by_customer = {}
+        self.rebuild(sales)
+
+    def rebuild(self, sales):
+        self.by_customer = {}
+        if hasattr(sales, 'rows_with_status'):
+            open_sales = sales.rows_with_status('credit')
+        else:
+            open_sales = (sale for sale in sales if sale['status'] == 'credit')
+        for sale in open_sales:
+            self.add(sale)
+        # Imported history can be appended after newer sales
+        for customer, queue in self.by_customer.items():
+            keys = [sale_order_key(sale) for sale in queue]
+            if keys != sorted(keys):
+                self.by_customer[customer] = deque(sorted(queue, key=sale_order_key))
+
+    def add(self, sale):
+        queue = self.by_customer.get(sale['customer'])
+        if queue is None:
+            queue = self.by_customer[sale['customer']] = deque()
+        queue.append(sale)
+
+    def insert(self, sale):
+        """Add a sale that may be older than the customer's newest open sale"""
+        queue = self.by_customer.get(sale['customer'])
+        key = sale_order_key(sale)
+        if not queue or key >= sale_order_key(queue[-1]):
+            self.add(sale)
+            return
+        position = next(i for i, queued in enumerate(queue) if key < sale_order_key(queued))
+        queue.insert(position, sale)
+
+    def discard_settled(self, customer):
+        """Drop the customer's sales that were paid outside `allocate`"""
+        queue = self.by_customer.get(customer)
+        if queue is None:
+            return
+        remaining = deque(sale for sale in queue if sale['status'] == 'credit')
+        if remaining:
+            self.by_customer[customer] = remaining
+        else:
+            del self.by_customer[customer]
+
+    def open_sales(self, customer):
+        return self.by_customer.get(customer, ())
+
+    def allocate(self, customer, amount):
+        """Apply a payment to the customer's open sales, oldest first.
+
+        Returns the sales whose paid_amount or status changed.
+        """
+        queue = self.by_customer.get(customer)
+        if not queue:
+            return []
+        touched = []
+        remaining = amount
+        for sale in queue:
+            if remaining <= 0:
+                break
+            if sale['status'] != 'credit':
+                continue
+            unpaid = sale['total_amount'] - sale['paid_amount']
+            if unpaid > 0:
+                payment_applied = min(remaining, unpaid)
+                sale['paid_amount'] += payment_applied
+                remaining -= payment_applied
+
+                if sale['paid_amount'] >= sale['total_amount']:
+                    sale['status'] = 'paid'
+                touched.append(sale)
+
+        # Drop settled sales from the front of the queue
+        while queue and queue[0]['status'] != 'credit':
+            queue.popleft()
+        if not queue:
+            del self.by_customer[customer]
+        return touched
+
+
+class RecentSales:
+    """The newest `size` sales, newest first.
+
+    Seeded once from the ledger; new sales are normally the newest and are
+    pushed on the front in O(1). `version` changes whenever the displayed
+    set or one of its rows changes, so views can skip redundant redraws.
+    """
+
+    def __init__(self, size=15, sales=()):
+        self.size = size
+        self.version = 0
+        self.rebuild(sales)
+
+    def rebuild(self, sales):
+        if hasattr(sales, 'newest'):
+            newest = sales.newest(self.size)
+        else:
+            newest = heapq.nlargest(self.size, sales, key=sale_order_key)
+        self.sales = deque(newest, maxlen=self.size)
+        self.version += 1
+
+    def add(self, sale):
+        key = sale_order_key(sale)
+        if not self.sales or key >= sale_order_key(self.sales[0]):
+            self.sales.appendleft(sale)
+        elif len(self.sales) < self.size or key > sale_order_key(self.sales[-1]):
+            # Back-dated sale that still belongs on the list
+            position = next((i for i, shown in enumerate(self.sales) if key > sale_order_key(shown)),
+                            len(self.sales))
+            if len(self.sales) == self.size:
+                self.sales.pop()
+            self.sales.insert(position, sale)
+        else:
+            return
+        self.version += 1
+
+    def touch(self, sale):
+        """Record that `sale` changed; returns True if it is currently displayed"""
+        for shown in self.sales:
+            if shown['id'] == sale['id']:
+                self.version += 1
+                return True
+        return False
+
+    def __iter__(self):
+        return iter(self.sales)
+
+    def __len__(self):
+        return len(self.sales)
@@ -0,0 +1,188 @@
+"""Opt-in timers, counters and gauges for diagnosing slow devices.
+
+Off unless the app is started with SALES_STOCK_PROFILE=1. When off,
+`timed` returns the function unchanged and the other calls return
+immediately, so the instrumented code pays close to nothing.
+
+    @timed('ledger.record_sale')
+    def record_sale(...): ...
+
+    with metrics.timer('ui.update_reports'):
+        ...
+    metrics.count('persistence.batches')
+    metrics.add_gauge('memory_rss_mb', memory_rss_mb)
+
+`metrics.snapshot()` returns everything as a dict (latency percentiles
+and log-scale histograms over a rolling window, counters, gauges) and
+`metrics.dump(path)` appends it as one JSON line for offline analysis.
+"""
+import functools
+import json
+import os
+import sys
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+
+ENABLED = os.environ.get('SALES_STOCK_PROFILE') == '1'
+# Histogram bucket upper bounds in milliseconds; the last bucket is open-ended
+BUCKETS_MS = (0.1, 0.5, 1, 5, 10, 16, 50, 100, 500, 1000)
+
+
+class LatencyHistogram:
+    """The last `window` latencies of one operation, plus lifetime count and total"""
+
+    def __init__(self, window=1000):
+        self.samples = deque(maxlen=window)
+        self.count = 0
+        self.total = 0.0
+
+    def add(self, seconds):
+        self.samples.append(seconds)
+        self.count += 1
+        self.total += seconds
+
+    def percentile(self, p, ordered=None):
+        ordered = sorted(self.samples) if ordered is None else ordered
+        if not ordered:
+            return None
+        return ordered[min(int(len(ordered) * p / 100), len(ordered) - 1)]
+
+    def buckets(self):
+        """{'<=1ms': n, ..., '>1000ms': n} over the rolling window"""
+        counts = [0] * (len(BUCKETS_MS) + 1)
+        for seconds in self.samples:
+            ms = seconds * 1000
+            i = 0
+            while i < len(BUCKETS_MS) and ms > BUCKETS_MS[i]:
+                i += 1
+            counts[i] += 1
+        labels = [f'<={bound:g}ms' for bound in BUCKETS_MS] + [f'>{BUCKETS_MS[-1]:g}ms']
+        return dict(zip(labels, counts))
+
+    def summary(self):
+        ordered = sorted(self.samples)
+        return {
+            'count': self.count,
+            'total_s': round(self.total, 6),
+            'p50_ms': _ms(self.percentile(50, ordered)),
+            'p95_ms': _ms(self.percentile(95, ordered)),
+            'p99_ms': _ms(self.percentile(99, ordered)),
+            'max_ms': _ms(ordered[-1] if ordered else None),
+            'histogram': self.buckets()
+        }
+
+
+def _ms(seconds):
+    return None if seconds is None else round(seconds * 1000, 3)
+
+
+class Metrics:
+    """Registry of latency histograms, counters and gauges"""
+
+    def __init__(self, enabled=False, window=1000):
+        self.enabled = enabled
+        self.window = window
+        self.started = time.time()
+        self.latencies = {}
+        self.counters = {}
+        self.gauges = {}  # name -> callable returning a number
+
+    def record(self, name, seconds):
+        histogram = self.latencies.get(name)
+        if histogram is None:
+            histogram = self.latencies.setdefault(name, LatencyHistogram(self.window))
+        histogram.add(seconds)
+
+    @contextmanager
+    def timer(self, name):
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def count(self, name, n=1):
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def add_gauge(self, name, read):
+        self.gauges[name] = read
+
+    def read_gauges(self):
+        values = {}
+        for name, read in self.gauges.items():
+            try:
+                values[name] = read()
+            except Exception as e:  # A broken gauge must not break diagnostics
+                values[name] = f'error: {e}'
+        return values
+
+    def reset(self):
+        self.started = time.time()
+        self.latencies = {}
+        self.counters = {}
+
+    def snapshot(self):
+        return {
+            'at': datetime.now().isoformat(timespec='seconds'),
+            'enabled': self.enabled,
+            'uptime_s': round(time.time() - self.started, 1),
+            'latencies': {name: histogram.summary()
+                          for name, histogram in sorted(self.latencies.items())},
+            'counters': dict(sorted(self.counters.items())),
+            'gauges': self.read_gauges()
+        }
+
+    def dump(self, path):
+        """Append the current snapshot to `path` as one JSON line"""
+        with open(path, 'a') as f:
+            f.write(json.dumps(self.snapshot()) + '\n')
+
+    def report_lines(self):
+        """Human-readable summary for the diagnostics screen"""
+        snapshot = self.snapshot()
+        lines = []
+        for name, summary in snapshot['latencies'].items():
+            lines.append(f"{name}: n={summary['count']} p50={summary['p50_ms']}ms "
+                         f"p95={summary['p95_ms']}ms max={summary['max_ms']}ms")
+        lines.extend(f'{name}: {value}' for name, value in snapshot['counters'].items())
+        lines.extend(f'{name}: {value}' for name, value in snapshot['gauges'].items())
+        return lines
+
+
+metrics = Metrics(enabled=ENABLED)
+
+
+def timed(name):
+    """Decorator recording each call's duration under `name` (a no-op when disabled)"""
+    def decorate(function):
+        if not metrics.enabled:
+            return function
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                metrics.record(name, time.perf_counter() - start)
+        return wrapper
+    return decorate
+
+
+def memory_rss_mb():
+    """Resident memory of this process in MB (peak RSS where current is unavailable)"""
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+        return round(pages * os.sysconf('SC_PAGE_SIZE') / 1e6, 1)
+    except (OSError, ValueError, AttributeError):
+        pass
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1e6 if sys.platform == 'darwin' else 1e3), 1)
@@ -0,0 +1,580 @@
+"""Headless sales and stock ledger.
+
+All business rules live here, with no UI dependencies, so the same code
+runs in the Kivy app, in command-line tools, on a server and in
+benchmarks:
+
+    ledger = Ledger.open('sales_stock_data.json')
+    ledger.add_product('Rice', 50)
+    ledger.record_sale('Alice', 'Rice', 2, 50000)     # 2 x 500.00
+    ledger.record_payment('Alice', 40000)
+    ledger.close()
+
+With a History attached (`Ledger.open(path, history=True)`), every change
+to stock or balances is also logged with its time, for as-of queries.
+
+Money (prices, payments, balances) is passed and stored as integer cents;
+use money.to_cents / money.format_money at the edges. Mutations raise
+LedgerError when a rule is violated; the message is meant to be shown to
+the user as is.
+"""
+from datetime import datetime
+
+from aggregates import LedgerAggregates
+from analytics import SalesAnalytics, outstanding_by_customer
+from columnar import SalesTable
+from history import History, history_path
+from indexes import OpenInvoiceIndex, RecentSales
+from instrumentation import metrics, timed
+from money import line_total
+from persistence import PersistenceWorker
+from reorder import ReorderIndex
+from search import NameIndex
+from storage import FORMAT_VERSION, empty_data, migrate_data, open_storage
+from sync import make_event_id, new_device_id, split_event_id
+
+
+class LedgerError(ValueError):
+    """A mutation was rejected by a business rule"""
+
+
+class Ledger:
+    """Sales, stock levels and customer balances plus their in-memory indexes.
+
+    Every mutation builds one storage change. Without a background writer
+    changes are written synchronously; `start_background_writes` hands them
+    to a PersistenceWorker instead.
+    """
+
+    def __init__(self, storage=None, recent_size=15, history=None):
+        self.sales_data = SalesTable()
+        self.stock_data = {}
+        self.customers = {}  # Outstanding credit balance per customer
+        self.open_invoices = OpenInvoiceIndex()  # Open credit sales per customer
+        self.aggregates = LedgerAggregates()  # Running report totals
+        self.recent_sales = RecentSales(size=recent_size)
+        self.customer_index = NameIndex()  # Every customer ever sold to
+        self.product_index = NameIndex()
+        self.reorder = ReorderIndex()  # Low-stock alerts and stockout forecasts
+        self.analytics = SalesAnalytics(self)  # Cached until `version` changes
+        self.version = 0  # Bumped by every mutation and reload
+        self.last_sale_id = 0  # Highest local sale id; restored snapshots can leave gaps
+        self.last_reconciliation = None  # Drift report from the last load
+        self.last_recovery = None  # Damaged snapshots skipped by the last load
+        self.sync = None  # {'device_id', 'seen': {device: seq}, 'cursor'} once sync is enabled
+        self.outbox = []  # This device's events not yet acknowledged by the sync server
+        self.storage = storage
+        self.persistence = None
+        self.history = history  # History of stock and balances, started by load()
+
+    @classmethod
+    def open(cls, path, backend='journal', history=False, **options):
+        """Open the ledger stored at `path` with the given storage backend"""
+        ledger = cls(open_storage(path, backend, **options),
+                     history=History(history_path(path)) if history else None)
+        ledger.load()
+        return ledger
+
+    # Persistence
+
+    @timed('ledger.load')
+    def load(self):
+        """Load the ledger from storage, rebuild the indexes and reconcile balances.
+
+        Data in an older format is upgraded and saved back first. Balance
+        drift found on load is repaired; the report is kept in
+        `last_reconciliation`. If the storage had to fall back to an older
+        snapshot, its report is kept in `last_recovery`.
+        """
+        data = self.storage.load() if self.storage is not None else empty_data()
+        self.last_recovery = self.storage.recovery if self.storage is not None else None
+        migrated = migrate_data(data)
+        sales = data['sales_data']
+        self.sales_data = sales if isinstance(sales, SalesTable) else SalesTable(sales)
+        del data['sales_data'], sales  # Let the row dicts be freed before indexing
+        self.stock_data = data['stock_data']
+        self.customers = data['customers']
+        self.sync = data.get('sync')
+        self.outbox = data.get('outbox', [])
+        self.reorder.thresholds = data.get('reorder_thresholds', {})
+        self.rebuild_indexes(data.get('aggregates'))
+        if migrated:
+            # Rewrite in the new format before anything is journaled on top of it
+            self.save()
+        self.last_reconciliation = self.reconcile()
+        if self.history is not None:
+            self.history.start(self)
+
+    def clear(self):
+        """Start from an empty ledger"""
+        self.sales_data = SalesTable()
+        self.stock_data = {}
+        self.customers = {}
+        self.sync = None
+        self.outbox = []
+        self.reorder.thresholds = {}
+        self.rebuild_indexes()
+
+    def rebuild_indexes(self, stored_aggregates=None):
+        """Rebuild the in-memory indexes after the ledger was loaded or bulk-modified"""
+        self.version += 1
+        self.last_sale_id = max(self.sales_data.ids, default=0)
+        self.open_invoices.rebuild(self.sales_data)
+        self.recent_sales.rebuild(self.sales_data)
+        self.customer_index.rebuild(set(self.sales_data.customer_names.values) | set(self.customers))
+        self.product_index.rebuild(self.stock_data)
+        self.reorder.rebuild(self.sales_data, self.stock_data)
+        self.aggregates = LedgerAggregates.load(stored_aggregates, self.sales_data, self.customers)
+
+    def get_data(self):
+        """Snapshot of the ledger that a persistence thread can serialize safely"""
+        # Copies are taken atomically (or, for the sales table, up to the last
+        # complete row); sales are only ever updated in place, and the journal
+        # replays absolute values on load
+        data = {
+            'sales_data': self.sales_data.copy(),
+            'stock_data': dict(self.stock_data),
+            'customers': dict(self.customers),
+            'aggregates': self.aggregates.to_dict(),
+            'format_version': FORMAT_VERSION
+        }
+        if self.reorder.thresholds:
+            data['reorder_thresholds'] = dict(self.reorder.thresholds)
+        if self.sync is not None:
+            data['sync'] = self.sync_state()
+            data['outbox'] = list(self.outbox)
+        return data
+
+    def start_background_writes(self, on_error=None):
+        """Write changes, and record them in the history, on a background thread from now on"""
+        if self.persistence is None and self.storage is not None:
+            history = self.history
+            record = None if history is None else lambda change: history.record(change, self)
+            self.persistence = PersistenceWorker(self.storage, self.get_data, on_error=on_error,
+                                                 record=record)
+
+    def save(self, change=None):
+        """Persist one change, or the whole ledger when no change is given"""
+        self.version += 1  # Every mutation saves exactly once
+        if self.persistence is not None:
+            self.persistence.submit(change)  # Recorded in the history on its thread too
+            return
+        if self.history is not None:
+            self.history.record(change, self)
+        if self.storage is None:
+            return
+        elif change is None:
+            with metrics.timer('storage.save'):
+                self.storage.save(self.get_data())
+        else:
+            with metrics.timer('storage.append'):
+                self.storage.append([change], self.get_data)
+
+    def flush(self):
+        """Make sure everything recorded so far is on disk"""
+        if self.persistence is not None:
+            self.persistence.flush()
+        elif self.storage is not None:
+            self.storage.flush()
+        if self.history is not None:
+            self.history.flush()
+
+    def detach(self):
+        """Stop persisting: close the storage and history and save nothing from now on"""
+        self.close()
+        self.storage = None
+        self.history = None
+
+    def close(self):
+        if self.persistence is not None:
+            self.persistence.close()  # Writes the history of what is still queued
+            self.persistence = None
+        elif self.storage is not None:
+            self.storage.close()
+        if self.history is not None:
+            self.history.close()
+
+    # Queries
+
+    def total_outstanding(self):
+        """Total outstanding credit across all customers"""
+        return self.aggregates.total_outstanding
+
+    @timed('ledger.reconcile')
+    def reconcile(self, repair=True):
+        """Recompute every customer balance from the open sales and report drift.
+
+        Returns {'customers': number checked, 'drift': {customer: (stored,
+        actual)}} in cents, where None means no balance entry. With `repair`,
+        drifted balances are replaced by the amounts owed on the sales and the
+        fix is saved.
+        """
+        actual = outstanding_by_customer(self.sales_data)
+        drift = {}
+        for customer in set(actual) | set(self.customers):
+            stored = self.customers.get(customer)
+            owed = actual.get(customer)
+            if stored != owed:
+                drift[customer] = (stored, owed)
+        if drift and repair:
+            changes = {}
+            for customer, (_, owed) in drift.items():
+                if owed is None:
+                    del self.customers[customer]
+                else:
+                    self.customers[customer] = owed
+                changes[customer] = owed
+                self.aggregates.set_balance(customer, owed)
+            self.save({'type': 'reconcile', 'customers': changes})
+        return {'customers': len(actual), 'drift': drift}
+
+    def search_customers(self, query, limit=10, with_balance=False):
+        """Customer names matching `query`; only those owing money if `with_balance`"""
+        accept = self.customers.__contains__ if with_balance else None
+        return self.customer_index.search(query, limit, accept)
+
+    def search_products(self, query, limit=10):
+        return self.product_index.search(query, limit)
+
+    # Mutations
+
+    @timed('ledger.record_sale')
+    def record_sale(self, customer, product, quantity, unit_price, date=None):
+        """Record a credit sale and take it out of stock; returns the sale"""
+        if not customer or quantity <= 0 or unit_price <= 0:
+            raise LedgerError('Please fill all fields with valid values')
+        if product not in self.stock_data or self.stock_data[product] < quantity:
+            raise LedgerError(f'Insufficient stock for {product}')
+
+        total_amount = line_total(quantity, unit_price)
+        self.sales_data.append({
+            'id': self.next_sale_id(),
+            'customer': customer,
+            'product': product,
+            'quantity': quantity,
+            'unit_price': unit_price,
+            'total_amount': total_amount,
+            'date': date or datetime.now().strftime('%Y-%m-%d %H:%M'),
+            'status': 'credit',
+            'paid_amount': 0
+        })
+        sale = self.sales_data[-1]
+        self.open_invoices.insert(sale)  # `date` can be in the past
+        self.recent_sales.add(sale)
+        self.aggregates.record_sale(sale)
+        self.customer_index.add(customer)
+
+        self.customers[customer] = self.customers.get(customer, 0) + total_amount
+        self.aggregates.set_balance(customer, self.customers[customer])
+        self.stock_data[product] -= quantity
+        self.reorder.record_sale(sale)
+        self.reorder.set_stock(product, self.stock_data[product])
+
+        change = {
+            'type': 'sale',
+            'sales': [dict(sale)],
+            'stock': {product: self.stock_data[product]},
+            'customers': {customer: self.customers[customer]}
+        }
+        if self.sync is not None:
+            self._queue_event(change, self._sale_event(sale))
+        self.save(change)
+        return sale
+
+    @timed('ledger.record_payment')
+    def record_payment(self, customer, amount):
+        """Apply a payment to the customer's oldest open sales; returns the sales it touched"""
+        if amount <= 0:
+            raise LedgerError('Please enter a valid payment amount')
+        if customer not in self.customers:
+            raise LedgerError(f'No outstanding credit for {customer}')
+        if amount > self.customers[customer]:
+            raise LedgerError('Payment amount exceeds customer balance')
+
+        self.customers[customer] -= amount
+        if self.sync is not None:
+            paid_before = {sale['id']: sale['paid_amount']
+                           for sale in self.open_invoices.open_sales(customer)}
+        paid_sales = self.open_invoices.allocate(customer, amount)
+
+        # Remove customer if balance is zero
+        if self.customers[customer] == 0:
+            del self.customers[customer]
+        self.aggregates.record_payment(amount)
+        self.aggregates.set_balance(customer, self.customers.get(customer))
+
+        change = {
+            'type': 'payment',
+            'sales': [dict(sale) for sale in paid_sales],
+            'customers': {customer: self.customers.get(customer)},
+            'amount': amount
+        }
+        if self.sync is not None:
+            self._queue_event(change, {
+                'id': self._next_event_id(),
+                'type': 'payment',
+                'customer': customer,
+                'amount': amount,
+                'date': datetime.now().strftime('%Y-%m-%d %H:%M'),
+                'allocations': [[sale['id'], sale['paid_amount'] - paid_before[sale['id']]]
+                                for sale in paid_sales]
+            })
+        self.save(change)
+        return paid_sales
+
+    def add_product(self, name, initial_stock):
+        if not name or initial_stock < 0:
+            raise LedgerError('Please enter valid product name and stock')
+        if name in self.stock_data:
+            raise LedgerError('Product already exists')
+
+        self.stock_data[name] = initial_stock
+        self.product_index.add(name)
+        self.reorder.set_stock(name, initial_stock)
+        change = {'type': 'product', 'stock': {name: initial_stock}}
+        if self.sync is not None:
+            self._queue_event(change, self._stock_event(name, initial_stock))
+        self.save(change)
+
+    def adjust_stock(self, product, adjustment):
+        """Add (or with a negative adjustment remove) stock; returns the new level"""
+        if product not in self.stock_data:
+            raise LedgerError(f'Unknown product: {product}')
+        new_stock = self.stock_data[product] + adjustment
+        if new_stock < 0:
+            raise LedgerError('Stock cannot be negative')
+
+        self.stock_data[product] = new_stock
+        self.reorder.set_stock(product, new_stock)
+        change = {'type': 'stock', 'stock': {product: new_stock}, 'adjustment': adjustment}
+        if self.sync is not None:
+            self._queue_event(change, self._stock_event(product, adjustment))
+        self.save(change)
+        return new_stock
+
+    def set_reorder_threshold(self, product, threshold):
+        """Mark `product` low below `threshold` units; None restores the default"""
+        if product not in self.stock_data:
+            raise LedgerError(f'Unknown product: {product}')
+        if threshold is not None and threshold < 0:
+            raise LedgerError('Reorder level cannot be negative')
+        # Thresholds are a setting of this device and are not synced
+        self.reorder.set_threshold(product, threshold)
+        self.save({'type': 'threshold', 'reorder_thresholds': dict(self.reorder.thresholds)})
+
+    @timed('ledger.apply_import')
+    def apply_import(self, batch):
+        """Apply a validated ImportBatch and save it as one change; returns the row count"""
+        first_new = len(self.sales_data)
+        stock_before = dict(self.stock_data)
+        customers_before = dict(self.customers)
+        outbox_before = len(self.outbox)
+        count = batch.apply({
+            'sales_data': self.sales_data,
+            'stock_data': self.stock_data,
+            'customers': self.customers
+        })
+        # Give the new rows ids no sale has (device-unique with sync) and
+        # queue them for other devices
+        for i in range(first_new, len(self.sales_data)):
+            sale = self.sales_data[i]
+            sale['id'] = self.next_sale_id()
+            if self.sync is not None:
+                self.outbox.append(self._sale_event(sale, deduct=batch.deduct_stock))
+        if self.sync is not None and batch.kind in ('products', 'stock'):
+            for product, quantity in self.stock_data.items():
+                if product not in stock_before or quantity != stock_before[product]:
+                    self.outbox.append(self._stock_event(
+                        product, quantity - stock_before.get(product, 0)))
+        self.rebuild_indexes()
+        # Only what the import touched, so storage writes grow with the
+        # import rather than the ledger
+        change = {
+            'type': 'import',
+            'sales': [dict(self.sales_data[i]) for i in range(first_new, len(self.sales_data))],
+            'stock': {product: quantity for product, quantity in self.stock_data.items()
+                      if product not in stock_before or quantity != stock_before[product]},
+            'customers': {customer: balance for customer, balance in self.customers.items()
+                          if balance != customers_before.get(customer)}
+        }
+        if self.sync is not None:
+            change['outbox'] = self.outbox[outbox_before:]
+            change['sync'] = self.sync_state()
+        self.save(change)
+        return count
+
+    def next_sale_id(self):
+        if self.sync is None:
+            self.last_sale_id += 1
+            return self.last_sale_id
+        return self._next_event_id()
+
+    # Sync (see sync.py)
+
+    def sync_state(self):
+        """Copy of the sync state, for storage"""
+        return dict(self.sync, seen=dict(self.sync['seen']))
+
+    def enable_sync(self, device_id=None):
+        """Give this device a sync identity and queue its existing data as events.
+
+        Existing sales get device-unique ids and current stock levels are
+        queued as stock events, so a device can start syncing with the data
+        it already has. Does nothing if sync is already enabled.
+        """
+        if self.sync is not None:
+            return
+        self.sync = {'device_id': device_id or new_device_id(), 'seen': {}, 'cursor': 0}
+        for sale in self.sales_data:
+            sale['id'] = self._next_event_id()
+            self.outbox.append(self._sale_event(sale, deduct=False))
+        for product, quantity in self.stock_data.items():
+            self.outbox.append(self._stock_event(product, quantity))
+        self.rebuild_indexes()
+        self.save()
+
+    def mark_pushed(self, last_id):
+        """The sync server has every outbox event up to `last_id`"""
+        self.outbox = [event for event in self.outbox if event['id'] > last_id]
+        self.save({'type': 'pushed', 'pushed': last_id})
+
+    @timed('ledger.apply_events')
+    def apply_events(self, events, cursor=None):
+        """Apply events pulled from other devices and remember the server `cursor`.
+
+        Events already applied are skipped. Returns {'applied': count,
+        'overpaid': {customer: cents}}, where `overpaid` is payment money
+        allocated to sales that were already paid (by another device).
+        """
+        seen = self.sync['seen']
+        touched = {}  # Sale id -> sale
+        stock = set()
+        customers = set()
+        overpaid = {}
+        applied = 0
+        for event in events:
+            device, seq = split_event_id(event['id'])
+            if seq <= seen.get(str(device), 0):
+                continue
+            seen[str(device)] = seq
+            applied += 1
+            if event['type'] == 'sale':
+                sale = self._apply_sale_event(event)
+                touched[sale['id']] = sale
+                customers.add(sale['customer'])
+                if event['deduct']:
+                    stock.add(sale['product'])
+            elif event['type'] == 'payment':
+                customer = event['customer']
+                excess = self._apply_payment_event(event, touched)
+                if excess:
+                    overpaid[customer] = overpaid.get(customer, 0) + excess
+                customers.add(customer)
+            elif event['type'] == 'stock':
+                product = event['product']
+                self.stock_data[product] = self.stock_data.get(product, 0) + event['delta']
+                self.product_index.add(product)
+                stock.add(product)
+        if not applied and cursor in (None, self.sync['cursor']):
+            return {'applied': 0, 'overpaid': {}}
+        for customer in customers:
+            self.aggregates.set_balance(customer, self.customers.get(customer))
+        for product in stock:
+            self.reorder.set_stock(product, self.stock_data[product])
+        if cursor is not None:
+            self.sync['cursor'] = cursor
+        self.save({
+            'type': 'sync',
+            'sales': [dict(sale) for sale in touched.values()],
+            'stock': {product: self.stock_data[product] for product in stock},
+            'customers': {customer: self.customers.get(customer) for customer in customers},
+            'sync': self.sync_state()
+        })
+        return {'applied': applied, 'overpaid': overpaid}
+
+    def _apply_sale_event(self, event):
+        customer = event['customer']
+        product = event['product']
+        total_amount = event['total_amount']
+        paid_amount = min(event['paid'], total_amount)
+        self.sales_data.append({
+            'id': event['id'],
+            'customer': customer,
+            'product': product,
+            'quantity': event['quantity'],
+            'unit_price': event['unit_price'],
+            'total_amount': total_amount,
+            'date': event['date'],
+            'status': 'paid' if paid_amount >= total_amount else 'credit',
+            'paid_amount': paid_amount
+        })
+        sale = self.sales_data[-1]
+        if sale['status'] == 'credit':
+            self.open_invoices.insert(sale)
+            self.customers[customer] = (self.customers.get(customer, 0)
+                                        + total_amount - paid_amount)
+        self.recent_sales.add(sale)
+        self.reorder.record_sale(sale)
+        self.aggregates.record_sale(sale)
+        self.aggregates.record_payment(paid_amount)
+        self.customer_index.add(customer)
+        if event['deduct']:
+            self.stock_data[product] = self.stock_data.get(product, 0) - event['quantity']
+            self.product_index.add(product)
+        return sale
+
+    def _apply_payment_event(self, event, touched):
+        """Pay the sales the payment was allocated to; returns the amount left over"""
+        customer = event['customer']
+        open_sales = {sale['id']: sale for sale in self.open_invoices.open_sales(customer)}
+        paid = 0
+        excess = 0
+        for sale_id, amount in event['allocations']:
+            sale = open_sales.get(sale_id)
+            unpaid = sale['total_amount'] - sale['paid_amount'] if sale is not None else 0
+            applied = min(amount, unpaid)
+            excess += amount - applied
+            if applied:
+                sale['paid_amount'] += applied
+                if sale['paid_amount'] >= sale['total_amount']:
+                    sale['status'] = 'paid'
+                self.recent_sales.touch(sale)
+                touched[sale_id] = sale
+                paid += applied
+        if paid:
+            self.customers[customer] -= paid
+            if self.customers[customer] == 0:
+                del self.customers[customer]
+            self.aggregates.record_payment(paid)
+            self.open_invoices.discard_settled(customer)
+        return excess
+
+    def _next_event_id(self):
+        device_id = self.sync['device_id']
+        seen = self.sync['seen']
+        seq = seen.get(str(device_id), 0) + 1
+        seen[str(device_id)] = seq
+        return make_event_id(device_id, seq)
+
+    def _queue_event(self, change, event):
+        """Add `event` to the outbox and to the storage change recording the mutation"""
+        self.outbox.append(event)
+        change['outbox'] = [event]
+        change['sync'] = self.sync_state()
+
+    def _sale_event(self, sale, deduct=True):
+        return {
+            'id': sale['id'],
+            'type': 'sale',
+            'customer': sale['customer'],
+            'product': sale['product'],
+            'quantity': sale['quantity'],
+            'unit_price': sale['unit_price'],
+            'total_amount': sale['total_amount'],
+            'date': sale['date'],
+            'paid': sale['paid_amount'],
+            'deduct': deduct
+        }
+
+    def _stock_event(self, product, delta):
+        return {'id': self._next_event_id(), 'type': 'stock', 'product': product, 'delta': delta}
@@ -0,0 +1,45 @@
+"""Money as integer cents.
+
+Amounts inside the ledger (prices, sale totals, payments, balances) are
+ints counting minor units, so sums and comparisons are exact. Conversion
+happens only at the edges: parsing user input and files, and formatting
+for display and export.
+"""
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+
+CENTS = 100
+_ONE = Decimal(1)
+
+
+def to_cents(value):
+    """'12.34', 12.34 or Decimal('12.34') to 1234, rounding half up to the cent"""
+    if isinstance(value, str):
+        value = value.strip()
+    elif isinstance(value, float):
+        value = repr(value)  # Shortest repr, so 0.1 means 0.1 and not its binary value
+    try:
+        amount = Decimal(value)
+    except (InvalidOperation, TypeError):
+        raise ValueError(f'not an amount: {value!r}')
+    if not amount.is_finite():
+        raise ValueError(f'not an amount: {value!r}')
+    return int((amount * CENTS).quantize(_ONE, rounding=ROUND_HALF_UP))
+
+
+def line_total(quantity, unit_price):
+    """Total in cents for `quantity` units at `unit_price` cents, rounded half up"""
+    if isinstance(quantity, int) or quantity == int(quantity):
+        return int(quantity) * unit_price
+    return int((Decimal(repr(quantity)) * unit_price).quantize(_ONE, rounding=ROUND_HALF_UP))
+
+
+def to_units(cents):
+    """Cents as a number of currency units, for JSON/CSV export (1234 -> 12.34)"""
+    return cents / CENTS
+
+
+def format_money(cents):
+    """1234 -> '12.34', -5 -> '-0.05'"""
+    sign = '-' if cents < 0 else ''
+    whole, fraction = divmod(abs(cents), CENTS)
+    return f'{sign}{whole}.{fraction:02d}'
@@ -0,0 +1,92 @@
+"""Write-behind persistence so UI handlers never wait on disk I/O."""
+import queue
+import threading
+
+from instrumentation import metrics
+
+_FLUSH = object()
+_STOP = object()
+
+
+class PersistenceWorker:
+    """Background thread that owns a storage backend.
+
+    `submit` queues a change (or None for a full save) and returns
+    immediately. The thread drains everything queued since its last write
+    and hands it to the backend as one batch, so a burst of mutations costs
+    a single journal write / transaction / file rewrite. A full save in a
+    batch supersedes the changes around it, because every queued change was
+    already applied to the in-memory ledger the snapshot is taken from.
+
+    `get_data` is called on the worker thread and must return a data dict
+    that is safe to serialize while the UI keeps mutating the ledger.
+    `record(change)`, if given, is called there too for every change before
+    the batch is written, e.g. to log it to the ledger's History. Failures
+    are passed to `on_error` (also on the worker thread).
+    """
+
+    def __init__(self, storage, get_data, on_error=None, max_pending=256, record=None):
+        self.storage = storage
+        self.get_data = get_data
+        self.on_error = on_error
+        self.record = record
+        self.queue = queue.Queue(maxsize=max_pending)
+        self.thread = threading.Thread(target=self._run, name='persistence', daemon=True)
+        self.thread.start()
+
+    def submit(self, change=None):
+        """Queue a change for writing; blocks only if `max_pending` writes are backed up"""
+        self.queue.put(change)
+
+    def flush(self):
+        """Block until everything submitted so far is written and synced to disk"""
+        self.queue.put(_FLUSH)
+        self.queue.join()
+
+    def close(self):
+        """Flush outstanding writes, stop the thread and close the backend"""
+        if not self.thread.is_alive():
+            return
+        self.queue.put(_STOP)
+        self.thread.join()
+
+    def _run(self):
+        while True:
+            batch = [self.queue.get()]
+            while True:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = _STOP in batch
+            try:
+                self._write(batch)
+                if stop or _FLUSH in batch:
+                    self.storage.flush()
+                if stop:
+                    self.storage.close()
+            except Exception as e:
+                if self.on_error is not None:
+                    self.on_error(e)
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+            if stop:
+                return
+
+    def _write(self, batch):
+        changes = [item for item in batch if item is not _FLUSH and item is not _STOP]
+        if not changes:
+            return
+        if self.record is not None:
+            with metrics.timer('history.record'):
+                for change in changes:
+                    self.record(change)
+        metrics.count('persistence.batches')
+        metrics.count('persistence.changes', len(changes))
+        if None in changes:
+            with metrics.timer('storage.save'):
+                self.storage.save(self.get_data())
+        else:
+            with metrics.timer('storage.append'):
+                self.storage.append(changes, self.get_data)
@@ -0,0 +1,58 @@
+"""Batched UI refreshes: mark regions dirty, redraw once per frame."""
+from kivy.clock import Clock
+
+from instrumentation import metrics
+
+
+class RefreshScheduler:
+    """Coalesces refresh requests into a single update on the next frame.
+
+    Each region (balance label, sales list, stock list, reports) registers
+    a full `refresh()` and optionally a `refresh_rows(keys)` for redrawing
+    individual rows. Marking a region dirty any number of times before the
+    next frame costs one redraw. Regions on a tab that is not showing stay
+    dirty until `show_tab` is called for it.
+    """
+
+    def __init__(self):
+        self.regions = {}  # name -> (refresh, refresh_rows, tab)
+        self.dirty = {}  # name -> None for a full refresh, else a set of row keys
+        self.current_tab = None
+        self.trigger = Clock.create_trigger(self.flush)
+
+    def register(self, name, refresh, refresh_rows=None, tab=None):
+        self.regions[name] = (refresh, refresh_rows, tab)
+
+    def mark(self, *names, rows=None):
+        """Schedule a refresh of the given regions, or only of `rows` within them.
+
+        Regions that are not registered yet (lazily built tabs) are skipped;
+        they draw the current data when they are built.
+        """
+        for name in names:
+            if name not in self.regions:
+                continue
+            if rows is None or name in self.dirty and self.dirty[name] is None:
+                self.dirty[name] = None
+            else:
+                self.dirty.setdefault(name, set()).update(rows)
+        self.trigger()
+
+    def show_tab(self, tab):
+        """The visible tab changed; refresh whatever went stale on it"""
+        self.current_tab = tab
+        if self.dirty:
+            self.trigger()
+
+    def flush(self, dt=None):
+        metrics.count('ui.refresh_frames')
+        for name in list(self.dirty):
+            refresh, refresh_rows, tab = self.regions[name]
+            if tab is not None and tab is not self.current_tab:
+                continue
+            rows = self.dirty.pop(name)
+            with metrics.timer('ui.refresh.' + name):
+                if rows is None or refresh_rows is None:
+                    refresh()
+                else:
+                    refresh_rows(rows)
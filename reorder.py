@@ -0,0 +1,194 @@
+"""Low-stock alerts and days-until-stockout forecasts, kept up to date as the ledger changes.
+
+Each product is low while its stock is below its reorder threshold (its
+own, or DEFAULT_THRESHOLD). Its sales velocity is an exponentially
+weighted average of units sold, halving in weight every
+`half_life_days`, so recent demand counts most and a new sale updates it
+in O(1) without rescanning the sales. Days until stockout is stock on
+hand divided by that velocity.
+
+Products are ranked in a min-heap, low products first, then by days
+until stockout. All velocities decay at the same rate, so the ranking
+only changes when a product's own stock, sales or threshold change; an
+update pushes a new heap entry and the old one is skipped when it
+surfaces. The reorder list is then the first few valid heap entries:
+
+    ledger.reorder.reorder_list(20)
+    ledger.reorder.is_low('Rice')
+"""
+import heapq
+import math
+
+from analytics import DAY, now_timestamp
+from columnar import format_timestamp, parse_timestamp
+
+DEFAULT_THRESHOLD = 10  # Stock below this is low unless the product has its own threshold
+HALF_LIFE_DAYS = 14
+HISTORY_HALF_LIVES = 8  # Older sales weigh under 0.4% and are not read on rebuild
+
+
+class ReorderIndex:
+    """Per-product thresholds, low-stock set, sales velocity and a stockout ranking"""
+
+    def __init__(self, half_life_days=HALF_LIFE_DAYS, default_threshold=DEFAULT_THRESHOLD):
+        self.tau = half_life_days * DAY / math.log(2)  # Decay time constant in seconds
+        self.horizon = int(HISTORY_HALF_LIVES * half_life_days * DAY)
+        self.default_threshold = default_threshold
+        self.thresholds = {}  # Only products with their own threshold
+        self.stock = {}
+        self.low = set()
+        # Units sold per product, each sale weighted by exp((t - origin) / tau);
+        # scaling every weight to one fixed origin keeps them comparable
+        self.weights = {}
+        self.origin = now_timestamp()
+        self.since = self.origin  # Start of the sales history the velocities are estimated from
+        self.keys = {}  # The valid heap entry of each product
+        self.heap = []
+
+    def rebuild(self, sales, stock, now=None):
+        """Recompute everything from the ledger's SalesTable and stock levels"""
+        now = now_timestamp() if now is None else now
+        self.origin = now
+        self.since = now
+        self.stock = {}
+        self.low = set()
+        self.weights = {}
+        self.keys = {}
+        self.heap = []
+        if len(sales):
+            rows = sales.select(date_from=format_timestamp(now - self.horizon))
+            timestamps = sales.timestamps
+            product_ids = sales.product_ids
+            quantities = sales.column('quantity')
+            names = sales.product_names.values
+            weights = {}
+            decay = {}  # Timestamps are per minute, so many sales share one
+            tau = self.tau
+            for i in rows:
+                t = timestamps[i]
+                factor = decay.get(t)
+                if factor is None:
+                    factor = decay[t] = math.exp((t - now) / tau)
+                key = product_ids[i]
+                weights[key] = weights.get(key, 0.0) + quantities[i] * factor
+            if decay:
+                self.since = min(decay)
+            self.weights = {names[key]: weight for key, weight in weights.items()}
+        for product, quantity in stock.items():
+            self.stock[product] = quantity
+            if quantity < self.threshold(product):
+                self.low.add(product)
+            self.keys[product] = self._key(product)
+        self.heap = list(self.keys.values())
+        heapq.heapify(self.heap)
+
+    # Updates
+
+    def record_sale(self, sale):
+        """Count a sale towards its product's velocity; stock is updated by set_stock"""
+        product = sale['product']
+        t = parse_timestamp(sale['date'])
+        if t < self.origin - self.horizon:
+            return  # Too old to count, as on rebuild
+        self.weights[product] = (self.weights.get(product, 0.0)
+                                 + sale['quantity'] * math.exp((t - self.origin) / self.tau))
+        self.since = min(self.since, t)
+        self._update(product)
+
+    def set_stock(self, product, quantity):
+        self.stock[product] = quantity
+        self._update(product)
+
+    def set_threshold(self, product, threshold):
+        """Set a product's reorder threshold; None goes back to the default"""
+        if threshold is None:
+            self.thresholds.pop(product, None)
+        else:
+            self.thresholds[product] = threshold
+        self._update(product)
+
+    def _update(self, product):
+        if product not in self.stock:
+            return  # Sold before it was stocked (sync); ranked once it is
+        if self.stock[product] < self.threshold(product):
+            self.low.add(product)
+        else:
+            self.low.discard(product)
+        key = self._key(product)
+        if key != self.keys.get(product):
+            self.keys[product] = key
+            heapq.heappush(self.heap, key)
+            if len(self.heap) > 2 * len(self.keys) + 64:
+                # Too many stale entries; drop them
+                self.heap = list(self.keys.values())
+                heapq.heapify(self.heap)
+
+    def _key(self, product):
+        # stock / weight orders products by days until stockout at any time;
+        # products already out of stock come first, best sellers first
+        weight = self.weights.get(product, 0.0)
+        stock = self.stock[product]
+        if stock <= 0:
+            cover = -weight
+        elif weight > 0:
+            cover = stock / weight
+        else:
+            cover = math.inf
+        return (product not in self.low, cover, product)
+
+    # Queries
+
+    def threshold(self, product):
+        return self.thresholds.get(product, self.default_threshold)
+
+    def is_low(self, product):
+        return product in self.low
+
+    def units_per_day(self, product, now=None):
+        """Recent sales velocity of a product"""
+        now = now_timestamp() if now is None else now
+        weight = self.weights.get(product, 0.0) * math.exp((self.origin - now) / self.tau)
+        return weight / self._window(now) * DAY
+
+    def days_until_stockout(self, product, now=None):
+        """Days the current stock lasts at the recent velocity; None if it is not selling"""
+        if self.stock.get(product, 0) <= 0:
+            return 0.0
+        rate = self.units_per_day(product, now)
+        return self.stock[product] / rate if rate > 0 else None
+
+    def _window(self, now):
+        # Total weight of the time the history covers, at least one day
+        span = max(now - self.since, DAY)
+        return self.tau * -math.expm1(-span / self.tau)
+
+    def reorder_list(self, limit=20, now=None):
+        """Low products and products forecast to run out, most urgent first.
+
+        Returns up to `limit` dicts with the product, stock, threshold, low
+        flag, units per day and days until stockout (None if not selling).
+        Products that are neither low nor selling are not listed.
+        """
+        now = now_timestamp() if now is None else now
+        ranked = []
+        listed = set()
+        while self.heap and len(ranked) < limit:
+            entry = heapq.heappop(self.heap)
+            if self.keys.get(entry[2]) != entry or entry[2] in listed:
+                continue  # Stale, or a copy left when a key changed back
+            listed.add(entry[2])
+            ranked.append(entry)
+            if entry[0] and entry[1] == math.inf:
+                ranked.pop()
+                heapq.heappush(self.heap, entry)
+                break  # Everything after this is neither low nor selling
+        for entry in ranked:
+            heapq.heappush(self.heap, entry)
+        return [{
+            'product': product,
+            'stock': self.stock[product],
+            'threshold': self.threshold(product),
+            'low': not not_low,
+            'units_per_day': self.units_per_day(product, now),
+            'days_left': self.days_until_stockout(product, now)
+        } for not_low, _, product in ranked]
@@ -1,3 +1,6 @@
+import time
+START_TIME = time.perf_counter()  # Before Kivy is imported, so startup timing includes it
+
 from kivy.app import App
 from kivy.uix.boxlayout import BoxLayout
 from kivy.uix.gridlayout import GridLayout
@@ -5,93 +8,193 @@ from kivy.uix.label import Label
 from kivy.uix.button import Button
 from kivy.uix.textinput import TextInput
 from kivy.uix.popup import Popup
-from kivy.uix.scrollview import ScrollView
 from kivy.uix.tabbedpanel import TabbedPanel, TabbedPanelItem
 from kivy.uix.spinner import Spinner
+from kivy.uix.progressbar import ProgressBar
 from kivy.metrics import dp
-from datetime import datetime
-import json
+from kivy.clock import Clock
+from kivy.core.window import Window
 import os
+import threading
+from ledger import Ledger, LedgerError
+from storage import open_storage
+from widgets import RecycledList, TypeaheadInput, count_widgets
+from analytics import (now_timestamp, product_velocity, receivables_aging, revenue_by_period,
+                       top_customers, top_products)
+from export import export_all
+from history import History, history_path
+from importer import KINDS as IMPORT_KINDS, read_batch
+from money import format_money, to_cents
+from sync import SyncClient, SyncError, sync
+from refresh import RefreshScheduler
+from stores import store_path
+from startup import StartupTimer, read_startup_snapshot, startup_path, write_startup_snapshot
+from instrumentation import metrics, memory_rss_mb, timed
+
+__version__ = '1.0.0'
+SYNC_INTERVAL = 60  # Seconds between background syncs when SALES_STOCK_SYNC_URL is set
+SYNC_ERROR_INTERVAL = 15 * 60  # Seconds before the same sync failure is shown again
+ANALYTICS_DELAY = 2  # Seconds without changes before stale report analytics are recomputed
 
 class SalesStockApp(App):
     def __init__(self):
         super().__init__()
-        self.sales_data = []
-        self.stock_data = {}
-        self.customers = {}  # Store customer credit balances
-        self.data_file = 'sales_stock_data.json'
-        self.load_data()
+        self.startup_timer = StartupTimer(START_TIME)
+        store = os.environ.get('SALES_STOCK_STORE')
+        self.data_file = store_path(store) if store else 'sales_stock_data.json'
+        storage = open_storage(self.data_file, os.environ.get('SALES_STOCK_BACKEND', 'journal'),
+                               fsync=os.environ.get('SALES_STOCK_FSYNC', 'batch'))
+        self.ledger = Ledger(storage, recent_size=15,
+                             history=History(history_path(self.data_file)))
+        self.refresh = RefreshScheduler()
+        # The ledger loads on a background thread; until then the sales tab
+        # shows the startup snapshot and its controls are disabled
+        self.ready = False
+        self.load_failed = False  # The data could not be read; nothing may be saved over it
+        self.edit_controls = []  # Everything that changes the data; see editing()
+        # Report analytics are full passes over the sales, so they run on a
+        # background thread, not on every refresh; results older than the
+        # ledger's version are recomputed once changes stop for a moment
+        self.analytics_results = None
+        self.analytics_running = False
+        self.analytics_pending = False
+        self.analytics_trigger = Clock.create_trigger(lambda dt: self.refresh_analytics(),
+                                                      ANALYTICS_DELAY)
+        self.startup = read_startup_snapshot(startup_path(self.data_file))
+        self.startup_timer.mark('snapshot_read')
 
     def build(self):
         # Main layout with tabs
         tab_panel = TabbedPanel()
         tab_panel.tab_height = dp(50)
         tab_panel.tab_width = dp(150)
+        self.tab_panel = tab_panel
         
         # Sales Tab
         sales_tab = TabbedPanelItem(text='Credit Sales')
         sales_tab.add_widget(self.create_sales_layout())
         tab_panel.add_widget(sales_tab)
         
-        # Stock Tab
+        # Stock and Reports tabs are built the first time they are shown
         stock_tab = TabbedPanelItem(text='Stock Management')
-        stock_tab.add_widget(self.create_stock_layout())
+        stock_tab.add_widget(self.loading_label())
         tab_panel.add_widget(stock_tab)
         
-        # Reports Tab
         reports_tab = TabbedPanelItem(text='Reports')
-        reports_tab.add_widget(self.create_reports_layout())
+        reports_tab.add_widget(self.loading_label())
         tab_panel.add_widget(reports_tab)
         
+        # Views are redrawn at most once per frame, and only on the visible tab
+        self.refresh.register('balance', self.update_balance_display, tab=sales_tab)
+        self.refresh.register('sales', self.update_sales_display, self.update_sales_rows, tab=sales_tab)
+        self.tab_builders = {
+            stock_tab: self.create_stock_tab,
+            reports_tab: self.create_reports_tab
+        }
+        tab_panel.bind(current_tab=self.on_tab_changed)
+        self.refresh.show_tab(tab_panel.current_tab)
+        
+        metrics.add_gauge('widgets', lambda: count_widgets(Window))
+        metrics.add_gauge('memory_rss_mb', memory_rss_mb)
+        metrics.add_gauge('sales', lambda: len(self.ledger.sales_data))
+        metrics.add_gauge('customers_owing', lambda: len(self.ledger.customers))
+        
+        self.startup_timer.mark('built')
+        Clock.schedule_once(lambda dt: self.startup_timer.mark('first_frame'))
+        threading.Thread(target=self.load_in_background, name='load', daemon=True).start()
         return tab_panel
 
+    def loading_label(self):
+        return Label(text='Loading...', font_size=dp(18))
+
+    def on_tab_changed(self, panel, tab):
+        if self.ready:
+            self.build_tab(tab)
+        self.refresh.show_tab(tab)
+
+    def build_tab(self, tab):
+        """Build a lazily constructed tab's content, once"""
+        builder = self.tab_builders.pop(tab, None)
+        if builder is not None:
+            tab.add_widget(builder(tab))
+
+    def editing(self, *controls):
+        """Register controls that change the data; they are disabled until the
+        ledger has loaded, and for good if it could not be"""
+        self.edit_controls.extend(controls)
+        for control in controls:
+            control.disabled = not self.ready or self.load_failed
+
+    def create_stock_tab(self, tab):
+        layout = self.create_stock_layout()
+        self.refresh.register('stock', self.update_stock_display, self.update_stock_rows, tab=tab)
+        return layout
+
+    def create_reports_tab(self, tab):
+        layout = self.create_reports_layout()
+        self.refresh.register('reports', self.update_reports, tab=tab)
+        return layout
+
+    def load_in_background(self):
+        self.load_data()
+        Clock.schedule_once(self.on_loaded)
+
+    def on_loaded(self, dt):
+        """The ledger is loaded: enable the controls and show the real data"""
+        self.ready = True
+        self.startup_timer.mark('data_loaded')
+        if not self.load_failed:
+            self.ledger.start_background_writes(on_error=self.on_save_error)
+            for control in self.edit_controls:
+                control.disabled = False
+            sync_url = os.environ.get('SALES_STOCK_SYNC_URL')
+            if sync_url:
+                self.start_sync(sync_url)
+        self.refresh.mark('balance', 'sales')
+        self.build_tab(self.tab_panel.current_tab)
+        # Report once the refreshed views have been drawn
+        Clock.schedule_once(self.on_ready)
+
+    def on_ready(self, dt):
+        self.startup_timer.mark('ready')
+        self.startup_timer.report(os.path.splitext(self.data_file)[0] + '.startup_times.jsonl',
+                                  __version__)
+
     def create_sales_layout(self):
         main_layout = BoxLayout(orientation='vertical', padding=dp(10), spacing=dp(10))
         
         # Balance display
         self.balance_label = Label(
-            text=f'Total Outstanding Credit: ${self.get_total_outstanding():.2f}',
+            text='',
             size_hint_y=None,
             height=dp(40),
             font_size=dp(18),
             bold=True
         )
+        self.balance_label.bind(on_touch_down=self.on_balance_touch)
         main_layout.add_widget(self.balance_label)
         
         # Input form
-        form_layout = GridLayout(cols=2, spacing=dp(10), size_hint_y=None, height=dp(240))
+        form_layout = GridLayout(cols=2, spacing=dp(10), size_hint_y=None, height=dp(200))
         
-        # Customer selection/addition
+        # Customer search; a name that is not found adds a new customer
         form_layout.add_widget(Label(text='Customer:', size_hint_y=None, height=dp(40)))
-        customer_container = BoxLayout(orientation='vertical', size_hint_y=None, height=dp(80))
-        
-        self.customer_spinner = Spinner(
-            text='Select Customer',
-            values=['Add New Customer'] + list(self.customers.keys()),
+        self.customer_input = TypeaheadInput(
+            search=self.ledger.search_customers,
+            hint_text='Search or enter new customer',
             size_hint_y=None,
             height=dp(40)
         )
-        self.customer_spinner.bind(text=self.on_customer_selected)
-        customer_container.add_widget(self.customer_spinner)
-        
-        self.new_customer_input = TextInput(
-            hint_text='Enter new customer name',
-            size_hint_y=None,
-            height=dp(40),
-            opacity=0,
-            disabled=True
-        )
-        customer_container.add_widget(self.new_customer_input)
-        form_layout.add_widget(customer_container)
+        form_layout.add_widget(self.customer_input)
         
         form_layout.add_widget(Label(text='Product:', size_hint_y=None, height=dp(40)))
-        self.product_spinner = Spinner(
-            text='Select Product',
-            values=list(self.stock_data.keys()) if self.stock_data else ['No products available'],
+        self.product_input = TypeaheadInput(
+            search=self.ledger.search_products,
+            hint_text='Search products',
             size_hint_y=None,
             height=dp(40)
         )
-        form_layout.add_widget(self.product_spinner)
+        form_layout.add_widget(self.product_input)
         
         form_layout.add_widget(Label(text='Quantity:', size_hint_y=None, height=dp(40)))
         self.quantity_input = TextInput(input_filter='float', size_hint_y=None, height=dp(40))
@@ -125,15 +228,15 @@ class SalesStockApp(App):
         
         main_layout.add_widget(button_layout)
         
+        self.editing(form_layout, button_layout)
+        
         # Recent sales list
         main_layout.add_widget(Label(text='Recent Credit Sales:', size_hint_y=None, height=dp(30)))
         
-        self.sales_scroll = ScrollView()
-        self.sales_list = BoxLayout(orientation='vertical', size_hint_y=None)
-        self.sales_list.bind(minimum_height=self.sales_list.setter('height'))
-        self.sales_scroll.add_widget(self.sales_list)
-        main_layout.add_widget(self.sales_scroll)
+        self.sales_list = RecycledList(row_height=dp(70))
+        main_layout.add_widget(self.sales_list)
         
+        self.update_balance_display()
         self.update_sales_display()
         
         return main_layout
@@ -172,21 +275,26 @@ class SalesStockApp(App):
         # Stock adjustment form
         main_layout.add_widget(Label(text='Adjust Stock:', size_hint_y=None, height=dp(30), bold=True))
         
-        adjust_layout = GridLayout(cols=2, spacing=dp(10), size_hint_y=None, height=dp(120))
+        adjust_layout = GridLayout(cols=2, spacing=dp(10), size_hint_y=None, height=dp(170))
         
         adjust_layout.add_widget(Label(text='Product:', size_hint_y=None, height=dp(40)))
-        self.adjust_product_spinner = Spinner(
-            text='Select Product',
-            values=list(self.stock_data.keys()) if self.stock_data else ['No products available'],
+        self.adjust_product_input = TypeaheadInput(
+            search=self.ledger.search_products,
+            hint_text='Search products',
             size_hint_y=None,
             height=dp(40)
         )
-        adjust_layout.add_widget(self.adjust_product_spinner)
+        adjust_layout.add_widget(self.adjust_product_input)
         
         adjust_layout.add_widget(Label(text='Adjustment (+/-):', size_hint_y=None, height=dp(40)))
         self.adjustment_input = TextInput(input_filter='float', size_hint_y=None, height=dp(40))
         adjust_layout.add_widget(self.adjustment_input)
         
+        adjust_layout.add_widget(Label(text='Reorder Below:', size_hint_y=None, height=dp(40)))
+        self.threshold_input = TextInput(input_filter='float', hint_text='Default 10',
+                                         size_hint_y=None, height=dp(40))
+        adjust_layout.add_widget(self.threshold_input)
+        
         main_layout.add_widget(adjust_layout)
         
         # Evenly spaced buttons for adjustment
@@ -196,20 +304,22 @@ class SalesStockApp(App):
         adjust_btn.bind(on_press=self.adjust_stock)
         adjust_button_layout.add_widget(adjust_btn)
         
+        threshold_btn = Button(text='Set Reorder Level', size_hint_x=1)
+        threshold_btn.bind(on_press=self.set_reorder_threshold)
+        adjust_button_layout.add_widget(threshold_btn)
+        
         clear_adjust_btn = Button(text='Clear Form', size_hint_x=1)
         clear_adjust_btn.bind(on_press=self.clear_adjust_form)
         adjust_button_layout.add_widget(clear_adjust_btn)
         
         main_layout.add_widget(adjust_button_layout)
+        self.editing(form_layout, stock_button_layout, adjust_layout, adjust_button_layout)
         
         # Current stock display
         main_layout.add_widget(Label(text='Current Stock:', size_hint_y=None, height=dp(30), bold=True))
         
-        self.stock_scroll = ScrollView()
-        self.stock_list = BoxLayout(orientation='vertical', size_hint_y=None)
-        self.stock_list.bind(minimum_height=self.stock_list.setter('height'))
-        self.stock_scroll.add_widget(self.stock_list)
-        main_layout.add_widget(self.stock_scroll)
+        self.stock_list = RecycledList(row_height=dp(40))
+        main_layout.add_widget(self.stock_list)
         
         self.update_stock_display()
         
@@ -232,107 +342,75 @@ class SalesStockApp(App):
         report_button_layout = BoxLayout(size_hint_y=None, height=dp(50), spacing=dp(5))
         
         refresh_btn = Button(text='Refresh Reports', size_hint_x=1)
-        refresh_btn.bind(on_press=self.update_reports)
+        refresh_btn.bind(on_press=self.refresh_reports)
         report_button_layout.add_widget(refresh_btn)
         
         export_btn = Button(text='Export Data', size_hint_x=1)
         export_btn.bind(on_press=self.export_data)
         report_button_layout.add_widget(export_btn)
         
+        import_btn = Button(text='Import Data', size_hint_x=1)
+        import_btn.bind(on_press=self.import_data)
+        report_button_layout.add_widget(import_btn)
+        self.editing(import_btn)
+        
         main_layout.add_widget(report_button_layout)
         
+        # Period used for the revenue breakdown
+        period_layout = BoxLayout(size_hint_y=None, height=dp(40), spacing=dp(5))
+        period_layout.add_widget(Label(text='Revenue by:', size_hint_x=0.4))
+        self.period_spinner = Spinner(
+            text='Month',
+            values=['Day', 'Week', 'Month'],
+            size_hint_x=0.6
+        )
+        self.period_spinner.bind(text=lambda spinner, text: self.refresh_analytics())
+        period_layout.add_widget(self.period_spinner)
+        main_layout.add_widget(period_layout)
+        
         # Detailed report
-        self.report_scroll = ScrollView()
-        self.report_list = BoxLayout(orientation='vertical', size_hint_y=None)
-        self.report_list.bind(minimum_height=self.report_list.setter('height'))
-        self.report_scroll.add_widget(self.report_list)
-        main_layout.add_widget(self.report_scroll)
+        self.report_list = RecycledList(row_height=dp(35))
+        main_layout.add_widget(self.report_list)
         
         self.update_reports()
+        self.refresh_analytics()
         
         return main_layout
 
-    def on_customer_selected(self, spinner, text):
-        """Handle customer selection - show input field for new customer"""
-        if text == 'Add New Customer':
-            self.new_customer_input.opacity = 1
-            self.new_customer_input.disabled = False
-        else:
-            self.new_customer_input.opacity = 0
-            self.new_customer_input.disabled = True
-            self.new_customer_input.text = ''
-
     def get_selected_customer(self):
         """Get the currently selected or entered customer name"""
-        if self.customer_spinner.text == 'Add New Customer':
-            return self.new_customer_input.text.strip()
-        elif self.customer_spinner.text != 'Select Customer':
-            return self.customer_spinner.text
-        return None
+        return self.customer_input.text.strip() or None
 
     def add_credit_sale(self, instance):
         try:
             customer = self.get_selected_customer()
-            product = self.product_spinner.text
+            product = self.product_input.text.strip()
             quantity = float(self.quantity_input.text or 0)
-            unit_price = float(self.price_spinner.text) if self.price_spinner.text != 'Select Price' else 0
+            unit_price = to_cents(self.price_spinner.text) if self.price_spinner.text != 'Select Price' else 0
             
-            if not customer or product == 'Select Product' or quantity <= 0 or unit_price <= 0:
+            if not customer or not product or quantity <= 0 or unit_price <= 0:
                 self.show_popup('Error', 'Please fill all fields with valid values')
                 return
             
-            # Check stock availability
-            if product not in self.stock_data or self.stock_data[product] < quantity:
-                self.show_popup('Error', f'Insufficient stock for {product}')
-                return
-            
-            total_amount = quantity * unit_price
-            
-            # Record the sale
-            sale = {
-                'id': len(self.sales_data) + 1,
-                'customer': customer,
-                'product': product,
-                'quantity': quantity,
-                'unit_price': unit_price,
-                'total_amount': total_amount,
-                'date': datetime.now().strftime('%Y-%m-%d %H:%M'),
-                'status': 'credit',
-                'paid_amount': 0.0
-            }
-            
-            self.sales_data.append(sale)
-            
-            # Update or add customer
-            if customer not in self.customers:
-                self.customers[customer] = 0.0
-            self.customers[customer] += total_amount
-            
-            # Update stock
-            self.stock_data[product] -= quantity
-            
-            # Update customer spinner values if new customer was added
-            if customer not in self.customer_spinner.values:
-                self.customer_spinner.values = ['Add New Customer'] + list(self.customers.keys())
+            # Record the sale (checks stock availability)
+            sale = self.ledger.record_sale(customer, product, quantity, unit_price)
             
             # Clear form
             self.clear_form(None)
             
             # Update displays
-            self.update_balance_display()
-            self.update_sales_display()
-            self.update_stock_display()
+            self.refresh.mark('balance', 'sales', 'reports')
+            self.refresh.mark('stock', rows=[product])
             
-            # Save data
-            self.save_data()
-            
-            self.show_popup('Success', f'Credit sale recorded: ${total_amount:.2f} for {customer}')
+            self.show_popup('Success', f"Credit sale recorded: ${format_money(sale['total_amount'])} for {customer}")
             
+        except LedgerError as e:
+            self.show_popup('Error', str(e))
         except ValueError:
             self.show_popup('Error', 'Please enter valid numbers for quantity and select a valid price')
 
     def record_payment(self, instance):
-        if not self.customers:
+        if not self.ledger.customers:
             self.show_popup('Error', 'No customers with credit found')
             return
         
@@ -342,13 +420,22 @@ class SalesStockApp(App):
         # Customer selection with current balance display
         content.add_widget(Label(text='Select Customer:', size_hint_y=None, height=dp(30)))
         
-        customer_spinner = Spinner(
-            text='Select Customer',
-            values=[f"{customer} (${balance:.2f})" for customer, balance in self.customers.items() if balance > 0],
+        customer_input = TypeaheadInput(
+            search=lambda query: self.ledger.search_customers(query, with_balance=True),
+            hint_text='Search customers with credit',
             size_hint_y=None,
             height=dp(40)
         )
-        content.add_widget(customer_spinner)
+        content.add_widget(customer_input)
+        
+        balance_label = Label(text='', size_hint_y=None, height=dp(30))
+        content.add_widget(balance_label)
+        
+        def show_balance(instance, text):
+            balance = self.ledger.customers.get(text.strip())
+            balance_label.text = f'Balance: ${format_money(balance)}' if balance is not None else ''
+        
+        customer_input.bind(text=show_balance)
         
         content.add_widget(Label(text='Payment Amount:', size_hint_y=None, height=dp(30)))
         amount_input = TextInput(
@@ -364,52 +451,25 @@ class SalesStockApp(App):
         
         def process_payment(instance):
             try:
-                customer_text = customer_spinner.text
-                if customer_text == 'Select Customer':
+                customer = customer_input.text.strip()
+                if not customer:
                     self.show_popup('Error', 'Please select a customer')
                     return
                 
-                # Extract customer name from "Customer ($balance)" format
-                customer = customer_text.split(' (')[0]
-                amount = float(amount_input.text or 0)
-                
-                if amount <= 0:
-                    self.show_popup('Error', 'Please enter a valid payment amount')
-                    return
-                
-                if amount > self.customers[customer]:
-                    self.show_popup('Error', 'Payment amount exceeds customer balance')
-                    return
-                
-                # Update customer balance
-                self.customers[customer] -= amount
-                
-                # Update sales records
-                remaining_payment = amount
-                for sale in self.sales_data:
-                    if sale['customer'] == customer and sale['status'] == 'credit':
-                        unpaid = sale['total_amount'] - sale['paid_amount']
-                        if unpaid > 0 and remaining_payment > 0:
-                            payment_applied = min(remaining_payment, unpaid)
-                            sale['paid_amount'] += payment_applied
-                            remaining_payment -= payment_applied
-                            
-                            if sale['paid_amount'] >= sale['total_amount']:
-                                sale['status'] = 'paid'
-                
-                # Remove customer if balance is zero
-                if self.customers[customer] <= 0.01:  # Account for floating point precision
-                    del self.customers[customer]
+                amount = to_cents(amount_input.text or '0')
                 
-                # Update customer spinner values
-                self.customer_spinner.values = ['Add New Customer'] + list(self.customers.keys())
+                # Update balance and sales records, oldest open sale first
+                paid_sales = self.ledger.record_payment(customer, amount)
                 
-                self.update_balance_display()
-                self.update_sales_display()
-                self.save_data()
+                self.refresh.mark('balance', 'reports')
+                shown = [sale['id'] for sale in paid_sales if self.ledger.recent_sales.touch(sale)]
+                if shown:
+                    self.refresh.mark('sales', rows=shown)
                 popup.dismiss()
-                self.show_popup('Success', f'Payment of ${amount:.2f} recorded for {customer}')
+                self.show_popup('Success', f'Payment of ${format_money(amount)} recorded for {customer}')
                 
+            except LedgerError as e:
+                self.show_popup('Error', str(e))
             except ValueError:
                 self.show_popup('Error', 'Please enter valid numbers')
         
@@ -431,71 +491,54 @@ class SalesStockApp(App):
             product_name = self.new_product_input.text.strip()
             initial_stock = float(self.initial_stock_input.text or 0)
             
-            if not product_name or initial_stock < 0:
-                self.show_popup('Error', 'Please enter valid product name and stock')
-                return
-            
-            if product_name in self.stock_data:
-                self.show_popup('Error', 'Product already exists')
-                return
-            
-            self.stock_data[product_name] = initial_stock
-            
-            # Update spinners
-            self.product_spinner.values = list(self.stock_data.keys())
-            self.adjust_product_spinner.values = list(self.stock_data.keys())
+            self.ledger.add_product(product_name, initial_stock)
             
             # Clear inputs
             self.clear_stock_form(None)
             
             # Update display
-            self.update_stock_display()
-            self.save_data()
+            self.refresh.mark('stock', 'reports')
             
             self.show_popup('Success', f'Product "{product_name}" added successfully')
             
+        except LedgerError as e:
+            self.show_popup('Error', str(e))
         except ValueError:
             self.show_popup('Error', 'Please enter valid numbers')
 
     def adjust_stock(self, instance):
         try:
-            product = self.adjust_product_spinner.text
+            product = self.adjust_product_input.text.strip()
             adjustment = float(self.adjustment_input.text or 0)
             
-            if product == 'Select Product':
+            if not product:
                 self.show_popup('Error', 'Please select a product')
                 return
             
-            new_stock = self.stock_data[product] + adjustment
-            if new_stock < 0:
-                self.show_popup('Error', 'Stock cannot be negative')
-                return
-            
-            self.stock_data[product] = new_stock
+            self.ledger.adjust_stock(product, adjustment)
             
             # Clear input
             self.clear_adjust_form(None)
             
             # Update display
-            self.update_stock_display()
-            self.save_data()
+            self.refresh.mark('stock', rows=[product])
+            self.refresh.mark('reports')
             
             self.show_popup('Success', f'Stock adjusted for {product}')
             
+        except LedgerError as e:
+            self.show_popup('Error', str(e))
         except ValueError:
             self.show_popup('Error', 'Please enter valid numbers')
 
     def get_total_outstanding(self):
-        """Calculate total outstanding credit across all customers"""
-        return sum(self.customers.values())
+        """Total outstanding credit across all customers"""
+        return self.ledger.total_outstanding()
 
     def clear_form(self, instance):
         """Clear the sales form"""
-        self.customer_spinner.text = 'Select Customer'
-        self.new_customer_input.text = ''
-        self.new_customer_input.opacity = 0
-        self.new_customer_input.disabled = True
-        self.product_spinner.text = 'Select Product'
+        self.customer_input.text = ''
+        self.product_input.text = ''
         self.quantity_input.text = ''
         self.price_spinner.text = 'Select Price'
 
@@ -504,100 +547,424 @@ class SalesStockApp(App):
         self.new_product_input.text = ''
         self.initial_stock_input.text = ''
 
+    def set_reorder_threshold(self, instance):
+        """Set the selected product's reorder level; an empty field restores the default"""
+        try:
+            product = self.adjust_product_input.text.strip()
+            if not product:
+                self.show_popup('Error', 'Please select a product')
+                return
+            text = self.threshold_input.text.strip()
+            threshold = float(text) if text else None
+            
+            self.ledger.set_reorder_threshold(product, threshold)
+            
+            self.clear_adjust_form(None)
+            self.refresh.mark('stock', rows=[product])
+            self.refresh.mark('reports')
+            
+            level = self.ledger.reorder.threshold(product)
+            self.show_popup('Success', f'{product} is now low below {level:g}')
+            
+        except LedgerError as e:
+            self.show_popup('Error', str(e))
+        except ValueError:
+            self.show_popup('Error', 'Please enter valid numbers')
+
     def clear_adjust_form(self, instance):
         """Clear the stock adjustment form"""
-        self.adjust_product_spinner.text = 'Select Product'
+        self.adjust_product_input.text = ''
         self.adjustment_input.text = ''
+        self.threshold_input.text = ''
 
+    @timed('ui.update_balance_display')
     def update_balance_display(self):
-        total_outstanding = self.get_total_outstanding()
-        self.balance_label.text = f'Total Outstanding Credit: ${total_outstanding:.2f}'
+        if not self.ready:
+            # Startup snapshot figures while the ledger loads
+            if self.startup is None:
+                self.balance_label.text = 'Loading...'
+                return
+            total_outstanding = self.startup['total_outstanding']
+        else:
+            total_outstanding = self.get_total_outstanding()
+        self.balance_label.text = f'Total Outstanding Credit: ${format_money(total_outstanding)}'
+
+    def sale_row(self, sale):
+        info_text = f"{sale['customer']} - {sale['product']} x{sale['quantity']}\n"
+        info_text += f"${format_money(sale['total_amount'])} ({sale['status']}) - {sale['date']}"
+        
+        if sale['status'] == 'credit':
+            remaining = sale['total_amount'] - sale['paid_amount']
+            info_text += f"\nRemaining: ${format_money(remaining)}"
+        
+        return {
+            'text': info_text,
+            'text_size': (dp(350), None),
+            'valign': 'middle',
+            'halign': 'left'
+        }
 
+    def stock_row(self, product):
+        quantity = self.ledger.stock_data[product]
+        color = [1, 0.3, 0.3, 1] if self.ledger.reorder.is_low(product) else [1, 1, 1, 1]  # Red for low stock
+        return {
+            'text': f"{product}: {quantity}",
+            'color': color,
+            'halign': 'left',
+            'text_size': (dp(300), None)
+        }
+
+    @timed('ui.update_sales_display')
     def update_sales_display(self):
-        self.sales_list.clear_widgets()
-        
-        recent_sales = sorted(self.sales_data, key=lambda x: x['date'], reverse=True)[:15]
-        
-        for sale in recent_sales:
-            sale_info = BoxLayout(orientation='horizontal', size_hint_y=None, height=dp(70))
-            
-            info_text = f"{sale['customer']} - {sale['product']} x{sale['quantity']}\n"
-            info_text += f"${sale['total_amount']:.2f} ({sale['status']}) - {sale['date']}"
-            
-            if sale['status'] == 'credit':
-                remaining = sale['total_amount'] - sale['paid_amount']
-                info_text += f"\nRemaining: ${remaining:.2f}"
-            
-            label = Label(
-                text=info_text,
-                text_size=(dp(350), None),
-                size_hint_x=1,
-                valign='middle',
-                halign='left'
-            )
-            sale_info.add_widget(label)
-            
-            self.sales_list.add_widget(sale_info)
+        if self.ready:
+            sales = self.ledger.recent_sales
+        else:
+            sales = self.startup['recent_sales'] if self.startup is not None else []
+        self.sales_list.set_rows((sale['id'], self.sale_row(sale)) for sale in sales)
 
+    @timed('ui.update_stock_display')
     def update_stock_display(self):
-        self.stock_list.clear_widgets()
-        
-        for product, quantity in sorted(self.stock_data.items()):
-            stock_info = BoxLayout(orientation='horizontal', size_hint_y=None, height=dp(40))
-            
-            color = [1, 0.3, 0.3, 1] if quantity < 10 else [1, 1, 1, 1]  # Red for low stock
-            
-            label = Label(
-                text=f"{product}: {quantity}",
-                color=color,
-                size_hint_x=1,
-                halign='left',
-                text_size=(dp(300), None)
-            )
-            stock_info.add_widget(label)
-            
-            self.stock_list.add_widget(stock_info)
+        self.stock_list.set_rows((product, self.stock_row(product)) for product in sorted(self.ledger.stock_data))
+
+    def update_sales_rows(self, sale_ids):
+        shown = {sale['id']: sale for sale in self.ledger.recent_sales}
+        for sale_id in sale_ids:
+            if sale_id in shown:
+                self.sales_list.update_row(sale_id, self.sale_row(shown[sale_id]))
 
+    def update_stock_rows(self, products):
+        for product in products:
+            if not self.stock_list.update_row(product, self.stock_row(product)):
+                self.update_stock_display()
+                return
+
+    @timed('ui.update_reports')
     def update_reports(self, instance=None):
         total_outstanding = self.get_total_outstanding()
-        total_sales = sum(sale['total_amount'] for sale in self.sales_data)
-        total_paid = sum(sale['paid_amount'] for sale in self.sales_data)
-        num_customers = len(self.customers)
+        total_sales = self.ledger.aggregates.total_sales
+        total_paid = self.ledger.aggregates.total_paid
+        num_customers = len(self.ledger.customers)
         
-        summary_text = f"Total Outstanding Credit: ${total_outstanding:.2f}\n"
-        summary_text += f"Total Sales: ${total_sales:.2f}\n"
-        summary_text += f"Total Payments Received: ${total_paid:.2f}\n"
+        summary_text = f"Total Outstanding Credit: ${format_money(total_outstanding)}\n"
+        summary_text += f"Total Sales: ${format_money(total_sales)}\n"
+        summary_text += f"Total Payments Received: ${format_money(total_paid)}\n"
         summary_text += f"Active Customers: {num_customers}\n"
-        summary_text += f"Products in Stock: {len(self.stock_data)}"
+        summary_text += f"Products in Stock: {len(self.ledger.stock_data)}"
         
         self.summary_label.text = summary_text
         self.summary_label.text_size = (dp(350), None)
         
         # Update detailed report
-        self.report_list.clear_widgets()
-        
-        if self.customers:
-            self.report_list.add_widget(Label(
-                text='Customers with Outstanding Credit:',
-                size_hint_y=None,
-                height=dp(40),
-                bold=True
-            ))
+        rows = []
+        if self.ledger.customers:
+            rows.append(('header', {
+                'text': 'Customers with Outstanding Credit:',
+                'bold': True,
+                'halign': 'center',
+                'text_size': (None, None)
+            }))
             
-            for customer, amount in sorted(self.customers.items(), key=lambda x: x[1], reverse=True):
+            for customer, amount in self.ledger.aggregates.top_customers():
                 if amount > 0:
-                    label = Label(
-                        text=f"{customer}: ${amount:.2f}",
-                        size_hint_y=None,
-                        height=dp(35),
-                        halign='left',
-                        text_size=(dp(300), None)
-                    )
-                    self.report_list.add_widget(label)
+                    rows.append((customer, {
+                        'text': f"{customer}: ${format_money(amount)}",
+                        'bold': False,
+                        'halign': 'left',
+                        'text_size': (dp(300), None)
+                    }))
+        rows.extend(self.reorder_rows())
+        rows.extend(self.analytics_rows())
+        self.report_list.set_rows(rows)
+        if self.analytics_stale():
+            self.analytics_trigger()  # Debounced: a burst of sales recomputes once
+
+    def refresh_reports(self, instance=None):
+        self.update_reports()
+        self.refresh_analytics()
+
+    def refresh_analytics(self):
+        """Recompute the analytics sections on a background thread"""
+        if self.analytics_running:
+            self.analytics_pending = True
+            return
+        self.analytics_running = True
+        # The thread works on copies; the ledger belongs to the UI thread
+        sales = self.ledger.sales_data.copy()
+        stock = dict(self.ledger.stock_data)
+        period = self.period_spinner.text.lower()
+        version = self.ledger.version
+        threading.Thread(target=self.run_analytics, args=(sales, stock, period, version),
+                         name='analytics', daemon=True).start()
+
+    def run_analytics(self, sales, stock, period, version):
+        now = now_timestamp()
+        results = {
+            'version': version,
+            'time': time.strftime('%H:%M'),
+            'aging': receivables_aging(sales, now)[0],
+            'period': period,
+            'revenue': revenue_by_period(sales, period)[-12:],
+            'top_products': top_products(sales, 5),
+            'top_customers': top_customers(sales, 5),
+            'velocity': product_velocity(sales, stock, 30, now)
+        }
+        Clock.schedule_once(lambda dt: self.on_analytics(results))
+
+    def on_analytics(self, results):
+        self.analytics_running = False
+        self.analytics_results = results
+        self.refresh.mark('reports')
+        if self.analytics_pending:
+            self.analytics_pending = False
+            self.refresh_analytics()
+
+    def analytics_stale(self):
+        results = self.analytics_results
+        return results is not None and results['version'] != self.ledger.version
+
+    def report_header(self, key, text):
+        return ('header:' + key, {
+            'text': text,
+            'bold': True,
+            'halign': 'center',
+            'text_size': (None, None)
+        })
+
+    def report_line(self, key, text):
+        return (key, {
+            'text': text,
+            'bold': False,
+            'halign': 'left',
+            'text_size': (dp(300), None)
+        })
+
+    def reorder_rows(self):
+        """Report rows for the reorder list, which the ledger keeps up to date"""
+        rows = []
+        reorder = self.ledger.reorder.reorder_list(10)
+        if reorder:
+            rows.append(self.report_header('reorder', 'Reorder Soon:'))
+            for row in reorder:
+                days_left = ('not selling' if row['days_left'] is None
+                             else f"{row['days_left']:.0f} days left")
+                low = f", below {row['threshold']:g}" if row['low'] else ''
+                rows.append(self.report_line('reorder:' + row['product'],
+                                             f"{row['product']}: {row['stock']:g} on hand{low}, {days_left}"))
+        return rows
+
+    def analytics_rows(self):
+        """Report rows for the revenue, aging, velocity and top-N sections, as last computed"""
+        results = self.analytics_results
+        if results is None:
+            return [self.report_header('analytics', 'Computing analytics...')]
+        updating = ' (updating...)' if self.analytics_stale() else ''
+        rows = [self.report_header('analytics', f"Analytics as of {results['time']}{updating}")]
+        
+        totals = results['aging']
+        if any(totals.values()):
+            rows.append(self.report_header('aging', 'Receivables Aging (days):'))
+            for bucket, amount in totals.items():
+                rows.append(self.report_line('aging:' + bucket, f"{bucket}: ${format_money(amount)}"))
+        
+        period = results['period']
+        revenue = results['revenue']
+        if revenue:
+            rows.append(self.report_header('revenue', f'Revenue by {period} (latest 12):'))
+            for label, amount, units in reversed(revenue):
+                rows.append(self.report_line('revenue:' + label,
+                                             f"{label}: ${format_money(amount)} ({units:g} units)"))
+        
+        if results['top_products']:
+            rows.append(self.report_header('products', 'Top Products:'))
+            for product, amount, units in results['top_products']:
+                rows.append(self.report_line('product:' + product,
+                                             f"{product}: ${format_money(amount)} ({units:g} units)"))
+        
+        if results['top_customers']:
+            rows.append(self.report_header('buyers', 'Top Customers by Sales:'))
+            for customer, amount, count in results['top_customers']:
+                rows.append(self.report_line('buyer:' + customer,
+                                             f"{customer}: ${format_money(amount)} ({count} sales)"))
+        
+        velocity = [row for row in results['velocity'] if row['units_sold'] > 0]
+        if velocity:
+            rows.append(self.report_header('velocity', 'Product Velocity (30 days):'))
+            for row in velocity[:10]:
+                rows.append(self.report_line('velocity:' + row['product'], (
+                    f"{row['product']}: {row['units_per_day']:.1f}/day, "
+                    f"{row['sell_through']:.0%} sold through, "
+                    f"{row['days_of_cover']:.0f} days of stock left")))
+        return rows
 
     def export_data(self, instance):
-        """Export data functionality placeholder"""
-        self.show_popup('Export', 'Data export functionality would be implemented here')
+        """Export sales, balances and stock to CSV or JSON Lines on a background thread"""
+        content = BoxLayout(orientation='vertical', spacing=dp(10), padding=dp(10))
+        
+        form_layout = GridLayout(cols=2, spacing=dp(10), size_hint_y=None, height=dp(280))
+        
+        form_layout.add_widget(Label(text='Format:', size_hint_y=None, height=dp(40)))
+        format_spinner = Spinner(text='CSV', values=['CSV', 'JSON Lines'], size_hint_y=None, height=dp(40))
+        form_layout.add_widget(format_spinner)
+        
+        form_layout.add_widget(Label(text='Customer:', size_hint_y=None, height=dp(40)))
+        customer_input = TypeaheadInput(search=self.ledger.search_customers, hint_text='All customers',
+                                        size_hint_y=None, height=dp(40))
+        form_layout.add_widget(customer_input)
+        
+        form_layout.add_widget(Label(text='Product:', size_hint_y=None, height=dp(40)))
+        product_input = TypeaheadInput(search=self.ledger.search_products, hint_text='All products',
+                                       size_hint_y=None, height=dp(40))
+        form_layout.add_widget(product_input)
+        
+        form_layout.add_widget(Label(text='Status:', size_hint_y=None, height=dp(40)))
+        status_spinner = Spinner(text='Any', values=['Any', 'credit', 'paid'], size_hint_y=None, height=dp(40))
+        form_layout.add_widget(status_spinner)
+        
+        form_layout.add_widget(Label(text='Dates (YYYY-MM-DD):', size_hint_y=None, height=dp(40)))
+        dates_layout = BoxLayout(size_hint_y=None, height=dp(40), spacing=dp(5))
+        date_from_input = TextInput(hint_text='From')
+        date_to_input = TextInput(hint_text='To')
+        dates_layout.add_widget(date_from_input)
+        dates_layout.add_widget(date_to_input)
+        form_layout.add_widget(dates_layout)
+        
+        content.add_widget(form_layout)
+        
+        progress_bar = ProgressBar(max=1, value=0, size_hint_y=None, height=dp(30))
+        content.add_widget(progress_bar)
+        status_label = Label(text='', size_hint_y=None, height=dp(60), text_size=(dp(300), None))
+        content.add_widget(status_label)
+        
+        button_layout = BoxLayout(size_hint_y=None, height=dp(50), spacing=dp(5))
+        
+        def show_progress(done, total):
+            def update(dt):
+                progress_bar.max = max(total, 1)
+                progress_bar.value = done
+                status_label.text = f'Exporting sales: {done}/{total}'
+            Clock.schedule_once(update)
+        
+        def finish(message):
+            def update(dt):
+                status_label.text = message
+                export_btn.disabled = False
+            Clock.schedule_once(update)
+        
+        def start_export(instance):
+            filters = {
+                'customer': customer_input.text.strip() or None,
+                'product': product_input.text.strip() or None,
+                'status': None if status_spinner.text == 'Any' else status_spinner.text,
+                'date_from': date_from_input.text.strip() or None,
+                'date_to': date_to_input.text.strip() or None
+            }
+            fmt = 'csv' if format_spinner.text == 'CSV' else 'jsonl'
+            directory = os.path.join(os.path.dirname(os.path.abspath(self.data_file)), 'exports')
+            data = self.ledger.get_data()
+            
+            def run():
+                try:
+                    paths = export_all(data, directory, fmt, progress=show_progress, **filters)
+                    finish('Exported to:\n' + '\n'.join(paths))
+                except Exception as e:
+                    finish(f'Export failed: {e}')
+            
+            export_btn.disabled = True
+            threading.Thread(target=run, name='export', daemon=True).start()
+        
+        export_btn = Button(text='Export', size_hint_x=1)
+        export_btn.bind(on_press=start_export)
+        button_layout.add_widget(export_btn)
+        
+        close_btn = Button(text='Close', size_hint_x=1)
+        button_layout.add_widget(close_btn)
+        
+        content.add_widget(button_layout)
+        
+        popup = Popup(title='Export Data', content=content, size_hint=(0.9, 0.9))
+        close_btn.bind(on_press=popup.dismiss)
+        popup.open()
+
+    def import_data(self, instance):
+        """Import products, stock counts or historical sales from a CSV/JSON Lines file"""
+        content = BoxLayout(orientation='vertical', spacing=dp(10), padding=dp(10))
+        
+        form_layout = GridLayout(cols=2, spacing=dp(10), size_hint_y=None, height=dp(140))
+        
+        form_layout.add_widget(Label(text='Import:', size_hint_y=None, height=dp(40)))
+        kind_spinner = Spinner(text=IMPORT_KINDS[0], values=list(IMPORT_KINDS), size_hint_y=None, height=dp(40))
+        form_layout.add_widget(kind_spinner)
+        
+        form_layout.add_widget(Label(text='File:', size_hint_y=None, height=dp(40)))
+        path_input = TextInput(hint_text='Path to .csv or .jsonl', size_hint_y=None, height=dp(40))
+        form_layout.add_widget(path_input)
+        
+        form_layout.add_widget(Label(text='Invalid rows:', size_hint_y=None, height=dp(40)))
+        errors_spinner = Spinner(
+            text='Reject file',
+            values=['Reject file', 'Skip rows'],
+            size_hint_y=None,
+            height=dp(40)
+        )
+        form_layout.add_widget(errors_spinner)
+        
+        content.add_widget(form_layout)
+        
+        status_label = Label(text='', text_size=(dp(300), None), valign='top')
+        content.add_widget(status_label)
+        
+        button_layout = BoxLayout(size_hint_y=None, height=dp(50), spacing=dp(5))
+        
+        def apply_batch(batch, skip_errors):
+            errors = [f'Line {line_no}: {message}' for line_no, message in batch.errors[:20]]
+            if len(batch.errors) > 20:
+                errors.append(f'... and {len(batch.errors) - 20} more')
+            if batch.errors and not skip_errors:
+                status_label.text = 'Nothing imported:\n' + '\n'.join(errors)
+                import_btn.disabled = False
+                return
+            
+            # Apply the whole batch, then persist and refresh once
+            count = self.ledger.apply_import(batch)
+            self.refresh.mark('balance', 'sales', 'stock', 'reports')
+            status_label.text = '\n'.join([f'Imported {count} {batch.kind} rows'] + errors)
+            import_btn.disabled = False
+        
+        def start_import(instance):
+            path = path_input.text.strip()
+            if not path:
+                status_label.text = 'Please enter a file path'
+                return
+            kind = kind_spinner.text
+            skip_errors = errors_spinner.text == 'Skip rows'
+            data = self.ledger.get_data()
+            
+            def run():
+                try:
+                    batch = read_batch(path, kind, data)
+                except OSError as e:
+                    message = f'Cannot open file: {e}'
+                    Clock.schedule_once(lambda dt: setattr(status_label, 'text', message))
+                    Clock.schedule_once(lambda dt: setattr(import_btn, 'disabled', False))
+                    return
+                Clock.schedule_once(lambda dt: apply_batch(batch, skip_errors))
+            
+            import_btn.disabled = True
+            status_label.text = 'Reading file...'
+            threading.Thread(target=run, name='import', daemon=True).start()
+        
+        import_btn = Button(text='Import', size_hint_x=1)
+        import_btn.bind(on_press=start_import)
+        button_layout.add_widget(import_btn)
+        
+        close_btn = Button(text='Close', size_hint_x=1)
+        button_layout.add_widget(close_btn)
+        
+        content.add_widget(button_layout)
+        
+        popup = Popup(title='Import Data', content=content, size_hint=(0.9, 0.8))
+        close_btn.bind(on_press=popup.dismiss)
+        popup.open()
 
     def show_popup(self, title, message):
         content = BoxLayout(orientation='vertical', padding=dp(10))
@@ -610,31 +977,175 @@ class SalesStockApp(App):
         close_btn.bind(on_press=popup.dismiss)
         popup.open()
 
-    def save_data(self):
-        data = {
-            'sales_data': self.sales_data,
-            'stock_data': self.stock_data,
-            'customers': self.customers
-        }
+    def on_balance_touch(self, label, touch):
+        """Triple-tapping the balance opens the hidden diagnostics screen"""
+        if label.collide_point(*touch.pos) and touch.is_triple_tap:
+            self.show_diagnostics()
+            return True
+        return False
+
+    def show_diagnostics(self):
+        """Timings, counters and gauges recorded by instrumentation.py"""
+        content = BoxLayout(orientation='vertical', spacing=dp(10), padding=dp(10))
+        
+        report_list = RecycledList(row_height=dp(30))
+        content.add_widget(report_list)
+        
+        def show(instance=None):
+            lines = metrics.report_lines()
+            if not metrics.enabled:
+                lines.insert(0, 'Timers are off: start the app with SALES_STOCK_PROFILE=1')
+            report_list.set_rows((i, {
+                'text': line,
+                'halign': 'left',
+                'text_size': (dp(350), None)
+            }) for i, line in enumerate(lines))
+        
+        def dump(instance):
+            path = os.path.splitext(self.data_file)[0] + '.diagnostics.jsonl'
+            try:
+                metrics.dump(path)
+                self.show_popup('Diagnostics', f'Saved to {path}')
+            except OSError as e:
+                self.show_popup('Error', f'Could not save diagnostics: {e}')
+        
+        def reset(instance):
+            metrics.reset()
+            show()
+        
+        button_layout = BoxLayout(size_hint_y=None, height=dp(50), spacing=dp(5))
+        for text, action in (('Refresh', show), ('Save to File', dump), ('Reset', reset)):
+            button = Button(text=text, size_hint_x=1)
+            button.bind(on_press=action)
+            button_layout.add_widget(button)
+        close_btn = Button(text='Close', size_hint_x=1)
+        button_layout.add_widget(close_btn)
+        content.add_widget(button_layout)
+        
+        show()
+        popup = Popup(title='Diagnostics', content=content, size_hint=(0.95, 0.9))
+        close_btn.bind(on_press=popup.dismiss)
+        popup.open()
+
+    def on_pause(self):
+        self.ledger.flush()
+        self.save_startup_snapshot()
+        return True
+
+    def on_stop(self):
+        self.save_startup_snapshot()
+        self.ledger.close()
+
+    def save_startup_snapshot(self):
+        """Remember what the first screen shows, for the next launch"""
+        if not self.ready or self.load_failed:
+            return
         try:
-            with open(self.data_file, 'w') as f:
-                json.dump(data, f, indent=2)
-        except Exception as e:
-            print(f"Error saving data: {e}")
+            write_startup_snapshot(startup_path(self.data_file), self.ledger)
+        except OSError as e:
+            print(f"Error saving startup snapshot: {e}")
+
+    def start_sync(self, url):
+        """Sync with the server at `url` now and every SYNC_INTERVAL seconds"""
+        self.ledger.enable_sync()
+        self.sync_client = SyncClient(url)
+        self.sync_running = False
+        self.sync_error = None  # (message, time shown) of the failure last reported
+        Clock.schedule_interval(lambda dt: self.sync_now(), SYNC_INTERVAL)
+        self.sync_now()
+
+    def sync_now(self):
+        if self.sync_running:
+            return
+        self.sync_running = True
+        threading.Thread(target=self.run_sync, name='sync', daemon=True).start()
+
+    def run_sync(self):
+        """Runs on the sync thread; only the network requests happen here"""
+        try:
+            report = sync(self.ledger, self.sync_client, call=self.call_on_ui)
+        except SyncError as e:
+            print(f"Sync failed: {e}")  # Retried at the next interval
+            message = str(e)
+            Clock.schedule_once(lambda dt: self.on_sync_failed(message))
+            return
+        Clock.schedule_once(lambda dt: self.on_synced(report))
+
+    def on_sync_failed(self, message):
+        """Tell the user sync is failing, once per SYNC_ERROR_INTERVAL for the same error"""
+        self.sync_running = False
+        now = time.monotonic()
+        if self.sync_error is not None:
+            last_message, shown = self.sync_error
+            if message == last_message and now - shown < SYNC_ERROR_INTERVAL:
+                return
+        self.sync_error = (message, now)
+        self.show_popup('Sync', f'Could not sync with the server:\n{message}\n\n'
+                        'Changes are kept on this phone and sent when sync works again.')
+
+    def call_on_ui(self, function, *args):
+        """Run `function` on the UI thread, which owns the ledger, and wait for it"""
+        done = threading.Event()
+        outcome = {}
+
+        def run(dt):
+            try:
+                outcome['result'] = function(*args)
+            except Exception as e:
+                outcome['error'] = e
+            finally:
+                done.set()
+        Clock.schedule_once(run)
+        done.wait()
+        if 'error' in outcome:
+            raise outcome['error']
+        return outcome['result']
+
+    def on_synced(self, report):
+        self.sync_running = False
+        self.sync_error = None  # Report the next failure straight away
+        if report['applied']:
+            self.refresh.mark('balance', 'sales', 'stock', 'reports')
+        if report['overpaid']:
+            lines = [f"{customer}: ${format_money(amount)}"
+                     for customer, amount in sorted(report['overpaid'].items())[:10]]
+            self.show_popup('Sync', 'Payments taken on another device had already been '
+                            'applied to these sales; amounts not applied:\n' + '\n'.join(lines))
+
+    def on_save_error(self, error):
+        """Called on the persistence thread when a write fails"""
+        Clock.schedule_once(lambda dt: self.show_popup('Error', f'Could not save data: {error}'))
 
     def load_data(self):
         try:
-            if os.path.exists(self.data_file):
-                with open(self.data_file, 'r') as f:
-                    data = json.load(f)
-                    self.sales_data = data.get('sales_data', [])
-                    self.stock_data = data.get('stock_data', {})
-                    self.customers = data.get('customers', {})
+            self.ledger.load()
         except Exception as e:
+            # Keep the files as they are for recovery; don't start a new ledger on top
             print(f"Error loading data: {e}")
-            self.sales_data = []
-            self.stock_data = {}
-            self.customers = {}
+            self.load_failed = True
+            self.ledger.detach()
+            self.ledger.clear()
+            message = (f'Could not read the saved data:\n{e}\n\n'
+                       'Nothing will be saved until the app is restarted.')
+            Clock.schedule_once(lambda dt: self.show_popup('Error', message))
+            return
+
+        recovery = self.ledger.last_recovery
+        if recovery:
+            damaged = ', '.join(os.path.basename(failure['path']) for failure in recovery['failed'])
+            message = (f"The saved data was damaged ({damaged}) and was restored from "
+                       f"{os.path.basename(recovery['restored_from'])}.\n"
+                       'Check the most recent sales and payments.')
+            print(message)
+            Clock.schedule_once(lambda dt: self.show_popup('Data Restored', message))
+
+        drift = self.ledger.last_reconciliation['drift']
+        if drift:
+            lines = [f"{customer}: ${format_money(stored or 0)} -> ${format_money(actual or 0)}"
+                     for customer, (stored, actual) in sorted(drift.items())[:10]]
+            message = 'Customer balances were corrected to match open sales:\n' + '\n'.join(lines)
+            print(message)
+            Clock.schedule_once(lambda dt: self.show_popup('Balances Reconciled', message))
 
 if __name__ == '__main__':
     SalesStockApp().run()
\ No newline at end of file
@@ -0,0 +1,79 @@
+"""Typeahead search over customer and product names."""
+from bisect import bisect_left, insort
+
+# Above this many names the substring scan would cost more than a millisecond
+SCAN_LIMIT = 5000
+
+
+def fold(text):
+    """Case-insensitive search key"""
+    return text.casefold()
+
+
+def word_starts(folded):
+    """Offsets of the second and later words in a folded name"""
+    return [i for i in range(1, len(folded))
+            if folded[i].isalnum() and not folded[i - 1].isalnum()]
+
+
+class NameIndex:
+    """Sorted arrays of names searched with bisect, updated incrementally.
+
+    `ordered` holds (folded name, name) and answers prefix queries;
+    `words` holds (folded name from a later word on, name) so "bag" finds
+    "Rice Bag". Substring matches come from a scan of `ordered`, only when
+    the prefix queries returned fewer than `limit` names and the index
+    holds at most SCAN_LIMIT names.
+    """
+
+    def __init__(self, names=()):
+        self.rebuild(names)
+
+    def rebuild(self, names):
+        self.names = set(names)
+        self.ordered = sorted((fold(name), name) for name in self.names)
+        self.words = sorted((folded[i:], name) for folded, name in self.ordered
+                            for i in word_starts(folded))
+
+    def __contains__(self, name):
+        return name in self.names
+
+    def __len__(self):
+        return len(self.names)
+
+    def add(self, name):
+        if name in self.names:
+            return
+        self.names.add(name)
+        folded = fold(name)
+        insort(self.ordered, (folded, name))
+        for i in word_starts(folded):
+            insort(self.words, (folded[i:], name))
+
+    def search(self, query, limit=10, accept=None):
+        """Up to `limit` names matching `query`: name prefix, then word prefix, then substring.
+
+        `accept(name)` can filter the candidates (e.g. customers with a balance).
+        """
+        query = fold(query.strip())
+        found = []
+        seen = set()
+
+        def collect(name):
+            if name not in seen and (accept is None or accept(name)):
+                seen.add(name)
+                found.append(name)
+            return len(found) >= limit
+
+        for keys in (self.ordered, self.words):
+            for i in range(bisect_left(keys, (query,)), len(keys)):
+                key, name = keys[i]
+                if not key.startswith(query) or collect(name):
+                    break
+            if len(found) >= limit:
+                return found
+        if query and len(self.ordered) <= SCAN_LIMIT:
+            for key, name in self.ordered:
+                if query in key and collect(name):
+                    break
+        return found
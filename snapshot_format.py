@@ -0,0 +1,128 @@
+"""On-disk snapshot encodings: compact JSON and a columnar binary format.
+
+JSON snapshots are written without indentation, through orjson when it
+is installed (it is optional; the stdlib json module is the fallback).
+
+Binary snapshots store the sales table column by column, each column
+being the raw bytes of the in-memory `array`, so saving and loading do
+not build a Python object per sale:
+
+    b'SSTK' | version (u8) | flags (u8) | body, zlib-compressed if flags & 1
+    body:   meta length (u64 LE) | meta JSON | column bytes in COLUMN_TYPES order
+
+The meta JSON holds everything except the sales rows (stock, balances,
+aggregates, format and journal versions), the interned customer and
+product names, the row count, the column typecodes and the byte order.
+
+`decode` detects the encoding from the first bytes, so either kind can
+be read from any path, and raises SnapshotError for damaged data.
+"""
+import json
+import struct
+import sys
+import zlib
+from array import array
+
+from columnar import COLUMN_TYPES, SalesTable
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+MAGIC = b'SSTK'
+BINARY_VERSION = 1
+COMPRESSED = 1
+HEADER = struct.Struct('<4sBB')
+META_LENGTH = struct.Struct('<Q')
+ENCODINGS = ('json', 'binary')
+
+
+class SnapshotError(ValueError):
+    """A snapshot is truncated or otherwise unreadable"""
+
+
+def json_dumps(obj, default=None):
+    """Compact JSON as bytes"""
+    if orjson is not None:
+        return orjson.dumps(obj, default=default)
+    return json.dumps(obj, separators=(',', ':'), default=default).encode()
+
+
+def json_loads(data):
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def encode_binary(data, default=None, compress=True):
+    """Encode a data dict as a binary snapshot"""
+    sales = data['sales_data']
+    table = sales if isinstance(sales, SalesTable) else SalesTable(sales)
+    meta = {key: value for key, value in data.items() if key != 'sales_data'}
+    meta['sales'] = {
+        'rows': len(table),
+        'customer_names': table.customer_names.values,
+        'product_names': table.product_names.values,
+        'columns': [[name, typecode] for name, typecode in COLUMN_TYPES],
+        'byteorder': sys.byteorder
+    }
+    meta_bytes = json_dumps(meta, default)
+    parts = [META_LENGTH.pack(len(meta_bytes)), meta_bytes]
+    parts.extend(values.tobytes() for _, values in table.columns())
+    body = b''.join(parts)
+    if compress:
+        body = zlib.compress(body, 1)
+    return HEADER.pack(MAGIC, BINARY_VERSION, COMPRESSED if compress else 0) + body
+
+
+def decode_binary(raw):
+    """Decode a binary snapshot; 'sales_data' comes back as a SalesTable"""
+    magic, version, flags = HEADER.unpack_from(raw)
+    if magic != MAGIC:
+        raise ValueError('not a binary snapshot')
+    if version > BINARY_VERSION:
+        raise ValueError(f'binary snapshot version {version} is newer than this app')
+    body = memoryview(raw)[HEADER.size:]
+    if flags & COMPRESSED:
+        body = memoryview(zlib.decompress(body))
+    (meta_length,) = META_LENGTH.unpack_from(body)
+    offset = META_LENGTH.size + meta_length
+    meta = json_loads(bytes(body[META_LENGTH.size:offset]))
+    sales = meta.pop('sales')
+    rows = sales['rows']
+    columns = {}
+    for name, typecode in sales['columns']:
+        values = array(typecode)
+        end = offset + rows * values.itemsize
+        if end > len(body):
+            raise ValueError('binary snapshot is truncated')
+        values.frombytes(body[offset:end])
+        if sales['byteorder'] != sys.byteorder:
+            values.byteswap()
+        columns[name] = values
+        offset = end
+    meta['sales_data'] = SalesTable.from_columns(columns, sales['customer_names'],
+                                                 sales['product_names'])
+    return meta
+
+
+def encode(data, encoding='json', default=None, compress=True, indent=None):
+    if encoding == 'binary':
+        return encode_binary(data, default, compress)
+    if encoding != 'json':
+        raise ValueError(f'Unknown snapshot encoding: {encoding}')
+    if indent:
+        return json.dumps(data, indent=indent, default=default).encode()
+    return json_dumps(data, default)
+
+
+def decode(raw):
+    """Decode a snapshot of either encoding"""
+    try:
+        data = decode_binary(raw) if raw[:len(MAGIC)] == MAGIC else json_loads(raw)
+    except (ValueError, KeyError, TypeError, struct.error, zlib.error) as e:
+        raise SnapshotError(f'damaged snapshot: {e}') from e
+    if not isinstance(data, dict):
+        raise SnapshotError('damaged snapshot: not a data dict')
+    return data
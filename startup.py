@@ -0,0 +1,70 @@
+"""Fast cold start: a small startup snapshot and startup timing.
+
+The startup snapshot holds only what the first screen shows (totals and
+the recent sales), so the app can draw real numbers while the full ledger
+loads in the background. It is rewritten whenever the app pauses or
+stops and may be slightly stale; it is never used for anything but
+display.
+"""
+import json
+import os
+import time
+from datetime import datetime
+
+from storage import write_snapshot
+
+
+def startup_path(data_file):
+    return os.path.splitext(data_file)[0] + '.startup.json'
+
+
+def startup_summary(ledger):
+    """Totals and recent sales of a loaded ledger, for the startup snapshot"""
+    aggregates = ledger.aggregates
+    return {
+        'total_outstanding': aggregates.total_outstanding,
+        'total_sales': aggregates.total_sales,
+        'total_paid': aggregates.total_paid,
+        'customers': len(ledger.customers),
+        'products': len(ledger.stock_data),
+        'recent_sales': [dict(sale) for sale in ledger.recent_sales]
+    }
+
+
+def write_startup_snapshot(path, ledger):
+    write_snapshot(path, startup_summary(ledger))
+
+
+def read_startup_snapshot(path):
+    """The saved summary, or None if there is none or it cannot be read"""
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+class StartupTimer:
+    """Records named milestones in seconds since `start` (default: now)"""
+
+    def __init__(self, start=None):
+        self.start = time.perf_counter() if start is None else start
+        self.marks = {}
+
+    def mark(self, name):
+        self.marks[name] = time.perf_counter() - self.start
+        return self.marks[name]
+
+    def summary(self):
+        return ', '.join(f'{name} {seconds * 1000:.0f}ms' for name, seconds in self.marks.items())
+
+    def report(self, path, version):
+        """Print the milestones and append them as one JSON line to `path`"""
+        print(f'Startup: {self.summary()}')
+        record = {'version': version, 'at': datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
+        record.update((name, round(seconds, 4)) for name, seconds in self.marks.items())
+        try:
+            with open(path, 'a') as f:
+                f.write(json.dumps(record) + '\n')
+        except OSError as e:
+            print(f'Could not record startup time: {e}')
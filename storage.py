@@ -0,0 +1,644 @@
+"""Storage backends for the sales and stock ledger.
+
+A backend persists the app's data dict ({'sales_data', 'stock_data',
+'customers'}). `save` writes the whole ledger, `append` records a batch of
+changes, each produced by one mutation, e.g.:
+
+    {'type': 'sale',
+     'sales': [{...full sale dict...}],
+     'stock': {'Rice': 40.0},
+     'customers': {'Alice': 150000, 'Bob': None}}   # None deletes
+
+Sales are upserted by id, stock and customer values are absolute. With
+sync enabled (see sync.py), a change also carries the device's `sync`
+state (absolute) and either new `outbox` events or `pushed`, the id up
+to which the outbox was acknowledged by the sync server. A change to
+reorder thresholds carries them all as `reorder_thresholds`. Money
+is stored as integer cents since format version 2; `migrate_data`
+upgrades older data, which kept floats. Any
+other keys in the data dict (e.g. 'aggregates') are stored alongside the
+ledger on full saves; objects are serialized through their `to_dict()`
+(or `to_list()`, e.g. the columnar sales table).
+
+Snapshots are compact JSON or, for the journal backend by default, the
+columnar binary format in snapshot_format.py, kept next to the data file
+as `<name>.snap`. A snapshot in the other format is read when the
+preferred one does not exist yet, so switching formats migrates the
+ledger on its next save.
+
+Snapshots are written to a temporary file, fsync'd and renamed over the
+old one, so a crash leaves either the old or the new snapshot. The
+previous `backups` snapshots are kept as `<snapshot>.1`, `.2`, ... and a
+snapshot that cannot be read is set aside as `*.corrupt` in favour of the
+newest readable one; the backend's `recovery` attribute reports it.
+Nothing is silently replaced by an empty ledger: if snapshots exist but
+none can be read, `load` raises SnapshotError.
+
+A backend opened with `read_only=True` (e.g. to report on a copy of a
+store's files) loads without touching anything: damaged snapshots are
+skipped but not renamed, a torn journal tail is ignored but not cut, and
+SQLite opens the database read-only and imports nothing. Writes raise
+PermissionError.
+
+The `fsync` policy trades durability for latency:
+
+    'always'  every write is synced before it is acknowledged
+    'batch'   snapshots are synced, journal records every few records or
+              seconds (SQLite: synchronous=NORMAL); the default
+    'off'     nothing is synced; the OS writes data back when it likes
+
+`append` also receives `get_data`, a callable returning the full data dict,
+for backends that need the whole ledger (rewrites and compaction).
+Backends are not thread-safe; the app drives them from a single
+persistence thread (see persistence.py).
+"""
+import json
+import os
+import sqlite3
+import time
+
+import snapshot_format
+from money import line_total, to_cents
+from snapshot_format import SnapshotError
+
+
+DATA_KEYS = ('sales_data', 'stock_data', 'customers')
+TABLE_KEYS = DATA_KEYS + ('outbox',)  # Stored in SQLite tables rather than as meta values
+FORMAT_VERSION = 2
+MONEY_COLUMNS = ('unit_price', 'total_amount', 'paid_amount')
+FSYNC_POLICIES = ('always', 'batch', 'off')
+SQLITE_SYNCHRONOUS = {'always': 'FULL', 'batch': 'NORMAL', 'off': 'OFF'}
+
+
+def empty_data():
+    """Return a fresh, empty data dict"""
+    return {'sales_data': [], 'stock_data': {}, 'customers': {}}
+
+
+def encode_default(obj):
+    """json `default` hook for ledger components that serialize themselves"""
+    to_json = getattr(obj, 'to_dict', None) or getattr(obj, 'to_list', None)
+    if to_json is None:
+        raise TypeError(f'Object of type {type(obj).__name__} is not JSON serializable')
+    return to_json()
+
+
+def data_version(data):
+    """Format version of a loaded data dict.
+
+    Backends record the version when they create their files; data without
+    it is version 1 only if it holds float amounts, as version 1 always did.
+    """
+    if 'format_version' in data:
+        return data['format_version']
+    sales = data['sales_data']
+    if any(isinstance(balance, float) for balance in data['customers'].values()):
+        return 1
+    if not hasattr(sales, 'column') and any(isinstance(sale[column], float)
+                                            for sale in sales for column in MONEY_COLUMNS):
+        return 1
+    return FORMAT_VERSION
+
+
+def migrate_data(data):
+    """Upgrade a loaded data dict to FORMAT_VERSION in place; returns True if it changed"""
+    if data_version(data) >= FORMAT_VERSION:
+        return False
+    # Version 1: float amounts. Prices and payments are rounded to the cent
+    # and totals recomputed from them; balances are left for reconciliation.
+    for sale in data['sales_data']:
+        sale['unit_price'] = to_cents(sale['unit_price'])
+        sale['total_amount'] = line_total(sale['quantity'], sale['unit_price'])
+        sale['paid_amount'] = min(to_cents(sale['paid_amount']), sale['total_amount'])
+        sale['status'] = 'paid' if sale['paid_amount'] >= sale['total_amount'] else 'credit'
+    data['customers'] = {customer: to_cents(balance)
+                         for customer, balance in data['customers'].items()
+                         if to_cents(balance)}
+    data.pop('aggregates', None)  # Float totals; rebuilt from the sales
+    data['format_version'] = FORMAT_VERSION
+    return True
+
+
+def sale_positions(sales):
+    """{sale id: index} for a list of sale dicts or a SalesTable"""
+    ids = getattr(sales, 'ids', None)
+    if ids is not None:
+        return dict(zip(ids, range(len(ids))))
+    return {sale['id']: i for i, sale in enumerate(sales)}
+
+
+def apply_change(data, change, sale_index=None):
+    """Apply one journal change to a data dict in place"""
+    sales = data['sales_data']
+    if sale_index is None:
+        sale_index = sale_positions(sales)
+    for sale in change.get('sales', ()):
+        i = sale_index.get(sale['id'])
+        if i is None:
+            sale_index[sale['id']] = len(sales)
+            sales.append(sale)
+        else:
+            sales[i] = sale
+    for product, quantity in change.get('stock', {}).items():
+        data['stock_data'][product] = quantity
+    for customer, balance in change.get('customers', {}).items():
+        if balance is None:
+            data['customers'].pop(customer, None)
+        else:
+            data['customers'][customer] = balance
+    if 'sync' in change:
+        data['sync'] = change['sync']
+    if 'reorder_thresholds' in change:
+        data['reorder_thresholds'] = change['reorder_thresholds']
+    if 'outbox' in change:
+        data.setdefault('outbox', []).extend(change['outbox'])
+    if 'pushed' in change:
+        data['outbox'] = [event for event in data.get('outbox', ())
+                          if event['id'] > change['pushed']]
+
+
+def binary_path(path):
+    """Where the binary snapshot of the data file `path` lives"""
+    return os.path.splitext(path)[0] + '.snap'
+
+
+def check_fsync_policy(policy):
+    if policy not in FSYNC_POLICIES:
+        raise ValueError(f'Unknown fsync policy: {policy}')
+    return policy
+
+
+def fsync_directory(path):
+    """Sync the directory entry of `path`, so a rename survives a power loss"""
+    if not hasattr(os, 'O_DIRECTORY'):  # Windows
+        return
+    try:
+        fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY | os.O_DIRECTORY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass  # Some filesystems do not support syncing directories
+    finally:
+        os.close(fd)
+
+
+def snapshot_paths(path, backups=0):
+    """`path` followed by its backups, newest first"""
+    return [path] + [f'{path}.{i}' for i in range(1, backups + 1)]
+
+
+def rotate_backups(path, backups):
+    """Shift `path` to `path.1`, `path.1` to `path.2`, ..., dropping the oldest"""
+    paths = snapshot_paths(path, backups)
+    for newer, older in reversed(list(zip(paths, paths[1:]))):
+        if os.path.exists(newer):
+            os.replace(newer, older)
+
+
+def read_snapshot(path):
+    """Read a JSON or binary snapshot, returning an empty data dict if it does not exist"""
+    data = empty_data()
+    if os.path.exists(path):
+        with open(path, 'rb') as f:
+            data.update(snapshot_format.decode(f.read()))
+    return data
+
+
+def write_snapshot(path, data, indent=None, encoding='json', compress=True, fsync=True,
+                   backups=0):
+    """Write a snapshot next to `path` and atomically move it into place.
+
+    The file is fsync'd before the rename, and the directory after it,
+    unless `fsync` is False. With `backups`, the snapshot being replaced is
+    kept as `path.1` and older ones shift along.
+    """
+    raw = snapshot_format.encode(data, encoding, encode_default, compress, indent)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(raw)
+        f.flush()
+        if fsync:
+            os.fsync(f.fileno())
+    if backups:
+        rotate_backups(path, backups)
+    os.replace(tmp_path, path)
+    if fsync:
+        fsync_directory(path)
+
+
+def recover_snapshot(paths, rename=True):
+    """Read the first readable snapshot among `paths`.
+
+    Returns (data, path read, recovery). Unreadable snapshots before it are
+    renamed to `*.corrupt` unless `rename` is False; `recovery` lists them,
+    or is None if there were none. An empty data dict is returned only when
+    no snapshot exists.
+    """
+    failed = []
+    for path in paths:
+        if not os.path.exists(path):
+            continue
+        try:
+            data = read_snapshot(path)
+        except SnapshotError as e:
+            failed.append({'path': path, 'error': str(e)})
+            continue
+        for failure in failed if rename else ():
+            try:
+                os.replace(failure['path'], failure['path'] + '.corrupt')
+            except OSError:
+                pass
+        recovery = {'restored_from': path, 'failed': failed} if failed else None
+        return data, path, recovery
+    if failed:
+        raise SnapshotError('no readable snapshot: ' + '; '.join(
+            f"{failure['path']}: {failure['error']}" for failure in failed))
+    return empty_data(), None, None
+
+
+def check_writable(storage):
+    if storage.read_only:
+        raise PermissionError(f'{storage.path} is open read-only')
+
+
+class JsonFileStorage:
+    """Legacy backend: rewrites the whole ledger to one JSON file on every save"""
+
+    def __init__(self, path, indent=None, fsync='batch', backups=2, read_only=False):
+        self.path = path
+        self.indent = indent
+        self.fsync = check_fsync_policy(fsync)
+        self.backups = backups
+        self.read_only = read_only
+        self.recovery = None
+
+    def load(self):
+        data, _, self.recovery = recover_snapshot(
+            snapshot_paths(self.path, self.backups)
+            + snapshot_paths(binary_path(self.path), self.backups), rename=not self.read_only)
+        return data
+
+    def append(self, changes, get_data):
+        self.save(get_data())
+
+    def save(self, data):
+        check_writable(self)
+        write_snapshot(self.path, data, indent=self.indent, fsync=self.fsync != 'off',
+                       backups=self.backups)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class JournalStorage:
+    """Snapshot file plus an append-only journal holding one line per mutation.
+
+    Appends are flushed to the OS immediately. With the 'batch' fsync
+    policy they are fsync'd every `fsync_every` records or `fsync_interval`
+    seconds, whichever comes first; 'always' syncs every batch. After `compact_every` records the journal is folded into a new
+    snapshot and truncated. The snapshot remembers the last journal sequence
+    number it contains, so a crash between the two steps is harmless. Each
+    journal starts with a header line holding the format version.
+
+    `snapshot_format` is 'binary' (`<name>.snap`, zlib-compressed unless
+    `compress` is False) or 'json' (the data file itself). The first save
+    after a switch of format renames the old snapshot to `*.migrated`.
+    Compaction keeps `backups` previous snapshots; restoring one of them
+    loses the records compacted into the newer snapshots.
+    """
+
+    def __init__(self, path, journal_path=None, fsync_every=20, fsync_interval=2.0,
+                 compact_every=5000, snapshot_format='binary', compress=True, fsync='batch',
+                 backups=2, read_only=False):
+        if snapshot_format not in ('json', 'binary'):
+            raise ValueError(f'Unknown snapshot format: {snapshot_format}')
+        self.path = path
+        self.fsync = check_fsync_policy(fsync)
+        self.backups = backups
+        self.read_only = read_only
+        self.recovery = None
+        self.snapshot_format = snapshot_format
+        self.compress = compress
+        if snapshot_format == 'binary':
+            self.snapshot_path, self.other_snapshot_path = binary_path(path), path
+        else:
+            self.snapshot_path, self.other_snapshot_path = path, binary_path(path)
+        self.journal_path = journal_path or os.path.splitext(path)[0] + '.journal'
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self.compact_every = compact_every
+        self.seq = 0
+        self.journal_records = 0
+        self.unsynced = 0
+        self.last_sync = time.monotonic()
+        self.journal = None
+
+    def load(self):
+        data, _, self.recovery = recover_snapshot(
+            snapshot_paths(self.snapshot_path, self.backups)
+            + snapshot_paths(self.other_snapshot_path, self.backups), rename=not self.read_only)
+        self.seq = data.pop('journal_seq', 0)
+        self.journal_records = 0
+        if os.path.exists(self.journal_path):
+            sale_index = sale_positions(data['sales_data'])
+            good_offset = 0
+            with open(self.journal_path, 'rb') as f:
+                for line in f:
+                    try:
+                        if not line.endswith(b'\n'):
+                            raise ValueError('incomplete record')
+                        change = snapshot_format.json_loads(line)
+                    except ValueError:
+                        # Torn tail from a crash mid-append; nothing after it was acknowledged
+                        break
+                    good_offset += len(line)
+                    if 'seq' not in change:
+                        # Header written when the journal was started
+                        data.setdefault('format_version', change['format_version'])
+                        continue
+                    self.journal_records += 1
+                    if change['seq'] <= self.seq:
+                        continue
+                    apply_change(data, change, sale_index)
+                    self.seq = change['seq']
+            if good_offset < os.path.getsize(self.journal_path) and not self.read_only:
+                with open(self.journal_path, 'r+b') as f:
+                    f.truncate(good_offset)
+        return data
+
+    def append(self, changes, get_data):
+        check_writable(self)
+        if self.journal is None:
+            self.journal = open(self.journal_path, 'a')
+            if self.journal.tell() == 0:
+                self._write_header()
+        lines = []
+        for change in changes:
+            self.seq += 1
+            lines.append(json.dumps(dict(change, seq=self.seq), separators=(',', ':')) + '\n')
+        self.journal.write(''.join(lines))
+        self.journal.flush()
+        self.journal_records += len(lines)
+        self.unsynced += len(lines)
+        if self.fsync == 'always' or (
+                self.fsync == 'batch' and (self.unsynced >= self.fsync_every
+                                           or time.monotonic() - self.last_sync
+                                           >= self.fsync_interval)):
+            self.flush()
+        if self.journal_records >= self.compact_every:
+            self.save(get_data())
+
+    def save(self, data):
+        """Compact: write a full snapshot and start an empty journal"""
+        check_writable(self)
+        write_snapshot(self.snapshot_path, dict(data, journal_seq=self.seq),
+                       encoding=self.snapshot_format, compress=self.compress,
+                       fsync=self.fsync != 'off', backups=self.backups)
+        if os.path.exists(self.other_snapshot_path):
+            os.replace(self.other_snapshot_path, self.other_snapshot_path + '.migrated')
+        if self.journal is not None:
+            self.journal.close()
+        self.journal = open(self.journal_path, 'w')
+        self._write_header()
+        self.journal_records = 0
+        self.unsynced = 0
+        self.last_sync = time.monotonic()
+
+    def _write_header(self):
+        # A ledger that has only ever been journaled still records its format
+        self.journal.write(json.dumps({'format_version': FORMAT_VERSION}) + '\n')
+        self.journal.flush()
+
+    def flush(self):
+        if self.journal is not None and self.unsynced and self.fsync != 'off':
+            os.fsync(self.journal.fileno())
+        self.unsynced = 0
+        self.last_sync = time.monotonic()
+
+    def close(self):
+        if self.journal is not None:
+            self.flush()
+            self.journal.close()
+            self.journal = None
+
+
+SALE_COLUMNS = ('id', 'customer', 'product', 'quantity', 'unit_price', 'total_amount',
+                'date', 'status', 'paid_amount')
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sales (
+    id INTEGER PRIMARY KEY,
+    customer TEXT NOT NULL,
+    product TEXT NOT NULL,
+    quantity REAL NOT NULL,
+    unit_price INTEGER NOT NULL,
+    total_amount INTEGER NOT NULL,
+    date TEXT NOT NULL,
+    status TEXT NOT NULL,
+    paid_amount INTEGER NOT NULL
+);
+DROP INDEX IF EXISTS sales_customer;
+DROP INDEX IF EXISTS sales_product;
+DROP INDEX IF EXISTS sales_status;
+DROP INDEX IF EXISTS sales_date;
+CREATE TABLE IF NOT EXISTS stock (
+    product TEXT PRIMARY KEY,
+    quantity REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS customers (
+    name TEXT PRIMARY KEY,
+    balance INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY,
+    event TEXT NOT NULL
+);
+"""
+
+
+class SqliteStorage:
+    """SQLite backend with one table per collection, in WAL mode.
+
+    Each batch of changes is written in one transaction, so a sale or
+    payment (sale rows, stock level and customer balance) commits
+    atomically. An existing snapshot at `path` (or its binary `.snap`),
+    with any changes journaled on top of it, is upgraded and imported the
+    first time the database is created. The fsync policy
+    maps to SQLite's `synchronous` setting unless that is given.
+
+    The ledger is queried in memory through its own indexes, so `load`
+    reads every table whole and the sales table has no secondary indexes
+    to maintain (databases that had them lose them on open). Mutations
+    and imports are appended as changes, which touch only their rows;
+    `save` rewrites everything.
+    """
+
+    def __init__(self, path, db_path=None, synchronous=None, fsync='batch', read_only=False):
+        self.path = path
+        self.db_path = db_path or os.path.splitext(path)[0] + '.db'
+        self.read_only = read_only
+        self.recovery = None
+        if read_only:
+            if not os.path.exists(self.db_path):
+                raise FileNotFoundError(f'No database at {self.db_path}')
+            from pathlib import Path  # Only needed here; kept off the startup path
+
+            uri = Path(os.path.abspath(self.db_path)).as_uri() + '?mode=ro'
+            self.conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+            return
+        synchronous = synchronous or SQLITE_SYNCHRONOUS[check_fsync_policy(fsync)]
+        is_new = not os.path.exists(self.db_path)
+        self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute(f'PRAGMA synchronous={synchronous}')
+        self.conn.executescript(SQLITE_SCHEMA)
+        if is_new:
+            if os.path.exists(os.path.splitext(path)[0] + '.journal'):
+                # Coming from the journal backend: its snapshot plus the journal tail
+                source = JournalStorage(path)
+                data = source.load()
+                source.close()
+                imported, self.recovery = source.journal_path, source.recovery
+            else:
+                data, imported, self.recovery = recover_snapshot(
+                    snapshot_paths(path, 2) + snapshot_paths(binary_path(path), 2))
+            if imported is not None:
+                migrate_data(data)
+                self.save(data)
+            else:
+                with self.conn:
+                    self.conn.execute('INSERT INTO meta (key, value) VALUES (?, ?)',
+                                      ('format_version', json.dumps(FORMAT_VERSION)))
+
+    def load(self):
+        data = empty_data()
+        for key, value in self.conn.execute('SELECT key, value FROM meta'):
+            data[key] = json.loads(value)
+        cursor = self.conn.execute(f'SELECT {self._sale_columns()} FROM sales ORDER BY id')
+        data['sales_data'] = [dict(zip(SALE_COLUMNS, row)) for row in cursor]
+        data['stock_data'] = dict(self.conn.execute('SELECT product, quantity FROM stock'))
+        data['customers'] = dict(self.conn.execute(
+            f"SELECT name, {self._money('balance')} FROM customers"))
+        outbox = [json.loads(event) for event, in
+                  self.conn.execute('SELECT event FROM outbox ORDER BY id')]
+        if outbox:
+            data['outbox'] = outbox
+        return data
+
+    def _money(self, column):
+        """Select expression for a money column.
+
+        Databases created before format version 2 declare money columns
+        REAL, which turns stored cents into floats.
+        """
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'format_version'").fetchone()
+        if row is not None and json.loads(row[0]) >= 2:
+            return f'CAST({column} AS INTEGER)'
+        return column
+
+    def _sale_columns(self):
+        return ', '.join(self._money(column) if column in MONEY_COLUMNS else column
+                         for column in SALE_COLUMNS)
+
+    def append(self, changes, get_data):
+        check_writable(self)
+        with self.conn:
+            for change in changes:
+                self._write_change(change)
+
+    def save(self, data):
+        """Replace the whole ledger; O(ledger size), used for migrations and enabling sync"""
+        check_writable(self)
+        with self.conn:
+            self.conn.execute('DELETE FROM sales')
+            self.conn.execute('DELETE FROM stock')
+            self.conn.execute('DELETE FROM customers')
+            self.conn.execute('DELETE FROM outbox')
+            self._write_change({
+                'sales': data['sales_data'],
+                'stock': data['stock_data'],
+                'customers': data['customers'],
+                'outbox': data.get('outbox', ())
+            })
+            self.conn.executemany(
+                'INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)',
+                ((key, json.dumps(value, default=encode_default))
+                 for key, value in data.items() if key not in TABLE_KEYS)
+            )
+
+    def _write_change(self, change):
+        placeholders = ', '.join('?' * len(SALE_COLUMNS))
+        sales = change.get('sales', ())
+        if hasattr(sales, 'iter_dicts'):
+            sales = sales.iter_dicts()
+        self.conn.executemany(
+            f"INSERT OR REPLACE INTO sales ({', '.join(SALE_COLUMNS)}) VALUES ({placeholders})",
+            ([sale[column] for column in SALE_COLUMNS] for sale in sales)
+        )
+        self.conn.executemany(
+            'INSERT OR REPLACE INTO stock (product, quantity) VALUES (?, ?)',
+            change.get('stock', {}).items()
+        )
+        customers = change.get('customers', {})
+        self.conn.executemany(
+            'INSERT OR REPLACE INTO customers (name, balance) VALUES (?, ?)',
+            ((name, balance) for name, balance in customers.items() if balance is not None)
+        )
+        self.conn.executemany(
+            'DELETE FROM customers WHERE name = ?',
+            ((name,) for name, balance in customers.items() if balance is None)
+        )
+        for key in ('sync', 'reorder_thresholds'):
+            if key in change:
+                self.conn.execute('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)',
+                                  (key, json.dumps(change[key])))
+        self.conn.executemany(
+            'INSERT OR REPLACE INTO outbox (id, event) VALUES (?, ?)',
+            ((event['id'], json.dumps(event)) for event in change.get('outbox', ()))
+        )
+        if 'pushed' in change:
+            self.conn.execute('DELETE FROM outbox WHERE id <= ?', (change['pushed'],))
+
+    def flush(self):
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+
+BACKENDS = {
+    'json': JsonFileStorage,
+    'journal': JournalStorage,
+    'sqlite': SqliteStorage,
+}
+# Files each backend leaves next to its data file, in detect_backend's order
+BACKEND_FILES = (('.db', 'sqlite'), ('.journal', 'journal'), ('.snap', 'journal'),
+                 ('.json', 'json'))
+
+
+def open_storage(path, backend='journal', **options):
+    """Create the storage backend registered under `backend` for `path`"""
+    if backend not in BACKENDS:
+        raise ValueError(f'Unknown storage backend: {backend}')
+    return BACKENDS[backend](path, **options)
+
+
+def detect_backend(path):
+    """Backend whose files exist for the data file `path`, or None if there are none.
+
+    A database or journal wins over the snapshot it may have been created from.
+    """
+    base = os.path.splitext(path)[0]
+    for suffix, backend in BACKEND_FILES:
+        if os.path.exists(base + suffix):
+            return backend
+    return None
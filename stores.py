@@ -0,0 +1,42 @@
+"""One ledger per store.
+
+Each branch keeps its own complete ledger (with whatever storage backend
+it uses) in its own directory, so stores never share or lock each
+other's files and a store's data can be copied to head office as is:
+
+    stores/
+        north/sales_stock_data.json (.snap, .journal, .db, .history, ...)
+        harbour/sales_stock_data.json
+
+The app uses a store's ledger when SALES_STOCK_STORE names the store;
+consolidate.py rolls all stores up into one report, reading each store
+with the backend its files belong to (see storage.detect_backend).
+"""
+import os
+
+from storage import detect_backend
+
+STORES_DIR = 'stores'
+DATA_FILE = 'sales_stock_data.json'
+
+
+def check_store_name(store):
+    if not store or store in ('.', '..') or os.sep in store or '/' in store:
+        raise ValueError(f'Invalid store name: {store!r}')
+    return store
+
+
+def store_path(store, root=STORES_DIR, create=True):
+    """Data file of `store`; its directory is created if needed and `create`"""
+    directory = os.path.join(root, check_store_name(store))
+    if create:
+        os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, DATA_FILE)
+
+
+def list_stores(root=STORES_DIR):
+    """Names of the stores under `root` that have data, sorted"""
+    if not os.path.isdir(root):
+        return []
+    return sorted(store for store in os.listdir(root)
+                  if detect_backend(os.path.join(root, store, DATA_FILE)) is not None)
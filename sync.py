@@ -0,0 +1,126 @@
+"""Multi-device sync: device-unique ids, an event outbox and delta push/pull.
+
+Once `Ledger.enable_sync` has been called, every mutation also produces
+an event, kept in the ledger's outbox (persisted with the mutation itself)
+until the sync server has acknowledged it:
+
+    {'id': ..., 'type': 'sale', 'customer', 'product', 'quantity',
+     'unit_price', 'total_amount', 'date', 'paid', 'deduct'}
+    {'id': ..., 'type': 'payment', 'customer', 'amount', 'date',
+     'allocations': [[sale_id, amount], ...]}
+    {'id': ..., 'type': 'stock', 'product', 'delta'}
+
+Event ids are `device_id << 32 | seq`, where each device numbers its own
+events 1, 2, 3, ...; a sale's id is the id of the event that recorded it,
+so sale ids never collide across devices.
+
+Applying the same set of events gives the same ledger on every device,
+in any order: stock levels are sums of deltas, a payment pays exactly
+the sales it was allocated to on the device that took it (capped at what
+each sale still owes), and balances follow from the open sales. Events a
+device has already applied are skipped using the highest seq seen from
+each device.
+
+A sync pushes the outbox and pulls everything other devices pushed since
+the last pull, in batches, so its cost depends on new activity only. The
+server (sync_server.py) hands events out in the order it received them,
+so a payment always arrives after the sales it pays.
+
+    client = SyncClient('http://192.168.1.10:8765')
+    report = sync(ledger, client)
+"""
+import json
+import random
+import urllib.parse
+
+DEVICE_BITS = 32
+MAX_DEVICE_ID = 2 ** 31 - 1  # Ids are stored as signed 64-bit integers
+
+
+class SyncError(RuntimeError):
+    """The sync server could not be reached or rejected a request"""
+
+
+def make_event_id(device_id, seq):
+    return device_id << DEVICE_BITS | seq
+
+
+def split_event_id(event_id):
+    """(device_id, seq) of an event or sale id; legacy sale ids have device 0"""
+    return event_id >> DEVICE_BITS, event_id & (2 ** DEVICE_BITS - 1)
+
+
+def new_device_id():
+    return random.SystemRandom().randint(1, MAX_DEVICE_ID)
+
+
+class SyncClient:
+    """JSON-over-HTTP client for sync_server.py"""
+
+    def __init__(self, url, timeout=30):
+        self.url = url.rstrip('/')
+        self.timeout = timeout
+
+    def push(self, device_id, events):
+        """Upload events; the server ignores ones it already has"""
+        return self._request('/push', {'device': device_id, 'events': events})
+
+    def pull(self, after, device_id, limit):
+        """Events after server position `after` that `device_id` did not push.
+
+        Returns {'events': [...], 'position': last position read, 'more': bool}.
+        """
+        query = urllib.parse.urlencode({'after': after, 'exclude': device_id, 'limit': limit})
+        return self._request('/pull?' + query)
+
+    def _request(self, path, body=None):
+        # Imported here: urllib.request is slow to import and the ledger,
+        # which imports this module, starts without it
+        import urllib.request
+
+        data = None
+        headers = {}
+        if body is not None:
+            data = json.dumps(body, separators=(',', ':')).encode()
+            headers['Content-Type'] = 'application/json'
+        request = urllib.request.Request(self.url + path, data=data, headers=headers)
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            raise SyncError(f'sync server error {e.code}: {e.read().decode(errors="replace")}')
+        except (OSError, ValueError) as e:
+            raise SyncError(f'sync failed: {e}')
+
+
+def sync(ledger, client, batch_size=500, call=None):
+    """Push the ledger's outbox, then pull and apply other devices' events.
+
+    `call(function, *args)` runs ledger methods; the app passes one that
+    runs them on the UI thread, so only the network requests happen on the
+    calling thread. Returns {'pushed', 'pulled', 'applied', 'overpaid'},
+    where `overpaid` maps customers to payment amounts that found their
+    sales already paid by another device.
+    """
+    call = call or (lambda function, *args: function(*args))
+    device_id = ledger.sync['device_id']
+    report = {'pushed': 0, 'pulled': 0, 'applied': 0, 'overpaid': {}}
+
+    while True:
+        events = ledger.outbox[:batch_size]
+        if not events:
+            break
+        client.push(device_id, events)
+        call(ledger.mark_pushed, events[-1]['id'])
+        report['pushed'] += len(events)
+
+    while True:
+        response = client.pull(ledger.sync['cursor'], device_id, batch_size)
+        result = call(ledger.apply_events, response['events'], response['position'])
+        report['pulled'] += len(response['events'])
+        report['applied'] += result['applied']
+        for customer, amount in result['overpaid'].items():
+            report['overpaid'][customer] = report['overpaid'].get(customer, 0) + amount
+        if not response['more']:
+            break
+    return report
@@ -0,0 +1,137 @@
+"""Small self-hosted sync server for the sales ledger (see sync.py).
+
+Stores every pushed event once, in arrival order, in a SQLite file and
+hands them out from any position, skipping the asking device's own:
+
+    POST /push  {'device': id, 'events': [...]}  -> {'accepted': n, 'position': p}
+    GET  /pull?after=p&exclude=id&limit=n      -> {'events': [...], 'position': p, 'more': bool}
+
+Run it on a computer on the shop's network, or locally for testing:
+
+    python sync_server.py --port 8765 --db sync_server.db
+"""
+import argparse
+import json
+import sqlite3
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from sync import split_event_id
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    position INTEGER PRIMARY KEY AUTOINCREMENT,
+    id INTEGER NOT NULL UNIQUE,
+    device INTEGER NOT NULL,
+    event TEXT NOT NULL
+);
+"""
+MAX_LIMIT = 5000
+
+
+class EventStore:
+    """Append-only event log; safe to use from several request threads"""
+
+    def __init__(self, path):
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.executescript(SCHEMA)
+        self.lock = threading.Lock()
+
+    def push(self, device_id, events):
+        for event in events:
+            if split_event_id(event['id'])[0] != device_id:
+                raise ValueError(f"event {event['id']} was not created by device {device_id}")
+        with self.lock, self.conn:
+            before = self.conn.total_changes
+            self.conn.executemany(
+                'INSERT OR IGNORE INTO events (id, device, event) VALUES (?, ?, ?)',
+                ((event['id'], device_id, json.dumps(event, separators=(',', ':')))
+                 for event in events))
+            accepted = self.conn.total_changes - before
+            position = self.conn.execute('SELECT MAX(position) FROM events').fetchone()[0]
+        return {'accepted': accepted, 'position': position or 0}
+
+    def pull(self, after, exclude, limit):
+        limit = max(1, min(limit, MAX_LIMIT))
+        with self.lock:
+            rows = self.conn.execute(
+                'SELECT position, device, event FROM events WHERE position > ? '
+                'ORDER BY position LIMIT ?', (after, limit + 1)).fetchall()
+        more = len(rows) > limit
+        rows = rows[:limit]
+        # The position advances past the device's own events too
+        position = rows[-1][0] if rows else after
+        events = [event for _, device, event in rows if device != exclude]
+        body = '{"events":[%s],"position":%d,"more":%s}' % (
+            ','.join(events), position, 'true' if more else 'false')
+        return body.encode()
+
+    def close(self):
+        self.conn.close()
+
+
+class SyncHandler(BaseHTTPRequestHandler):
+    store = None  # Set by make_server
+
+    def do_POST(self):
+        if urlparse(self.path).path != '/push':
+            return self.send_error(404)
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            body = json.loads(self.rfile.read(length))
+            result = self.store.push(int(body['device']), body['events'])
+        except (ValueError, KeyError, TypeError) as e:
+            return self.send_error(400, str(e))
+        self._reply(json.dumps(result).encode())
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path != '/pull':
+            return self.send_error(404)
+        query = parse_qs(url.query)
+        try:
+            after = int(query.get('after', ['0'])[0])
+            exclude = int(query.get('exclude', ['0'])[0])
+            limit = int(query.get('limit', ['500'])[0])
+        except ValueError as e:
+            return self.send_error(400, str(e))
+        self._reply(self.store.pull(after, exclude, limit))
+
+    def _reply(self, body):
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # Quiet; every sync makes several requests
+
+
+def make_server(db_path, host='127.0.0.1', port=8765):
+    """An HTTP server bound to host:port, serving the events in `db_path`"""
+    handler = type('Handler', (SyncHandler,), {'store': EventStore(db_path)})
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--db', default='sync_server.db')
+    args = parser.parse_args()
+    server = make_server(args.db, args.host, args.port)
+    print(f'sync server listening on {args.host}:{args.port}, events in {args.db}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        server.RequestHandlerClass.store.close()
+
+
+if __name__ == '__main__':
+    main()
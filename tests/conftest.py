@@ -0,0 +1,21 @@
+import os
+import sys
+
+import pytest
+
+# The modules live at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+BACKENDS = ('json', 'journal', 'sqlite')
+
+
+@pytest.fixture(params=BACKENDS)
+def backend(request):
+    """Each storage backend in turn"""
+    return request.param
+
+
+@pytest.fixture
+def path(tmp_path):
+    """Data file of a fresh ledger"""
+    return str(tmp_path / 'ledger.json')
@@ -0,0 +1,23 @@
+import asyncio
+
+from api_server import ApiServer
+from ledger import Ledger
+
+
+def get(ledger, target):
+    return asyncio.run(ApiServer(ledger).dispatch('GET', target, b''))
+
+
+def test_as_of_without_history():
+    status, payload = get(Ledger(), '/reports/as-of?date=2024-03-31')
+    assert status == 404
+    assert 'history is off' in payload['error']
+
+
+def test_as_of_with_history(tmp_path):
+    ledger = Ledger.open(str(tmp_path / 'ledger.json'), history=True)
+    ledger.add_product('Rice', 10)
+    status, payload = get(ledger, '/reports/as-of?date=2999-01-01')
+    assert status == 200
+    assert payload['stock'] == {'Rice': 10}
+    ledger.close()
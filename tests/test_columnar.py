@@ -0,0 +1,60 @@
+from columnar import SalesTable
+
+
+def sale(sale_id, customer, product, date, status='credit', quantity=1.0, price=1000):
+    return {'id': sale_id, 'customer': customer, 'product': product, 'quantity': quantity,
+            'unit_price': price, 'total_amount': int(quantity * price), 'date': date,
+            'status': status, 'paid_amount': 0 if status == 'credit' else int(quantity * price)}
+
+
+SALES = [sale(1, 'Alice', 'Rice', '2024-01-01 09:00'),
+         sale(2, 'Bob', 'Salt', '2024-01-02 10:30', status='paid'),
+         sale(3, 'Alice', 'Salt', '2024-01-03 08:15', quantity=2.5),
+         sale(4, 'Alice', 'Rice', '2024-01-03 17:45', status='paid')]
+
+
+def test_rows_round_trip_through_interned_columns():
+    table = SalesTable(SALES)
+    assert table.to_list() == SALES
+    assert [dict(row) for row in table] == SALES
+    assert table.customer_names.values == ['Alice', 'Bob']
+    assert list(table.customer_ids) == [0, 1, 0, 0]
+    assert table.product_names.values == ['Rice', 'Salt']
+
+
+def test_row_views_write_through_to_the_columns():
+    table = SalesTable(SALES)
+    row = table[2]
+    row['paid_amount'] = 2500
+    row['status'] = 'paid'
+    row['customer'] = 'Carol'
+    assert table.column('paid_amount')[2] == 2500
+    assert table[2]['status'] == 'paid'
+    assert table.customer_names.values == ['Alice', 'Bob', 'Carol']
+    assert list(table.select(customer='Alice')) == [0, 3]  # Index rebuilt after the change
+    assert table[-1]['id'] == 4
+
+
+def test_select_filters_and_orders():
+    table = SalesTable(SALES)
+    assert table.select(customer='Alice', status='credit') == [0, 2]
+    assert table.select(product='Salt', date_from='2024-01-03') == [2]
+    assert table.select(date_from='2024-01-02', date_to='2024-01-03 08:15') == range(1, 3)
+    assert table.select(customer='Nobody') == []
+
+    # A back-dated sale breaks the time order; date filters still work
+    table.append(sale(5, 'Bob', 'Rice', '2023-12-31 23:00'))
+    assert table.ordered_prefix() == 4
+    assert table.select(date_to='2024-01-01') == [0, 4]
+    assert table.sort_rows(table.select(customer='Bob'), newest_first=True) == [1, 4]
+    assert [row['id'] for row in table.newest(2)] == [4, 3]
+
+
+def test_copy_is_independent():
+    table = SalesTable(SALES)
+    copy = table.copy()
+    table.append(sale(5, 'Dan', 'Tea', '2024-01-04 12:00'))
+    table[0]['paid_amount'] = 1000
+    assert len(copy) == 4
+    assert copy[0]['paid_amount'] == 0
+    assert 'Dan' not in copy.customer_names.ids
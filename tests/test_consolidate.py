@@ -0,0 +1,46 @@
+import os
+
+import pytest
+
+from consolidate import consolidate
+from ledger import Ledger
+from stores import list_stores, store_path
+
+
+def file_contents(root):
+    contents = {}
+    for directory, _, files in os.walk(root):
+        for name in files:
+            if name.endswith(('-wal', '-shm')):
+                continue  # SQLite's shared memory for readers, even read-only ones
+            path = os.path.join(directory, name)
+            with open(path, 'rb') as f:
+                contents[path] = f.read()
+    return contents
+
+
+def test_stores_are_read_with_their_own_backend_and_left_alone(tmp_path):
+    root = str(tmp_path)
+    for store, backend, owed in (('north', 'json', 10000), ('harbour', 'journal', 20000),
+                                 ('hill', 'sqlite', 30000)):
+        ledger = Ledger.open(store_path(store, root), backend)
+        ledger.add_product('Rice', 10)
+        ledger.record_sale('Alice', 'Rice', 1, owed)
+        ledger.close()
+    with open(os.path.join(root, 'harbour', 'sales_stock_data.journal'), 'a') as f:
+        f.write('{"seq": 99, "torn')
+    before = file_contents(root)
+
+    stores = list_stores(root)
+    assert stores == ['harbour', 'hill', 'north']
+    report = consolidate(stores, root, workers=1)
+    assert report['sales_count'] == 3
+    assert report['balances'] == {'Alice': 60000}
+    assert report['products']['Rice'] == {'units': 3, 'revenue': 60000, 'stock': 27}
+    assert file_contents(root) == before
+
+
+def test_store_without_ledger_fails(tmp_path):
+    os.makedirs(tmp_path / 'empty')
+    with pytest.raises(ValueError, match='No ledger found'):
+        consolidate(['empty'], str(tmp_path), workers=1)
@@ -0,0 +1,55 @@
+import json
+import os
+import sys
+
+import pytest
+
+import export
+from ledger import Ledger
+
+
+def test_cli_export_leaves_the_store_alone(tmp_path, monkeypatch):
+    path = str(tmp_path / 'ledger.json')
+    ledger = Ledger.open(path)
+    ledger.add_product('Rice', 10)
+    ledger.record_sale('Alice', 'Rice', 2, 1250)
+    ledger.close()
+    with open(path.replace('.json', '.journal'), 'a') as f:
+        f.write('{"seq": 9, "torn')
+    before = {name: os.path.getsize(tmp_path / name) for name in os.listdir(tmp_path)}
+
+    out = tmp_path / 'out'
+    monkeypatch.setattr(sys, 'argv', ['export.py', '--data', path, '--out', str(out)])
+    export.main()
+
+    assert {name: os.path.getsize(tmp_path / name) for name in before} == before
+    assert not os.path.exists(tmp_path / 'ledger.history')
+    with open(out / 'sales.csv') as f:
+        assert f.read().splitlines()[1].startswith('1,Alice,Rice,2.0,12.5,25.0,')
+
+
+def test_export_filters_and_formats(tmp_path):
+    ledger = Ledger()
+    ledger.add_product('Rice', 10)
+    ledger.record_sale('Alice', 'Rice', 1, 1000, date='2024-01-01 09:00')
+    ledger.record_sale('Bob', 'Rice', 2, 1000, date='2024-02-01 09:00')
+    ledger.record_sale('Alice', 'Rice', 3, 1000, date='2024-03-01 09:00')
+    ledger.record_payment('Alice', 1000)
+
+    def sales(**filters):
+        paths = export.export_all(ledger.get_data(), str(tmp_path), 'jsonl', chunk_size=1,
+                                  **filters)
+        with open(paths[0]) as f:
+            return [(row['id'], row['status'], row['paid_amount']) for row in map(json.loads, f)]
+
+    assert sales(customer='Alice', date_to='2024-02') == [(1, 'paid', 10.0)]
+    assert sales(customer='Alice', status='credit') == [(3, 'credit', 0.0)]
+    assert [sale[0] for sale in sales(date_from='2024-02-01')] == [2, 3]
+    paths = export.export_all(ledger.get_data(), str(tmp_path), 'jsonl')
+    assert [os.path.basename(path) for path in paths] == [
+        'sales.jsonl', 'balances.jsonl', 'stock.jsonl']
+    with open(paths[1]) as f:
+        assert [json.loads(line) for line in f] == [{'customer': 'Alice', 'balance': 30.0},
+                                                    {'customer': 'Bob', 'balance': 20.0}]
+    with pytest.raises(ValueError):
+        export.export_all(ledger.get_data(), str(tmp_path), 'xlsx')
@@ -0,0 +1,50 @@
+import threading
+
+import pytest
+
+import history
+from history import History, HistoryError, history_path
+from ledger import Ledger
+from storage import open_storage
+
+
+def test_state_at_replays_from_checkpoints(tmp_path, monkeypatch):
+    path = str(tmp_path / 'ledger.json')
+    clock = [1000]
+    monkeypatch.setattr(history, 'now_timestamp', lambda: clock[0])
+    ledger = Ledger(open_storage(path), history=History(history_path(path), checkpoint_every=2))
+    ledger.load()
+    clock[0] = 2000
+    ledger.add_product('Rice', 10)
+    ledger.record_sale('Alice', 'Rice', 2, 50000)
+    ledger.adjust_stock('Rice', 5)
+    clock[0] = 3000
+    ledger.record_payment('Alice', 30000)
+    ledger.close()
+
+    reopened = History(history_path(path))
+    assert reopened.state_at(1000) == {'stock': {}, 'customers': {}}
+    assert reopened.state_at(2500) == {'stock': {'Rice': 13}, 'customers': {'Alice': 100000}}
+    assert reopened.state_at(3000) == {'stock': {'Rice': 13}, 'customers': {'Alice': 70000}}
+    with pytest.raises(HistoryError):
+        reopened.state_at(999)
+
+
+def test_background_writes_record_history_on_the_persistence_thread(tmp_path, monkeypatch):
+    path = str(tmp_path / 'ledger.json')
+    threads = set()
+    record = History.record
+
+    def spy(self, change, ledger):
+        threads.add(threading.current_thread().name)
+        record(self, change, ledger)
+    monkeypatch.setattr(History, 'record', spy)
+    ledger = Ledger.open(path, history=True)
+    ledger.start_background_writes()
+    ledger.add_product('Rice', 10)
+    ledger.record_sale('Alice', 'Rice', 2, 50000)
+    ledger.close()
+
+    assert threads == {'persistence'}
+    assert History(history_path(path)).state_at('2999-01-01') == {
+        'stock': {'Rice': 8}, 'customers': {'Alice': 100000}}
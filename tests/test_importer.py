@@ -0,0 +1,67 @@
+from importer import ImportBatch, read_batch
+from ledger import Ledger
+
+
+def test_invalid_rows_are_reported_by_line(tmp_path):
+    ledger = Ledger()
+    ledger.add_product('Rice', 3)
+    path = tmp_path / 'sales.csv'
+    path.write_text('customer,product,quantity,unit_price,date,paid_amount\n'
+                    'Alice,Rice,2,12.50,2024-01-02,5\n'
+                    'Bob,Rice,2,12.50,2024-01-02,\n'  # Only 1 left after Alice's
+                    ',Rice,1,1,2024-01-02,\n'
+                    'Carol,Rice,1,abc,2024-01-02,\n'
+                    'Dave,Rice,1,1,02/01/2024,\n'
+                    'Erin,Rice,1,2,2024-01-02 10:30,3\n')
+
+    batch = read_batch(str(path), 'sales', ledger.get_data(), deduct_stock=True)
+    assert [line for line, _ in batch.errors] == [3, 4, 5, 6, 7]
+    assert batch.errors[0][1] == 'insufficient stock for Rice'
+    assert batch.errors[1][1] == 'missing customer'
+    assert batch.errors[4][1] == 'paid_amount must be between 0 and the sale total'
+    assert len(batch.rows) == 1
+    assert ledger.stock_data == {'Rice': 3}  # Nothing applied yet
+
+    assert ledger.apply_import(batch) == 1
+    sale = ledger.sales_data[-1]
+    assert (sale['customer'], sale['total_amount'], sale['paid_amount'], sale['status']) == (
+        'Alice', 2500, 500, 'credit')
+    assert ledger.customers == {'Alice': 2000}
+    assert ledger.stock_data == {'Rice': 1}
+
+
+def test_deducts_from_stock_at_apply_time(tmp_path):
+    ledger = Ledger()
+    ledger.add_product('Rice', 10)
+    path = tmp_path / 'sales.csv'
+    path.write_text('customer,product,quantity,unit_price,date\n'
+                    'Alice,Rice,2,12.50,2024-01-02\n')
+    batch = read_batch(str(path), 'sales', ledger.get_data(), deduct_stock=True)
+    ledger.record_sale('Bob', 'Rice', 3, 1000)  # While the import is being reviewed
+    ledger.adjust_stock('Rice', 5)
+
+    ledger.apply_import(batch)
+    assert ledger.stock_data == {'Rice': 10}
+
+
+def test_jsonl_products(tmp_path):
+    path = tmp_path / 'products.jsonl'
+    path.write_text('{"name": "Rice", "stock": 5}\n'
+                    'not json\n'
+                    '{"name": "Rice", "stock": 1}\n'
+                    '{"name": "Salt", "stock": -1}\n')
+    batch = read_batch(str(path), 'products', Ledger().get_data())
+    assert [line for line, _ in batch.errors] == [2, 3, 4]
+    assert batch.errors[1][1] == 'product already exists: Rice'
+    assert batch.rows == [('Rice', 5.0)]
+
+
+def test_stock_counts_need_known_products():
+    ledger = Ledger()
+    ledger.add_product('Rice', 5)
+    batch = ImportBatch('stock', ledger.get_data())
+    batch.add(2, {'product': 'Rice', 'quantity': '8'})
+    batch.add(3, {'product': 'Salt', 'quantity': '1'})
+    assert batch.errors == [(3, 'unknown product: Salt')]
+    ledger.apply_import(batch)
+    assert ledger.stock_data == {'Rice': 8.0}
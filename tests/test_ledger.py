@@ -0,0 +1,99 @@
+import pytest
+
+from importer import ImportBatch
+from ledger import Ledger, LedgerError
+
+
+def test_detached_ledger_saves_nothing(path, backend):
+    ledger = Ledger.open(path, backend, history=True)
+    ledger.add_product('Rice', 10)
+    ledger.close()
+
+    ledger = Ledger.open(path, backend, history=True)
+    ledger.detach()
+    ledger.clear()
+    ledger.add_product('Beans', 5)
+    ledger.close()
+
+    ledger = Ledger.open(path, backend)
+    assert ledger.stock_data == {'Rice': 10}
+    ledger.close()
+
+
+def test_product_import_syncs_stock():
+    phone = Ledger()
+    phone.enable_sync(device_id=1)
+    batch = ImportBatch('products', phone.get_data())
+    batch.add(2, {'name': 'Rice', 'stock': '12'})
+    batch.add(3, {'name': 'Salt', 'stock': '0'})
+    phone.apply_import(batch)
+
+    other = Ledger()
+    other.enable_sync(device_id=2)
+    other.apply_events(phone.outbox)
+    assert other.stock_data == {'Rice': 12, 'Salt': 0}
+
+
+def test_sale_ids_stay_unique_after_snapshot_recovery(path):
+    ledger = Ledger.open(path, 'journal', compact_every=5)
+    ledger.add_product('Rice', 100)
+    for _ in range(10):
+        ledger.record_sale('Alice', 'Rice', 1, 10000)
+    ledger.close()
+    with open(path.replace('.json', '.snap'), 'wb') as f:
+        f.write(b'not a snapshot')
+
+    ledger = Ledger.open(path, 'journal', compact_every=5)
+    assert ledger.last_recovery is not None
+    ids = [sale['id'] for sale in ledger.sales_data]
+    assert len(ids) < 10  # Sales compacted only into the damaged snapshot are lost
+    for _ in range(6):
+        ledger.record_sale('Bob', 'Rice', 1, 10000)
+    ledger.close()
+
+    ledger = Ledger.open(path, 'journal')
+    reopened = [sale['id'] for sale in ledger.sales_data]
+    assert len(reopened) == len(set(reopened)) == len(ids) + 6
+    assert ledger.customers['Bob'] == 60000
+    assert ledger.last_reconciliation['drift'] == {}
+    ledger.close()
+
+
+@pytest.mark.parametrize('backend', ('journal', 'sqlite'))  # JSON rewrites on every change
+def test_import_is_saved_as_one_change(path, backend, monkeypatch):
+    ledger = Ledger.open(path, backend)
+    ledger.add_product('Rice', 10)
+    ledger.record_sale('Alice', 'Rice', 1, 1000)
+    monkeypatch.setattr(type(ledger.storage), 'save', None)  # A full rewrite would fail
+    batch = ImportBatch('sales', ledger.get_data(), deduct_stock=True)
+    batch.add(2, {'customer': 'Bob', 'product': 'Rice', 'quantity': '2', 'unit_price': '5',
+                  'date': '2024-01-02'})
+    assert ledger.apply_import(batch) == 1
+    ledger.close()
+    monkeypatch.undo()
+
+    ledger = Ledger.open(path, backend)
+    assert [sale['id'] for sale in ledger.sales_data] == [1, 2]
+    assert ledger.customers == {'Alice': 1000, 'Bob': 1000}
+    assert ledger.stock_data == {'Rice': 7}
+    ledger.close()
+
+
+def test_payment_pays_oldest_sales_first():
+    ledger = Ledger()
+    ledger.add_product('Rice', 10)
+    ledger.record_sale('Alice', 'Rice', 1, 3000, date='2024-01-03 09:00')
+    ledger.record_sale('Alice', 'Rice', 1, 2000, date='2024-01-01 09:00')  # Back-dated
+    ledger.record_sale('Bob', 'Rice', 1, 1000, date='2024-01-02 09:00')
+
+    paid = ledger.record_payment('Alice', 2500)
+    assert [(sale['id'], sale['paid_amount'], sale['status']) for sale in paid] == [
+        (2, 2000, 'paid'), (1, 500, 'credit')]
+    assert [sale['id'] for sale in ledger.open_invoices.open_sales('Alice')] == [1]
+    assert ledger.customers == {'Alice': 2500, 'Bob': 1000}
+
+    ledger.record_payment('Alice', 2500)
+    assert 'Alice' not in ledger.customers
+    assert ledger.open_invoices.open_sales('Alice') == ()
+    with pytest.raises(LedgerError):
+        ledger.record_payment('Bob', 1001)
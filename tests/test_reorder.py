@@ -0,0 +1,22 @@
+from ledger import Ledger
+from reorder import ReorderIndex
+
+
+def test_incremental_list_matches_rebuild():
+    ledger = Ledger()
+    ledger.add_product('Rice', 40)
+    ledger.add_product('Salt', 5)
+    ledger.add_product('Soap', 30)
+    ledger.add_product('Tea', 100)
+    for _ in range(6):
+        ledger.record_sale('Alice', 'Rice', 5, 1000)
+    ledger.record_sale('Bob', 'Soap', 1, 1000)
+    ledger.set_reorder_threshold('Tea', 150)
+
+    rebuilt = ReorderIndex()
+    rebuilt.thresholds = dict(ledger.reorder.thresholds)
+    rebuilt.rebuild(ledger.sales_data, ledger.stock_data, now=ledger.reorder.origin)
+    listed = ledger.reorder.reorder_list(now=ledger.reorder.origin)
+    assert listed == rebuilt.reorder_list(now=ledger.reorder.origin)
+    assert [row['product'] for row in listed] == ['Salt', 'Tea', 'Rice', 'Soap']
+    assert ledger.reorder.is_low('Tea') and not ledger.reorder.is_low('Rice')
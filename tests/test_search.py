@@ -0,0 +1,16 @@
+from search import NameIndex
+
+
+def test_prefix_then_word_then_substring():
+    index = NameIndex(['Rice Bag', 'Baguette', 'Sugar', 'Teabag'])
+    assert index.search('bag') == ['Baguette', 'Rice Bag', 'Teabag']
+    assert index.search('BAG', limit=1) == ['Baguette']
+    assert index.search('x') == []
+
+
+def test_add_keeps_the_index_sorted():
+    index = NameIndex(['Rice'])
+    index.add('Red Beans')
+    index.add('Rice')
+    assert index.search('r') == ['Red Beans', 'Rice']
+    assert index.search('bea', accept=lambda name: name != 'Red Beans') == []
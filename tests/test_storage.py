@@ -0,0 +1,124 @@
+import json
+import os
+
+import pytest
+
+from ledger import Ledger
+from storage import JournalStorage, open_storage, read_snapshot
+
+
+def test_reopen_keeps_amounts(path, backend):
+    ledger = Ledger.open(path, backend)
+    ledger.add_product('Rice', 10)
+    ledger.record_sale('Alice', 'Rice', 2, 50000)
+    ledger.record_payment('Alice', 30000)
+    ledger.close()
+
+    ledger = Ledger.open(path, backend)
+    assert ledger.sales_data[0]['total_amount'] == 100000
+    assert ledger.sales_data[0]['paid_amount'] == 30000
+    assert ledger.customers == {'Alice': 70000}
+    assert ledger.stock_data == {'Rice': 8}
+    assert ledger.last_reconciliation['drift'] == {}
+    ledger.close()
+
+
+def test_legacy_float_data_is_migrated(path, backend):
+    with open(path, 'w') as f:
+        json.dump({'sales_data': [{'id': 1, 'customer': 'Alice', 'product': 'Rice',
+                                   'quantity': 2.0, 'unit_price': 500.0, 'total_amount': 1000.0,
+                                   'date': '2024-01-02 10:00', 'status': 'credit',
+                                   'paid_amount': 250.0}],
+                   'stock_data': {'Rice': 8.0},
+                   'customers': {'Alice': 750.0}}, f)
+    ledger = Ledger.open(path, backend)
+    assert ledger.sales_data[0]['total_amount'] == 100000
+    assert ledger.customers == {'Alice': 75000}
+    ledger.record_payment('Alice', 5000)  # Journaled on top of the migrated data
+    ledger.close()
+
+    for _ in range(3):  # Each reopen must leave the cents as they are
+        ledger = Ledger.open(path, backend)
+        sale = ledger.sales_data[0]
+        assert (sale['unit_price'], sale['total_amount'], sale['paid_amount']) == (
+            50000, 100000, 30000)
+        assert ledger.customers == {'Alice': 70000}
+        assert ledger.aggregates.total_sales == 100000
+        assert ledger.last_reconciliation['drift'] == {}
+        ledger.close()
+
+
+def test_journal_without_header_is_current(path, tmp_path):
+    # Journals started before the header existed hold cents already
+    sale = {'id': 1, 'customer': 'Alice', 'product': 'Rice', 'quantity': 1.0,
+            'unit_price': 50000, 'total_amount': 50000, 'date': '2024-01-02 10:00',
+            'status': 'credit', 'paid_amount': 0}
+    with open(tmp_path / 'ledger.journal', 'w') as f:
+        f.write(json.dumps({'type': 'sale', 'sales': [sale], 'stock': {'Rice': 9.0},
+                            'customers': {'Alice': 50000}, 'seq': 1}) + '\n')
+    ledger = Ledger.open(path, 'journal')
+    assert ledger.customers == {'Alice': 50000}
+    ledger.close()
+
+
+def test_sqlite_imports_journal_tail(path):
+    ledger = Ledger.open(path, 'journal')
+    ledger.add_product('Rice', 10)
+    ledger.record_sale('Alice', 'Rice', 2, 50000)
+    ledger.record_sale('Bob', 'Rice', 1, 50000)
+    ledger.close()
+
+    ledger = Ledger.open(path, 'sqlite')
+    assert len(ledger.sales_data) == 2
+    assert ledger.customers == {'Alice': 100000, 'Bob': 50000}
+    assert ledger.stock_data == {'Rice': 7}
+    ledger.close()
+
+
+def test_read_only_storage_refuses_writes(path, backend):
+    ledger = Ledger.open(path, backend)
+    ledger.add_product('Rice', 10)
+    ledger.close()
+
+    storage = open_storage(path, backend, read_only=True)
+    data = storage.load()
+    with pytest.raises(PermissionError):
+        storage.append([{'type': 'stock', 'stock': {'Rice': 9}}], lambda: data)
+    with pytest.raises(PermissionError):
+        storage.save(data)
+    storage.close()
+
+
+def test_journal_compacts_and_replays(path):
+    ledger = Ledger.open(path, 'journal', compact_every=4)
+    ledger.add_product('Rice', 20)
+    for _ in range(5):
+        ledger.record_sale('Alice', 'Rice', 1, 1000)
+    ledger.close()
+    journal = path.replace('.json', '.journal')
+    with open(journal) as f:
+        lines = [json.loads(line) for line in f]
+    # Six changes: the fourth compacted everything into the snapshot
+    assert lines[0] == {'format_version': 2}
+    assert [line['seq'] for line in lines[1:]] == [5, 6]
+    snapshot = read_snapshot(path.replace('.json', '.snap'))
+    assert snapshot['journal_seq'] == 4 and len(snapshot['sales_data']) == 3
+
+    # A crash after the snapshot but before the journal was emptied leaves
+    # records the snapshot already holds (seq <= 4); they are skipped. A
+    # crash mid-append leaves a torn last line
+    stale = [{'type': 'product', 'stock': {'Ghost': seq}, 'seq': seq} for seq in (3, 4)]
+    with open(journal, 'w') as f:
+        for line in lines[:1] + stale + lines[1:]:
+            f.write(json.dumps(line) + '\n')
+        f.write('{"seq": 7, "type": "sale"')
+    size = os.path.getsize(journal)
+
+    storage = JournalStorage(path)
+    data = storage.load()
+    storage.close()
+    assert storage.seq == 6
+    assert len(data['sales_data']) == 5
+    assert data['customers'] == {'Alice': 5000}
+    assert data['stock_data'] == {'Rice': 15}
+    assert os.path.getsize(journal) < size  # The torn tail is cut
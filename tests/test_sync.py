@@ -0,0 +1,73 @@
+import json
+
+from ledger import Ledger
+from sync import make_event_id, split_event_id, sync
+from sync_server import EventStore
+
+
+class LocalClient:
+    """SyncClient stand-in that talks to an EventStore in this process"""
+
+    def __init__(self, store):
+        self.store = store
+
+    def push(self, device_id, events):
+        return self.store.push(device_id, events)
+
+    def pull(self, after, device_id, limit):
+        return json.loads(self.store.pull(after, device_id, limit))
+
+
+def state(ledger):
+    sales = sorted((sale['id'], sale['customer'], sale['quantity'], sale['paid_amount'],
+                    sale['status']) for sale in ledger.sales_data)
+    return sales, ledger.stock_data, ledger.customers
+
+
+def test_event_ids_order_by_device_then_sequence():
+    assert split_event_id(make_event_id(7, 42)) == (7, 42)
+    assert split_event_id(5) == (0, 5)  # Sale ids from before sync
+    assert make_event_id(1, 2 ** 32 - 1) < make_event_id(2, 1)
+
+    ledger = Ledger()
+    ledger.enable_sync(device_id=3)
+    ledger.add_product('Rice', 5)
+    ledger.record_sale('Alice', 'Rice', 1, 1000)
+    ids = [event['id'] for event in ledger.outbox]
+    assert ids == sorted(ids) and len(set(ids)) == len(ids)
+    assert {split_event_id(event_id)[0] for event_id in ids} == {3}
+
+
+def test_devices_converge(tmp_path):
+    client = LocalClient(EventStore(str(tmp_path / 'server.db')))
+    shop = Ledger()
+    shop.enable_sync(device_id=1)
+    van = Ledger()
+    van.enable_sync(device_id=2)
+
+    shop.add_product('Rice', 20)
+    shop.record_sale('Alice', 'Rice', 2, 1000)
+    sync(shop, client, batch_size=2)
+    sync(van, client, batch_size=2)
+    assert state(van) == state(shop)
+
+    # Both take Alice's full payment while offline, and both sell more
+    shop.record_payment('Alice', 2000)
+    van.record_payment('Alice', 2000)
+    shop.record_sale('Bob', 'Rice', 1, 1000)
+    van.record_sale('Carol', 'Rice', 3, 1000)
+
+    sync(shop, client, batch_size=2)
+    report = sync(van, client, batch_size=2)
+    sync(shop, client, batch_size=2)
+    assert report['overpaid'] == {'Alice': 2000}
+    assert state(van) == state(shop)
+    sales, stock, customers = state(shop)
+    assert stock == {'Rice': 14}
+    assert customers == {'Bob': 1000, 'Carol': 3000}
+    assert len(sales) == 3
+
+    # Replaying the shop's events, as after a lost acknowledgement, changes nothing
+    events = client.pull(0, 2, 1000)['events']
+    assert events and van.apply_events(events)['applied'] == 0
+    assert state(van) == state(shop)
@@ -0,0 +1,95 @@
+"""Reusable Kivy widgets for the app."""
+from kivy.metrics import dp
+from kivy.uix.button import Button
+from kivy.uix.dropdown import DropDown
+from kivy.uix.recycleview import RecycleView
+from kivy.uix.recycleboxlayout import RecycleBoxLayout
+from kivy.uix.textinput import TextInput
+
+
+def count_widgets(widget):
+    """Number of widgets in the tree rooted at `widget`"""
+    return 1 + sum(count_widgets(child) for child in widget.children)
+
+
+class RecycledList(RecycleView):
+    """Scrolling list of labels that only creates widgets for the visible rows.
+
+    Rows are dicts of Label properties keyed by an id (sale id, product
+    name, ...). Views are reused, so every row must set every property that
+    differs between rows (e.g. both red and white rows set `color`).
+    """
+
+    def __init__(self, row_height, **kwargs):
+        super().__init__(**kwargs)
+        self.viewclass = 'Label'
+        layout = RecycleBoxLayout(
+            orientation='vertical',
+            default_size=(None, row_height),
+            default_size_hint=(1, None),
+            size_hint_y=None
+        )
+        layout.bind(minimum_height=layout.setter('height'))
+        self.add_widget(layout)
+        self.row_index = {}
+
+    def set_rows(self, rows):
+        """Replace the whole list with (key, row) pairs"""
+        self.row_index = {}
+        data = []
+        for key, row in rows:
+            self.row_index[key] = len(data)
+            data.append(row)
+        self.data = data
+
+    def update_row(self, key, row):
+        """Redraw a single row in place; returns False if `key` is not listed"""
+        i = self.row_index.get(key)
+        if i is None:
+            return False
+        self.data[i] = row
+        return True
+
+
+class TypeaheadInput(TextInput):
+    """Text input that suggests names from `search(query)` in a dropdown as you type.
+
+    `search` must be fast (see search.NameIndex); it runs on every
+    keystroke and returns at most a handful of names, so only that many
+    option buttons ever exist.
+    """
+
+    def __init__(self, search, option_height=dp(40), **kwargs):
+        kwargs.setdefault('multiline', False)
+        super().__init__(**kwargs)
+        self.search = search
+        self.option_height = option_height
+        self.selecting = False
+        self.dropdown = DropDown()
+        self.dropdown.bind(on_select=self.on_suggestion)
+        self.bind(text=self.on_query, focus=self.on_focus_changed)
+
+    def on_focus_changed(self, instance, focused):
+        if focused:
+            self.show_suggestions()
+
+    def on_query(self, instance, text):
+        if not self.selecting and self.focus:
+            self.show_suggestions()
+
+    def show_suggestions(self):
+        self.dropdown.clear_widgets()
+        names = self.search(self.text)
+        for name in names:
+            option = Button(text=name, size_hint_y=None, height=self.option_height)
+            option.bind(on_release=lambda option: self.dropdown.select(option.text))
+            self.dropdown.add_widget(option)
+        if not names:
+            self.dropdown.dismiss()
+        elif self.dropdown.attach_to is None:
+            self.dropdown.open(self)
+
+    def on_suggestion(self, dropdown, name):
+        self.selecting = True
+        self.text = name
+        self.selecting = False